@@ -0,0 +1,141 @@
+"""
+Calendar-aligned, bit-packed miner activity matrix
+
+Every miner is one row of 2 x N bits, where N is the number of calendar days
+in the season: channel 0 holds llama activity and channel 1 waifu activity,
+and bit d always means the same date for every miner (start of season + d
+days). Rows are packed with numpy.packbits along the day axis, so a season of
+183 days costs 46 bytes per miner. The matrix is saved either as one
+compressed .npz file or as a directory of plain .npy files that np.load can
+memory-map.
+"""
+
+import os
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+LLAMA = 0
+WAIFU = 1
+CHANNELS = 2
+
+# Bits set in each byte value, for popcounts over packed rows
+POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def day_offset(daily_date, start_date):
+    """Days between the season start and an API daily_date ('YYYY-MM-DD...')"""
+    return (date.fromisoformat(str(daily_date)[:10]) - start_date).days
+
+
+class ActivityMatrix:
+    """Packed (miners, channels, day bytes) uint8 matrix with its row-to-address index"""
+
+    def __init__(self, addresses, bits, start_seconds, days):
+        self.addresses = addresses  # np.ndarray of bytes, row order
+        self.bits = bits
+        self.start_seconds = int(start_seconds)
+        self.days = int(days)
+        self._index = None
+
+    def __len__(self):
+        return len(self.addresses)
+
+    @property
+    def start_date(self):
+        return datetime.utcfromtimestamp(self.start_seconds).date()
+
+    def dates(self):
+        """ISO dates of the day axis"""
+        return [(self.start_date + timedelta(days=d)).isoformat() for d in range(self.days)]
+
+    def index_of(self, address):
+        """Row of an address, or None if it is not in the matrix"""
+        if self._index is None:
+            self._index = {addr.decode('ascii'): row for row, addr in enumerate(self.addresses)}
+        return self._index.get(address)
+
+    def unpack(self, rows=slice(None)):
+        """Dense 0/1 uint8 array of shape (miners, channels, days) for the selected rows"""
+        return np.unpackbits(self.bits[rows], axis=-1, count=self.days)
+
+    def row(self, address):
+        """Dense (channels, days) activity of one miner, or None if unknown"""
+        row = self.index_of(address)
+        return None if row is None else self.unpack(row)
+
+    def flat_bits(self):
+        """Packed rows with both channels side by side, shape (miners, channels * day bytes)"""
+        return self.bits.reshape(len(self), -1)
+
+    def days_active(self):
+        """Number of days each miner earned llama or waifu points"""
+        either = np.bitwise_or(self.bits[:, LLAMA], self.bits[:, WAIFU])
+        return POPCOUNT[either].sum(axis=1, dtype=np.int32)
+
+    def save(self, path):
+        """Save to a compressed .npz file, or to a directory of memory-mappable .npy files"""
+        calendar = np.array([self.start_seconds, self.days], dtype=np.int64)
+        if path.endswith('.npz'):
+            np.savez_compressed(path, bits=self.bits, addresses=self.addresses, calendar=calendar)
+        else:
+            os.makedirs(path, exist_ok=True)
+            np.save(os.path.join(path, 'bits.npy'), self.bits)
+            np.save(os.path.join(path, 'addresses.npy'), self.addresses)
+            np.save(os.path.join(path, 'calendar.npy'), calendar)
+        print(f"Saved activity matrix for {len(self)} miners x {CHANNELS} x {self.days} days to {path}")
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load a saved matrix; directories are memory-mapped unless mmap_mode is None"""
+        if path.endswith('.npz'):
+            with np.load(path) as archive:
+                return cls(archive['addresses'], archive['bits'], *archive['calendar'])
+        bits = np.load(os.path.join(path, 'bits.npy'), mmap_mode=mmap_mode)
+        addresses = np.load(os.path.join(path, 'addresses.npy'), mmap_mode=mmap_mode)
+        start_seconds, days = np.load(os.path.join(path, 'calendar.npy'))
+        return cls(addresses, bits, start_seconds, days)
+
+
+class ActivityMatrixBuilder:
+    """Accumulates processed feature vectors one miner at a time"""
+
+    def __init__(self, start_seconds, days):
+        self.start_seconds = start_seconds
+        self.days = days
+        self.start_date = datetime.utcfromtimestamp(start_seconds).date()
+        self._addresses = []
+        self._rows = []
+
+    def add(self, processed):
+        """
+        Add one result of process_miner_stats, whose feature_vector interleaves
+        llama/waifu flags in the order of its dates
+        """
+        offsets = np.array([day_offset(d, self.start_date) for d in processed['dates']], dtype=np.int64)
+        flags = np.array(processed['feature_vector'], dtype=np.uint8).reshape(-1, CHANNELS)
+        in_season = (offsets >= 0) & (offsets < self.days)
+
+        row = np.zeros((CHANNELS, self.days), dtype=np.uint8)
+        row[:, offsets[in_season]] = flags[in_season].T
+        self._addresses.append(processed['address'].encode('ascii'))
+        self._rows.append(np.packbits(row, axis=-1))
+
+    def build(self):
+        """Stack the collected rows into an ActivityMatrix"""
+        day_bytes = (self.days + 7) // 8
+        if self._rows:
+            bits = np.stack(self._rows)
+        else:
+            bits = np.zeros((0, CHANNELS, day_bytes), dtype=np.uint8)
+        addresses = np.array(self._addresses, dtype=bytes) if self._addresses else np.zeros(0, dtype='S42')
+        return ActivityMatrix(addresses, bits, self.start_seconds, self.days)
+
+
+def build_activity_matrix(processed_data, start_seconds, days):
+    """Build the matrix for a list of process_miner_stats results"""
+    builder = ActivityMatrixBuilder(start_seconds, days)
+    for processed in processed_data:
+        if processed:
+            builder.add(processed)
+    return builder.build()
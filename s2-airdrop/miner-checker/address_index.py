@@ -0,0 +1,226 @@
+"""
+Compact binary index of EVM addresses
+
+Addresses are parsed from hex once into 20-byte keys, which makes them case
+insensitive without any lowercasing, and kept in a sorted fixed-width NumPy
+array (dtype S20) with binary-search membership. A key takes 20 bytes
+instead of a ~90 byte Python string in a set. Very large blocklists can put
+a Bloom filter in front so most misses never reach the binary search. The
+index persists to a small binary file: an 8-byte magic, the key count and
+the raw sorted keys.
+"""
+
+import math
+import re
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+ADDRESS_BYTES = 20
+KEY_DTYPE = np.dtype(f'S{ADDRESS_BYTES}')
+RAW_DTYPE = np.dtype(f'V{ADDRESS_BYTES}')  # Same bytes; sorts and compares with a plain memcmp
+ADDRESS_PATTERN = re.compile(r'0[xX][0-9a-fA-F]{40}')
+INDEX_MAGIC = b'ADDRIDX1'
+HEADER_BYTES = len(INDEX_MAGIC) + 8
+DEFAULT_BLOOM_ERROR_RATE = 0.01
+
+
+def _string_column(addresses):
+    """Addresses as an Arrow string array, or None if they are not all strings or nulls"""
+    if isinstance(addresses, (pa.Array, pa.ChunkedArray)):
+        return addresses
+    try:
+        return pa.array(addresses, type=pa.string(), from_pandas=True)
+    except (pa.ArrowException, TypeError):
+        return None
+
+
+def to_keys(addresses):
+    """
+    Parse address strings into 20-byte keys aligned with the input.
+    Returns (keys, valid): invalid entries get an all-zero key and valid=False.
+    """
+    column = _string_column(addresses)
+    if column is None:
+        # Mixed types: check each entry in Python
+        trimmed = [a.strip() if isinstance(a, str) else '' for a in addresses]
+        valid = np.array([ADDRESS_PATTERN.fullmatch(a) is not None for a in trimmed], dtype=bool)
+        digits = ''.join(a[2:] for a, ok in zip(trimmed, valid) if ok)
+    else:
+        # Validate, trim and strip the prefix as Arrow column kernels
+        trimmed = pc.utf8_trim_whitespace(column)
+        matched = pc.fill_null(pc.match_substring_regex(trimmed, f'^{ADDRESS_PATTERN.pattern}$'), False)
+        valid = np.asarray(matched, dtype=bool)
+        hex_digits = pc.utf8_slice_codeunits(pc.filter(trimmed, matched), 2)
+        if isinstance(hex_digits, pa.ChunkedArray):
+            hex_digits = hex_digits.combine_chunks()
+        one_list = pa.ListArray.from_arrays(pa.array([0, len(hex_digits)], type=pa.int32()), hex_digits)
+        digits = pc.binary_join(one_list, '')[0].as_py()
+
+    keys = np.zeros(len(valid), dtype=KEY_DTYPE)
+    if digits:
+        # One hex decode for the whole column instead of one per address
+        keys[valid] = np.frombuffer(bytes.fromhex(digits), dtype=KEY_DTYPE)
+    return keys, valid
+
+
+def parse_addresses(addresses):
+    """Parse address strings into 20-byte keys, dropping invalid entries"""
+    keys, valid = to_keys(addresses)
+    return keys[valid]
+
+
+def format_address(key):
+    """Lowercase 0x-prefixed form of a 20-byte key"""
+    return '0x' + bytes(key).ljust(ADDRESS_BYTES, b'\0').hex()
+
+
+def dedupe_addresses(addresses):
+    """
+    Drop repeated addresses, keeping first occurrences in order. EVM addresses
+    compare by key, so case variants count as one; other strings compare exactly.
+    """
+    keys, valid = to_keys(addresses)
+    keep = ~valid
+    if valid.any():
+        positions = np.flatnonzero(valid)
+        _, first = np.unique(keys[valid].view(RAW_DTYPE), return_index=True)
+        keep[positions[first]] = True
+    result = []
+    seen_other = set()
+    for address, kept, is_key in zip(addresses, keep, valid):
+        if not kept:
+            continue
+        if not is_key:
+            if address in seen_other:
+                continue
+            seen_other.add(address)
+        result.append(address)
+    return result
+
+
+def _key_lanes(keys):
+    """Two 64-bit lanes from the first 16 bytes of each key, used as Bloom hashes"""
+    raw = np.frombuffer(np.ascontiguousarray(keys).tobytes(), dtype=np.uint8).reshape(-1, ADDRESS_BYTES)
+    lanes = np.ascontiguousarray(raw[:, :16]).view('<u8')
+    return lanes[:, 0], lanes[:, 1] | np.uint64(1)
+
+
+class BloomFilter:
+    """
+    Bloom filter over 20-byte keys. Addresses are already uniformly distributed
+    hash outputs, so their own bytes feed the double hashing directly.
+    """
+
+    def __init__(self, num_bits, num_hashes):
+        self.num_bits = max(8, int(num_bits))
+        self.num_hashes = max(1, int(num_hashes))
+        self.bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate=DEFAULT_BLOOM_ERROR_RATE):
+        """Size the filter for capacity keys at the given false-positive rate"""
+        capacity = max(1, capacity)
+        num_bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        return cls(num_bits, round(num_bits / capacity * math.log(2)))
+
+    def _positions(self, keys, i):
+        h1, h2 = _key_lanes(keys)
+        with np.errstate(over='ignore'):
+            return (h1 + np.uint64(i) * h2) % np.uint64(self.num_bits)
+
+    def add(self, keys):
+        """Add an array of keys"""
+        for i in range(self.num_hashes):
+            positions = self._positions(keys, i)
+            np.bitwise_or.at(self.bits, positions >> np.uint64(3),
+                             (np.uint8(0x80) >> (positions & np.uint64(7)).astype(np.uint8)))
+
+    def might_contain(self, keys):
+        """Boolean array: False means definitely absent"""
+        result = np.ones(len(keys), dtype=bool)
+        for i in range(self.num_hashes):
+            positions = self._positions(keys, i)
+            mask = np.uint8(0x80) >> (positions & np.uint64(7)).astype(np.uint8)
+            result &= (self.bits[positions >> np.uint64(3)] & mask) != 0
+        return result
+
+
+class AddressIndex:
+    """Sorted, deduplicated 20-byte address keys with vectorized membership tests"""
+
+    def __init__(self, keys, bloom_error_rate=None):
+        self.keys = keys  # Sorted and unique; use from_keys/from_addresses for arbitrary input
+        self.bloom = None
+        if bloom_error_rate:
+            self.bloom = BloomFilter.for_capacity(len(keys), bloom_error_rate)
+            self.bloom.add(keys)
+
+    @classmethod
+    def from_keys(cls, keys, bloom_error_rate=None):
+        """Build from keys in any order, possibly repeated"""
+        keys = np.ascontiguousarray(keys, dtype=KEY_DTYPE)
+        return cls(np.unique(keys.view(RAW_DTYPE)).view(KEY_DTYPE), bloom_error_rate)
+
+    @classmethod
+    def from_addresses(cls, addresses, bloom_error_rate=None):
+        """Build from address strings, ignoring anything that is not an EVM address"""
+        return cls.from_keys(parse_addresses(addresses), bloom_error_rate)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        return (format_address(key) for key in self.keys)
+
+    def __contains__(self, address):
+        keys, valid = to_keys([address])
+        return bool(valid[0] and self.contains(keys)[0])
+
+    def contains(self, keys):
+        """Boolean membership for an array of keys"""
+        keys = np.ascontiguousarray(keys, dtype=KEY_DTYPE)
+        result = np.zeros(len(keys), dtype=bool)
+        if not len(self.keys) or not len(keys):
+            return result
+        candidates = np.flatnonzero(self.bloom.might_contain(keys)) if self.bloom else np.arange(len(keys))
+        probe = np.ascontiguousarray(keys[candidates]).view(RAW_DTYPE)
+        sorted_keys = np.ascontiguousarray(self.keys).view(RAW_DTYPE)
+        positions = np.minimum(np.searchsorted(sorted_keys, probe), len(sorted_keys) - 1)
+        result[candidates] = sorted_keys[positions] == probe
+        return result
+
+    def contains_addresses(self, addresses):
+        """Boolean membership for address strings; invalid addresses are never members"""
+        keys, valid = to_keys(addresses)
+        return self.contains(keys) & valid
+
+    def union(self, other):
+        """A new index holding the keys of both"""
+        return AddressIndex.from_keys(np.concatenate([self.keys, other.keys]))
+
+    def addresses(self):
+        """Lowercase address strings in key order"""
+        return list(self)
+
+    def save(self, path):
+        """Write the magic, the key count and the raw sorted keys"""
+        with open(path, 'wb') as f:
+            f.write(INDEX_MAGIC)
+            f.write(np.uint64(len(self.keys)).tobytes())
+            f.write(np.ascontiguousarray(self.keys).tobytes())
+
+    @classmethod
+    def load(cls, path, mmap=False, bloom_error_rate=None):
+        """Read an index written by save, optionally memory-mapping the keys"""
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_BYTES)
+        if len(header) < HEADER_BYTES or not header.startswith(INDEX_MAGIC):
+            raise ValueError(f"{path} is not an address index")
+        count = int(np.frombuffer(header[len(INDEX_MAGIC):], dtype=np.uint64)[0])
+        if mmap:
+            keys = np.memmap(path, dtype=KEY_DTYPE, mode='r', offset=HEADER_BYTES, shape=(count,))
+        else:
+            keys = np.fromfile(path, dtype=KEY_DTYPE, count=count, offset=HEADER_BYTES)
+        return cls(keys, bloom_error_rate)
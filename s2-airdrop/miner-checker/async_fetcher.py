@@ -0,0 +1,172 @@
+"""
+asyncio fetch engine for the miner stats API
+
+Requests are paced by a token bucket (requests/sec plus burst) and capped by a
+bounded number of in-flight requests, so throughput follows the configured
+rate instead of sleeps on one thread. All requests share one event loop and
+one keep-alive connection pool; no thread is spawned per request. Addresses
+already in the stats cache are served from disk without using a token.
+Failures are retried and dead-lettered the same way as in StatsClient, and an
+optional AIMD controller adapts how many of the workers may run at once.
+Requests are recorded in the context's RunMetrics like in StatsClient.
+"""
+
+import asyncio
+import time
+
+import aiohttp
+from tqdm import tqdm
+
+from fetch_context import FetchContext
+from fetch_control import RETRYABLE_STATUSES, retry_wait
+from stats_client import REQUEST_TIMEOUT, decode_stats_body, split_cached
+
+# Default limits for the async engine
+DEFAULT_RATE = 5.0  # Requests per second, matches the 0.2s delay used by the thread pool
+DEFAULT_BURST = 10  # Requests allowed back to back after an idle period
+DEFAULT_MAX_IN_FLIGHT = 100  # Concurrent requests waiting on the API
+ADAPTIVE_POLL = 0.05  # Seconds a worker parked by the adaptive limit waits before checking again
+
+
+class TokenBucket:
+    """Token-bucket rate limiter for coroutines sharing one event loop"""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = max(1, int(burst))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it; a rate of 0 disables limiting"""
+        if self.rate <= 0:
+            return
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+async def _request(session, url, metrics=None):
+    """Make one GET, returning (status, body, Retry-After, error, latency)"""
+    status = body = retry_after = error = None
+    started = time.monotonic()
+    try:
+        async with session.get(url) as response:
+            status = response.status
+            if status == 200:
+                body = await response.read()
+            else:
+                retry_after = response.headers.get('Retry-After')
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        status = body = None
+        error = f"{type(e).__name__}: {e}"
+    latency = time.monotonic() - started
+    if metrics:
+        metrics.observe_request(latency, status, len(body) if body else 0)
+    return status, body, retry_after, error, latency
+
+
+async def _fetch_one(session, address, endpoint, limiter, context):
+    """Fetch and decode the stats for one miner, retrying retryable failures with backoff"""
+    url = f"{endpoint}?minerId={address}"
+    controller = context.controller
+    metrics = context.metrics
+    reason = None
+    attempt = 0
+    while True:
+        # Every attempt, including retries, spends a token
+        await limiter.acquire()
+        status, body, retry_after, error, latency = await _request(session, url, metrics)
+
+        if body is not None:
+            result = decode_stats_body(address, body, metrics)
+            if result:
+                if controller:
+                    controller.on_success(latency)
+                if context.cache is not None:
+                    context.cache.put(endpoint, address, body)
+                return result
+            reason = 'invalid JSON'
+            break
+
+        reason = error or f"HTTP {status}"
+        if status is not None and status not in RETRYABLE_STATUSES:
+            print(f"Error fetching stats for {address}: Status {status}")
+            break
+        if controller:
+            controller.on_congestion()
+        if attempt >= context.max_retries:
+            break
+        if metrics:
+            metrics.observe_retry()
+        await asyncio.sleep(retry_wait(attempt, retry_after))
+        attempt += 1
+
+    print(f"Giving up on {address} after {attempt + 1} attempts: {reason}")
+    if metrics:
+        metrics.observe_failure()
+    if context.dead_letter:
+        context.dead_letter.record(address, reason, attempt + 1)
+    return None
+
+
+async def _fetch_all(addresses, rate, burst, max_in_flight, endpoint, timeout, context, on_result):
+    """Run a fixed set of worker coroutines that drain the address list"""
+    limiter = TokenBucket(rate, burst)
+    controller = context.controller
+    pending = iter(addresses)
+    connector = aiohttp.TCPConnector(limit=max_in_flight)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    headers = {'Accept': 'application/json'}
+
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout, headers=headers) as session:
+        async def worker(index):
+            while True:
+                # Workers above the adaptive limit stay parked until it grows back
+                while controller and index >= controller.current:
+                    await asyncio.sleep(ADAPTIVE_POLL)
+                # The iterator is shared, so each address is taken by exactly one worker
+                address = next(pending, None)
+                if address is None:
+                    return
+                on_result(await _fetch_one(session, address, endpoint, limiter, context))
+
+        workers = min(max_in_flight, len(addresses))
+        await asyncio.gather(*(worker(index) for index in range(workers)))
+
+
+def fetch_stats_async(addresses, rate=DEFAULT_RATE, burst=DEFAULT_BURST, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                      endpoint=None, timeout=REQUEST_TIMEOUT, context=None):
+    """
+    Fetch stats for multiple addresses on an asyncio event loop with token-bucket rate limiting.
+    The endpoint defaults to the context's.
+    """
+    context = context or FetchContext()
+    endpoint = endpoint or context.endpoint
+    results, remaining = split_cached(addresses, context.cache, endpoint, context.offline, context.metrics, context.source)
+    for result in results:
+        context.record(result)
+    max_in_flight = max(1, max_in_flight)
+    if not remaining:
+        return results
+
+    with tqdm(total=len(remaining), desc="Fetching miner stats (async)") as progress:
+        def on_result(result):
+            if result:
+                results.append(result)
+                context.record(result)
+            progress.update(1)
+
+        asyncio.run(_fetch_all(remaining, rate, burst, max_in_flight, endpoint, timeout, context, on_result))
+
+    return results
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Offline throughput benchmark for the miner stats fetch strategies
+
+Starts the local stub stats API (stub_stats_api.py) and runs the fetch
+strategies of the scripts against it: the thread pools of
+miner_data_fetch.py, miner_feature_generator.py and
+miner_rewards_calculator.py, the streaming fetcher, the asyncio engine and
+the AIMD-adaptive thread pool, across miner counts, worker counts and
+delays. Every case runs in a fresh process so its peak RSS is its own. The
+report gives requests/sec, p50/p99 latency of successful requests and peak
+RSS; results can be saved as JSON and compared with an earlier run to spot
+regressions in the fetch layer.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import miner_data_fetch
+import miner_feature_generator
+import miner_rewards_calculator
+from async_fetcher import fetch_stats_async, DEFAULT_BURST
+from fetch_context import FetchContext
+from fetch_control import AIMDController, DEFAULT_MAX_RETRIES
+from stats_client import iter_miner_stats
+from stub_stats_api import StubStatsServer, DEFAULT_LATENCY, DEFAULT_JITTER, DEFAULT_RETRY_AFTER
+
+# Defaults
+DEFAULT_MINERS = '100,1000'
+DEFAULT_WORKERS = '10,20'
+DEFAULT_DELAYS = '0'  # The scripts default to 0.1-0.2s, which makes every case at least delay x miners long
+DEFAULT_TOLERANCE = 0.2  # Relative drop in requests/sec that counts as a regression
+STRATEGIES = ('data_fetch', 'features', 'rewards', 'stream', 'async', 'adaptive')
+
+
+class LatencyRecorder:
+    """
+    Controller stand-in that records the latency of every successful request.
+    Wraps the AIMD controller for adaptive runs and is a no-op gate otherwise.
+    """
+
+    def __init__(self, inner=None):
+        self.inner = inner
+        self.latencies = []
+        self.congestions = 0
+        self._lock = threading.Lock()
+
+    @property
+    def current(self):
+        return self.inner.current if self.inner else sys.maxsize
+
+    def acquire(self):
+        if self.inner:
+            self.inner.acquire()
+
+    def release(self):
+        if self.inner:
+            self.inner.release()
+
+    def on_success(self, latency):
+        with self._lock:
+            self.latencies.append(latency)
+        if self.inner:
+            self.inner.on_success(latency)
+
+    def on_congestion(self):
+        with self._lock:
+            self.congestions += 1
+        if self.inner:
+            self.inner.on_congestion()
+
+    def report(self):
+        if self.inner:
+            self.inner.report()
+
+
+def benchmark_addresses(count):
+    """Deterministic, valid-looking miner addresses"""
+    return ['0x' + hashlib.sha256(f"benchmark-{i}".encode('ascii')).hexdigest()[:40] for i in range(count)]
+
+
+def run_strategy(strategy, addresses, workers, delay, context):
+    """Fetch the addresses with one strategy, returning the number of miners fetched"""
+    if strategy == 'data_fetch' or strategy == 'adaptive':
+        return len(miner_data_fetch.fetch_stats_parallel(addresses, workers, delay, context))
+    if strategy == 'features':
+        return len(miner_feature_generator.fetch_stats_parallel(addresses, context, delay))
+    if strategy == 'rewards':
+        return len(miner_rewards_calculator.fetch_stats_parallel(addresses, workers, delay, context))
+    if strategy == 'stream':
+        return sum(1 for _ in iter_miner_stats(addresses, workers, delay, context))
+    # The async engine paces by rate instead of a delay; 1/delay is the same pace
+    rate = 1.0 / delay if delay else 0
+    return len(fetch_stats_async(addresses, rate, DEFAULT_BURST, workers, context=context))
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # Linux reports KiB
+
+
+def run_case(case, endpoint, max_retries):
+    """Run one case in this (fresh) process and return its measurements"""
+    addresses = benchmark_addresses(case['miners'])
+    inner = AIMDController(case['workers']) if case['strategy'] == 'adaptive' else None
+    recorder = LatencyRecorder(inner)
+    context = FetchContext(max_retries=max_retries, controller=recorder, endpoint=endpoint)
+
+    # The fetchers print progress per miner; keep the benchmark report readable
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        started = time.monotonic()
+        fetched = run_strategy(case['strategy'], addresses, case['workers'], case['delay'], context)
+        elapsed = time.monotonic() - started
+
+    latencies = np.array(recorder.latencies) * 1000
+    return dict(case,
+                seconds=elapsed,
+                fetched=fetched,
+                failed=case['miners'] - fetched,
+                p50_ms=float(np.percentile(latencies, 50)) if len(latencies) else None,
+                p99_ms=float(np.percentile(latencies, 99)) if len(latencies) else None,
+                congestions=recorder.congestions,
+                peak_rss_bytes=peak_rss_bytes())
+
+
+def build_cases(strategies, miner_counts, worker_counts, delays):
+    """Every strategy x miners x workers x delay, without duplicates for settings a strategy ignores"""
+    cases = []
+    seen = set()
+    for strategy in strategies:
+        for miners in miner_counts:
+            for workers in worker_counts:
+                for delay in delays:
+                    if strategy == 'features':
+                        workers = miner_feature_generator.MAX_WORKERS  # Fixed in the script
+                    if strategy == 'adaptive':
+                        delay = 0  # The scripts drop the delay when --adaptive is on
+                    key = (strategy, miners, workers, delay)
+                    if key not in seen:
+                        seen.add(key)
+                        cases.append({'strategy': strategy, 'miners': miners, 'workers': workers, 'delay': delay})
+    return cases
+
+
+def case_key(result):
+    return f"{result['strategy']}/{result['miners']}/{result['workers']}/{result['delay']}"
+
+
+def print_results(results):
+    """Print one table row per case"""
+    print(f"{'strategy':<11}{'miners':>8}{'workers':>8}{'delay':>7}{'seconds':>9}{'req/s':>9}"
+          f"{'failed':>8}{'p50 ms':>9}{'p99 ms':>9}{'429':>6}{'5xx':>6}{'peak RSS MiB':>14}")
+    for r in results:
+        p50 = f"{r['p50_ms']:.1f}" if r['p50_ms'] is not None else 'n/a'
+        p99 = f"{r['p99_ms']:.1f}" if r['p99_ms'] is not None else 'n/a'
+        print(f"{r['strategy']:<11}{r['miners']:>8}{r['workers']:>8}{r['delay']:>7}{r['seconds']:>9.2f}"
+              f"{r['requests_per_second']:>9.1f}{r['failed']:>8}{p50:>9}{p99:>9}{r['throttled']:>6}"
+              f"{r['errors']:>6}{r['peak_rss_bytes'] / 1024 ** 2:>14.1f}")
+
+
+def compare_with_baseline(results, baseline_file, tolerance):
+    """Print cases whose requests/sec fell more than tolerance below the baseline; returns how many did"""
+    with open(baseline_file, 'r') as f:
+        baseline = {case_key(r): r for r in json.load(f)['results']}
+
+    regressions = 0
+    for r in results:
+        before = baseline.get(case_key(r))
+        if not before or not before['requests_per_second']:
+            continue
+        change = r['requests_per_second'] / before['requests_per_second'] - 1
+        if change < -tolerance:
+            regressions += 1
+            print(f"Regression in {case_key(r)}: {before['requests_per_second']:.1f} -> "
+                  f"{r['requests_per_second']:.1f} req/s ({change:+.0%})")
+    print(f"Compared with {baseline_file}: {regressions} regressions beyond {tolerance:.0%}")
+    return regressions
+
+
+def parse_list(value, cast):
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark the miner stats fetch strategies against a local stub API')
+    parser.add_argument('--strategies', type=str, default=','.join(STRATEGIES), help=f'Comma-separated subset of {",".join(STRATEGIES)}')
+    parser.add_argument('--miners', type=str, default=DEFAULT_MINERS, help='Comma-separated miner counts')
+    parser.add_argument('--workers', type=str, default=DEFAULT_WORKERS, help='Comma-separated worker counts (max in flight for async)')
+    parser.add_argument('--delays', type=str, default=DEFAULT_DELAYS, help='Comma-separated delays between requests (async runs at 1/delay req/s)')
+    parser.add_argument('--max-retries', type=int, default=DEFAULT_MAX_RETRIES, help='Client retries for 429/5xx')
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY, help='Stub response latency in seconds')
+    parser.add_argument('--jitter', type=float, default=DEFAULT_JITTER, help='Fraction the stub latency varies either way')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of stub responses that are HTTP 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of stub responses that are HTTP 429')
+    parser.add_argument('--max-rps', type=float, default=0, help='Stub answers 429 above this many requests per second (0 = no limit)')
+    parser.add_argument('--retry-after', type=int, default=DEFAULT_RETRY_AFTER, help='Retry-After seconds the stub sends with a 429 (negative sends none)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the stub latency, error and throttle decisions')
+    parser.add_argument('--output', type=str, help='Save the results as JSON')
+    parser.add_argument('--baseline', type=str, help='Results JSON of an earlier run to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='Relative requests/sec drop reported as a regression')
+    return parser.parse_args()
+
+
+def main():
+    """Run every benchmark case against a fresh stub server"""
+    args = parse_arguments()
+    strategies = parse_list(args.strategies, str)
+    unknown = set(strategies) - set(STRATEGIES)
+    if unknown:
+        print(f"Error: unknown strategies {', '.join(sorted(unknown))}")
+        sys.exit(1)
+    cases = build_cases(strategies, parse_list(args.miners, int), parse_list(args.workers, int), parse_list(args.delays, float))
+
+    results = []
+    spawn = multiprocessing.get_context('spawn')
+    with StubStatsServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                         throttle_rate=args.throttle_rate, max_rps=args.max_rps,
+                         retry_after=args.retry_after if args.retry_after >= 0 else None, seed=args.seed) as server:
+        print(f"Stub stats API at {server.endpoint}, running {len(cases)} cases")
+        for case in cases:
+            server.reset_stats()
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+                result = executor.submit(run_case, case, server.endpoint, args.max_retries).result()
+            result.update(server.stats())
+            result['requests_per_second'] = result['requests'] / result['seconds'] if result['seconds'] else 0.0
+            results.append(result)
+            print(f"Finished {case_key(result)} in {result['seconds']:.2f}s")
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2)
+        print(f"Saved benchmark results to {args.output}")
+    if args.baseline and compare_with_baseline(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
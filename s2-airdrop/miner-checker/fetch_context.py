@@ -0,0 +1,70 @@
+"""
+Per-run fetch state shared by the fetcher scripts
+
+A FetchContext bundles everything a fetch run threads through the engines:
+the stats cache, offline mode, the checkpoint journal, the retry policy, the
+adaptive concurrency controller, the dead-letter file, the run metrics, the
+stats endpoint and the optional bulk source that replaces it. It builds the
+StatsClient for the thread pool and reports on everything when closed.
+"""
+
+from fetch_control import AIMDController, DeadLetterFile, DEFAULT_MAX_RETRIES
+from stats_cache import open_cache
+from stats_client import STATS_API_ENDPOINT, StatsClient
+from stats_source import open_stats_source
+
+
+class FetchContext:
+    """Cache, journal, retry policy and failure handling for one fetch run"""
+
+    def __init__(self, cache=None, offline=False, journal=None, max_retries=DEFAULT_MAX_RETRIES,
+                 controller=None, dead_letter=None, endpoint=STATS_API_ENDPOINT, metrics=None, source=None):
+        self.endpoint = endpoint
+        self.cache = cache
+        self.offline = offline
+        self.journal = journal
+        self.max_retries = max_retries
+        self.controller = controller
+        self.dead_letter = dead_letter
+        self.metrics = metrics
+        self.source = source
+
+    def client(self, pool_size):
+        """Create a StatsClient that uses this run's cache, retry policy and controller"""
+        return StatsClient(pool_size=pool_size, endpoint=self.endpoint, cache=self.cache, offline=self.offline,
+                           max_retries=self.max_retries, controller=self.controller,
+                           dead_letter=self.dead_letter, metrics=self.metrics, source=self.source)
+
+    def record(self, result):
+        """Checkpoint a completed miner if the run has a journal"""
+        if self.journal:
+            self.journal.append(result)
+
+    def close(self):
+        """Flush the journal and dead letters and print run summaries"""
+        if self.journal:
+            self.journal.close()
+        if self.dead_letter:
+            self.dead_letter.close()
+        if self.cache:
+            self.cache.report()
+        if self.controller:
+            self.controller.report()
+        if self.source:
+            self.source.report()
+            self.source.close()
+
+
+def open_fetch_context(config, max_concurrency, journal=None, metrics=None):
+    """
+    Build the fetch context from the standard command line options
+    (cache_dir, cache_ttl, offline, max_retries, adaptive, dead_letter,
+    bulk_source, bulk_query). max_concurrency is the ceiling the adaptive controller may grow to;
+    metrics is the run's RunMetrics, if it records any.
+    """
+    cache = open_cache(config['cache_dir'], config['cache_ttl'], config['offline'])
+    controller = AIMDController(max_concurrency) if config['adaptive'] else None
+    dead_letter = DeadLetterFile(config['dead_letter']) if config['dead_letter'] and not config['offline'] else None
+    source = open_stats_source(config['bulk_source'], config['bulk_query'])
+    return FetchContext(cache=cache, offline=config['offline'], journal=journal, max_retries=config['max_retries'],
+                        controller=controller, dead_letter=dead_letter, metrics=metrics, source=source)
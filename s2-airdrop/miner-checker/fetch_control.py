@@ -0,0 +1,193 @@
+"""
+Retry, backoff and adaptive concurrency for the stats fetchers
+
+Retryable failures (429, 5xx, timeouts, dropped connections) are retried
+with jittered exponential backoff, honoring Retry-After when the API sends
+it. An AIMD controller grows concurrency while requests stay fast and
+healthy and halves it on congestion. Miners that still fail are written to
+a dead-letter file that can be re-driven later with --redrive.
+"""
+
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Retry configuration
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+DEFAULT_MAX_RETRIES = 4  # Attempts after the first before a miner is dead-lettered
+BACKOFF_BASE = 0.5  # Seconds, doubled on every attempt
+BACKOFF_CAP = 30.0  # Longest single wait between attempts
+RETRY_AFTER_CAP = 120.0  # Ignore Retry-After values beyond this many seconds
+
+# AIMD configuration
+ADAPTIVE_START = 4  # Concurrency the controller starts from
+ADAPTIVE_MIN = 1
+ADDITIVE_INCREASE = 1.0  # Added to the limit per limit-many successes, i.e. roughly once per round trip
+MULTIPLICATIVE_DECREASE = 0.5  # Factor applied to the limit on congestion
+LATENCY_TARGET = 2.0  # Seconds; a smoothed latency above this counts as congestion
+DECREASE_COOLDOWN = 1.0  # Seconds between two cuts, so one burst of errors only cuts once
+LATENCY_SMOOTHING = 0.2  # Weight of the newest sample in the latency moving average
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Full-jitter exponential backoff for the given zero-based retry attempt"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def parse_retry_after(value):
+    """Convert a Retry-After header (seconds or HTTP date) to seconds, or None if absent or invalid"""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    return min(max(0.0, seconds), RETRY_AFTER_CAP)
+
+
+def retry_wait(attempt, retry_after=None):
+    """Seconds to wait before the next attempt, preferring the server's Retry-After"""
+    server_wait = parse_retry_after(retry_after)
+    if server_wait is not None:
+        return server_wait
+    return backoff_delay(attempt)
+
+
+class AIMDController:
+    """
+    Additive-increase/multiplicative-decrease concurrency limit.
+    Threads call acquire()/release() around each request; coroutines read
+    the limit directly and gate themselves.
+    """
+
+    def __init__(self, maximum, initial=ADAPTIVE_START, minimum=ADAPTIVE_MIN,
+                 increase=ADDITIVE_INCREASE, decrease=MULTIPLICATIVE_DECREASE,
+                 latency_target=LATENCY_TARGET, cooldown=DECREASE_COOLDOWN):
+        self.maximum = max(minimum, maximum)
+        self.minimum = minimum
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.latency = None
+        self.in_flight = 0
+        self.successes = 0
+        self.congestions = 0
+        self.peak = self.limit
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def current(self):
+        """Whole number of requests currently allowed in flight"""
+        return max(self.minimum, int(self.limit))
+
+    def acquire(self):
+        """Block until a request slot is free under the current limit"""
+        with self._condition:
+            while self.in_flight >= self.current:
+                self._condition.wait(0.1)
+            self.in_flight += 1
+
+    def release(self):
+        """Return a request slot"""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency):
+        """Record a healthy response; grows the limit unless latency is drifting up"""
+        with self._condition:
+            self.successes += 1
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+
+            if self.latency > self.latency_target:
+                self._cut()
+            else:
+                self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+                self.peak = max(self.peak, self.limit)
+            self._condition.notify_all()
+
+    def on_congestion(self):
+        """Record a 429, 5xx or timeout; cuts the limit at most once per cooldown"""
+        with self._condition:
+            self.congestions += 1
+            self._cut()
+
+    def _cut(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self.limit = max(self.minimum, self.limit * self.decrease)
+        self._last_decrease = now
+
+    def report(self):
+        """Print a one-line summary of how the limit moved"""
+        latency = f"{self.latency:.2f}s" if self.latency is not None else "n/a"
+        print(f"Adaptive concurrency: final limit {self.current}, peak {int(self.peak)}, "
+              f"{self.successes} successes, {self.congestions} congestion signals, smoothed latency {latency}")
+
+
+class DeadLetterFile:
+    """Append-only JSON-lines record of miners that could not be fetched"""
+
+    def __init__(self, path, truncate=True):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = open(path, 'w' if truncate else 'a', encoding='utf-8')
+
+    def record(self, address, reason, attempts):
+        """Write one failed miner and flush so it survives a crash"""
+        entry = {
+            'address': address,
+            'reason': reason,
+            'attempts': attempts,
+            'failed_at': datetime.now(timezone.utc).isoformat(),
+        }
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            self.count += 1
+
+    def close(self):
+        """Close the file and report how many miners were dead-lettered"""
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.close()
+        if self.count:
+            print(f"{self.count} miners could not be fetched; re-drive them with --redrive {self.path}")
+
+
+def load_dead_letters(path):
+    """Read the unique addresses from a dead-letter file, in first-failure order"""
+    addresses = []
+    seen = set()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                address = json.loads(line)['address']
+            except (ValueError, KeyError):
+                continue
+            if address not in seen:
+                seen.add(address)
+                addresses.append(address)
+    print(f"Loaded {len(addresses)} addresses to re-drive from {path}")
+    return addresses
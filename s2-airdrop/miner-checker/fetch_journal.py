@@ -0,0 +1,135 @@
+"""
+Crash-safe checkpoint journal for long fetch runs
+
+Each completed miner is appended as one JSON line and the file is fsynced in
+batches, so a run that dies part way keeps everything fetched so far. A run
+started with --resume reloads the journal and only fetches what is missing.
+"""
+
+import json
+import os
+import re
+import threading
+
+# Configuration
+DEFAULT_FSYNC_EVERY = 100  # Completed miners between fsyncs of the journal
+JOURNAL_ADDRESS = re.compile(rb'\{"address":"([^"\\]*)"')  # Start of a line written by FetchJournal
+
+
+class FetchJournal:
+    """Append-only JSON-lines journal of completed miner stats"""
+
+    def __init__(self, path, fsync_every=DEFAULT_FSYNC_EVERY, truncate=False):
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self.pending = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'w' if truncate else 'a', encoding='utf-8')
+        # Terminate a line torn by a crash so the next entry starts cleanly
+        if not truncate and self._file.tell() > 0:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self._file.write('\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def append(self, result):
+        """Record one completed miner; the journal is synced to disk every fsync_every entries"""
+        self.append_line(json.dumps(result, separators=(',', ':')))
+
+    def append_line(self, line):
+        """Record one completed miner already serialized as a single JSON line"""
+        with self._lock:
+            self._file.write(line + '\n')
+            self.pending += 1
+            if self.pending >= self.fsync_every:
+                self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.pending = 0
+
+    def flush(self):
+        """Force buffered entries to disk"""
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        """Sync and close the journal"""
+        with self._lock:
+            if self._file.closed:
+                return
+            self._sync()
+            self._file.close()
+
+
+def iter_journal(path):
+    """Yield journaled miners one at a time, skipping a torn line left by a crash"""
+    if not os.path.exists(path):
+        return
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                print(f"Skipping unreadable journal line {line_number} in {path}")
+
+
+def iter_journal_lines(path):
+    """
+    Yield (address, raw line bytes) for every journaled miner without decoding
+    the payloads, for a transform stage that decodes them elsewhere. Lines
+    written by FetchJournal start with the address, so only a line that does
+    not is decoded here; a torn line is skipped.
+    """
+    if not os.path.exists(path):
+        return
+
+    with open(path, 'rb') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            match = JOURNAL_ADDRESS.match(line)
+            if match:
+                yield match.group(1).decode('utf-8'), line
+                continue
+            try:
+                yield json.loads(line)['address'], line
+            except (ValueError, KeyError, TypeError):
+                print(f"Skipping unreadable journal line {line_number} in {path}")
+
+
+def load_journal(path):
+    """Load completed miners from a journal into a dict keyed by address"""
+    completed = {}
+    for result in iter_journal(path):
+        # Later entries win if an address was journaled twice
+        completed[result['address']] = result
+    return completed
+
+
+def open_journal(path, resume=False, fsync_every=DEFAULT_FSYNC_EVERY):
+    """
+    Open the journal for a run.
+    Returns (journal, results already completed); without resume the journal
+    is started over and nothing is reused.
+    """
+    completed = load_journal(path) if resume else {}
+    if resume:
+        print(f"Resuming: {len(completed)} miners already completed in {path}")
+    journal = FetchJournal(path, fsync_every=fsync_every, truncate=not resume)
+    return journal, list(completed.values())
@@ -1,110 +1,119 @@
 import csv
-import json
 import re
 import os
 from datetime import datetime
 
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+from address_index import AddressIndex, to_keys
+from miner_stats_index import MinerStatsTable
+
 # Regular expression to match valid Ethereum addresses
 ETH_ADDRESS_PATTERN = re.compile(r'^0x[a-fA-F0-9]{40}$')
 
-def is_valid_ethereum_address(address):
-    """Check if an address is a valid Ethereum address."""
-    return bool(ETH_ADDRESS_PATTERN.match(address))
+# Columns of the rewards CSV
+ADDRESS_COLUMN = 'Address'
+WAIFU_COLUMN = 'S2 waifu_reward_tokens'
+LLAMA_COLUMN = 'S2 llama_reward_tokens'
+TOTAL_COLUMN = 'S2 Total Base Tokens'
+MIN_TOTAL_TOKENS = 1  # Rows below this many base tokens are dropped
+
+def read_string_table(file_path):
+    """Read a CSV with every column kept as its raw strings, using Arrow's multithreaded parser."""
+    with open(file_path, 'r', newline='') as f:
+        header = next(csv.reader(f))
+    options = pa_csv.ConvertOptions(column_types={name: pa.string() for name in header}, strings_can_be_null=False)
+    return pa_csv.read_csv(file_path, convert_options=options).to_pandas(types_mapper=pd.ArrowDtype)
+
+def parse_floats(column):
+    """Parse a string column to a float64 NumPy array in one Arrow cast."""
+    return column.astype('float64[pyarrow]').to_numpy(dtype=float)
+
+def write_string_table(table, output_path):
+    """
+    Write a string table as CSV with the csv module's line endings. Arrow writes
+    it unquoted in one pass; a table with fields that need quoting falls back to pandas.
+    """
+    options = pa_csv.WriteOptions(quoting_style='none', quoting_header='none', eol='\r\n')
+    try:
+        pa_csv.write_csv(pa.Table.from_pandas(table, preserve_index=False), output_path, options)
+    except pa.ArrowInvalid:
+        table.to_csv(output_path, index=False, lineterminator='\r\n')
 
 def load_unique_addresses(file_path):
-    """Load unique addresses from the CSV file."""
-    unique_addresses = set()
-    with open(file_path, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            unique_addresses.add(row['address'].lower())
-    return unique_addresses
+    """Load the addresses to exclude as an AddressIndex, from its binary .idx file or the CSV."""
+    if file_path.endswith('.idx'):
+        return AddressIndex.load(file_path)
+    addresses = pd.read_csv(file_path, usecols=['address'], dtype=str, keep_default_na=False)['address']
+    return AddressIndex.from_addresses(addresses)
 
 def load_miner_stats(file_path):
-    """Load miner stats from the JSON file."""
-    with open(file_path, 'r') as f:
-        stats = json.load(f)
-    # Convert to a dictionary for easier lookup
-    stats_dict = {item['address'].lower(): item for item in stats}
-    return stats_dict
+    """
+    Load the top miner stats as a MinerStatsTable: stream-parsed from the JSON
+    on the first run, memory-mapped from its .idx sidecar after that.
+    """
+    stats = MinerStatsTable.open(file_path)
+    stats.report()
+    return stats
 
 def process_miner_rewards(input_rewards_path, unique_addresses_path, miner_stats_path, output_path):
-    """Process miner rewards according to the requirements."""
+    """
+    Process miner rewards according to the requirements.
+    The rewards table is loaded once as strings, so untouched values are written
+    back exactly as read, and every step below is a vectorized column operation.
+    """
     # Load unique addresses to be filtered out
     unique_addresses = load_unique_addresses(unique_addresses_path)
     
     # Load miner stats for comparison
     miner_stats = load_miner_stats(miner_stats_path)
     
-    # List to store processed data
-    processed_data = []
+    # Load the rewards table once, keeping the raw strings for output
+    rewards = read_string_table(input_rewards_path)
+    addresses = rewards[ADDRESS_COLUMN].str.lower()
     
-    # Initialize totals for tracking
-    total_waifu_rewards = 0.0
-    total_llama_rewards = 0.0
-    total_base_tokens = 0.0
+    # Step 1: Filter out non-EVM addresses
+    keep = addresses.str.match(ETH_ADDRESS_PATTERN.pattern).to_numpy(dtype=bool, copy=True)
     
-    # Process the rewards file
-    with open(input_rewards_path, 'r') as f:
-        reader = csv.DictReader(f)
-        
-        for row in reader:
-            address = row['Address'].lower()
-            
-            # Step 1: Filter out non-EVM addresses
-            if not is_valid_ethereum_address(address):
-                continue
-                
-            # Step 2: Filter out addresses that overlap with unique_addresses.csv
-            if address in unique_addresses:
-                continue
-                
-            # Step 3: Compare with miner stats and update if necessary
-            if address in miner_stats:
-                stats = miner_stats[address]
-                
-                # Get the values from both sources
-                csv_total_tokens = float(row['S2 Total Base Tokens'])
-                json_total_tokens = float(stats['revisedTokens']) if 'revisedTokens' in stats else float(stats['totalTokens'])
-                
-                # If JSON value is larger, use CSV value (keep as is)
-                if json_total_tokens >= csv_total_tokens:
-                    processed_data.append(row)
-                    total_waifu_rewards += float(row['S2 waifu_reward_tokens'])
-                    total_llama_rewards += float(row['S2 llama_reward_tokens'])
-                    total_base_tokens += csv_total_tokens
-                else:
-                    # Otherwise, update with JSON values
-                    updated_row = row.copy()
-                    # updated_row['S2 waifu_reward_tokens'] = str(stats['totalWaifu'])
-                    # updated_row['S2 llama_reward_tokens'] = str(stats['totalLlama'])
-                    updated_row['S2 Total Base Tokens'] = str(json_total_tokens)
-                    processed_data.append(updated_row)
-                    total_waifu_rewards += float(row['S2 waifu_reward_tokens'])
-                    total_llama_rewards += float(row['S2 llama_reward_tokens'])
-                    total_base_tokens += json_total_tokens
-            else:
-                # Address not in miner stats, keep original values
-                processed_data.append(row)
-                total_waifu_rewards += float(row['S2 waifu_reward_tokens'])
-                total_llama_rewards += float(row['S2 llama_reward_tokens'])
-                total_base_tokens += float(row['S2 Total Base Tokens'])
+    # Only rows with an EVM address are parsed, so blank or TOTAL rows never reach the cast
+    csv_total_tokens = np.full(len(rewards), np.nan)
+    csv_total_tokens[keep] = parse_floats(rewards[TOTAL_COLUMN][keep])
+    
+    # Step 2: Filter out addresses that overlap with unique_addresses.csv
+    keys, valid = to_keys(pa.array(rewards[ADDRESS_COLUMN]))
+    keep &= ~unique_addresses.contains(keys)
+    
+    # Step 3: Compare with miner stats (revised tokens where present) and take the JSON value where it is smaller
+    json_total_tokens = miner_stats.tokens_for(keys, valid)
+    updated = json_total_tokens < csv_total_tokens  # False where the address has no stats (NaN)
+    total_tokens = np.where(updated, json_total_tokens, csv_total_tokens)
     
     # Step 4: Filter out addresses with less than 1 token reward
-    filtered_data = [row for row in processed_data if float(row['S2 Total Base Tokens']) >= 1]
+    keep &= total_tokens >= MIN_TOTAL_TOKENS
+    
+    filtered_data = rewards[keep].copy()
+    filtered_updated = updated[keep]
+    filtered_data.loc[filtered_updated, TOTAL_COLUMN] = [str(float(value)) for value in total_tokens[keep][filtered_updated]]
     
-    # Recalculate totals after filtering
-    total_waifu_rewards = sum(float(row['S2 waifu_reward_tokens']) for row in filtered_data)
-    total_llama_rewards = sum(float(row['S2 llama_reward_tokens']) for row in filtered_data)
-    total_base_tokens = sum(float(row['S2 Total Base Tokens']) for row in filtered_data)
+    # Totals in one pass over the kept rows; a running sum adds in row order like the
+    # former loop, so the TOTAL row is reproduced to the last digit
+    totals = np.column_stack([
+        parse_floats(filtered_data[WAIFU_COLUMN]),
+        parse_floats(filtered_data[LLAMA_COLUMN]),
+        total_tokens[keep],
+    ]).cumsum(axis=0)
+    total_waifu_rewards, total_llama_rewards, total_base_tokens = (float(value) for value in totals[-1]) if len(totals) else (0.0, 0.0, 0.0)
     
     # Output the final results
-    with open(output_path, 'w', newline='') as f:
-        if filtered_data:
-            fieldnames = filtered_data[0].keys()
+    if len(filtered_data):
+        write_string_table(filtered_data, output_path)
+    with open(output_path, 'a' if len(filtered_data) else 'w', newline='') as f:
+        if len(filtered_data):
+            fieldnames = list(filtered_data.columns)
             writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(filtered_data)
             
             # Add a blank row for better readability
             blank_row = {field: "" for field in fieldnames}
@@ -112,10 +121,10 @@ def process_miner_rewards(input_rewards_path, unique_addresses_path, miner_stats
             
             # Add total row
             total_row = {
-                'Address': "TOTAL",
-                'S2 waifu_reward_tokens': str(total_waifu_rewards),
-                'S2 llama_reward_tokens': str(total_llama_rewards),
-                'S2 Total Base Tokens': str(total_base_tokens)
+                ADDRESS_COLUMN: "TOTAL",
+                WAIFU_COLUMN: str(total_waifu_rewards),
+                LLAMA_COLUMN: str(total_llama_rewards),
+                TOTAL_COLUMN: str(total_base_tokens)
             }
             writer.writerow(total_row)
             
@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Merkle tree and claim proofs for the final airdrop table
+
+Token amounts from a results CSV (s2_results_draft.csv, a filtered rewards
+file or the cumulative table) are converted exactly to integer base units,
+rounding down, and every (address, amount) pair becomes one leaf in the
+leaf encoding of OpenZeppelin's StandardMerkleTree:
+
+    keccak256(bytes.concat(keccak256(abi.encode(address, uint256))))
+
+Parent nodes hash the sorted pair of their children, as MerkleProof.verify
+expects, and an odd node at the end of a level moves up unchanged. Every
+level is one contiguous (n, 32) uint8 array, and hashing runs in batches
+through a Keccak-f[1600] written over NumPy uint64 lanes, so a whole level
+is hashed by a few thousand array operations instead of one Python call per
+node. No keccak library is needed; --self-test checks the hash against
+published keccak256 and SHA3-256 vectors and a small tree against a fixture.
+
+Only the leaf encoding and the sorted-pair hashing are shared with
+OpenZeppelin, so every proof verifies with MerkleProof.verify. The tree
+shape is not StandardMerkleTree's: leaves are ordered by address and an odd
+node is promoted, where StandardMerkleTree sorts leaves by hash and lays
+them out as a complete binary tree, so the root differs from
+StandardMerkleTree.of() over the same claims.
+
+The proofs file keeps the tree instead of one proof per recipient, which is
+log2(n) times smaller: a header with the root, the sorted 20-byte address
+keys, the 32-byte big-endian amounts and the hashes of every level. A lookup
+binary-searches the keys of a memory-mapped file and reads one sibling per
+level, so a single proof never loads the whole file.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import time
+from decimal import Context, Decimal, InvalidOperation, ROUND_DOWN
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+from address_index import ADDRESS_BYTES, KEY_DTYPE, RAW_DTYPE, format_address, to_keys
+from season_merge import REPO_ROOT
+
+# Defaults
+INPUT_CSV = os.path.join(REPO_ROOT, 's2-airdrop', 's2_results_draft.csv')
+AMOUNT_COLUMN = 'S2 Total Base Tokens'
+DECIMALS = 18  # Decimals of the token the contract pays out
+PROOFS_FILE = 'claim_proofs.bin'
+ROOT_FILE = 'claim_root.json'
+HASH_BATCH = 16384  # Rows per Keccak batch; keeps the 25 state lanes in cache
+PROOFS_MAGIC = b'MRKLCLM1'
+HEADER = struct.Struct('<8sQII32s')  # magic, recipients, levels, decimals, root
+HASH_BYTES = 32
+LEAF_ENCODING = 'keccak256(bytes.concat(keccak256(abi.encode(address, uint256))))'
+
+# Keccak-f[1600] round constants and rho rotations, the latter indexed by lane x + 5 * y
+_ROUND_CONSTANTS = [np.uint64(c) for c in (
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008)]
+_ROTATIONS = (0, 1, 62, 28, 27, 36, 44, 6, 55, 20, 3, 10, 43, 25, 39, 41, 45, 15, 21, 8, 18, 2, 61, 56, 14)
+_PI = [y + 5 * ((2 * x + 3 * y) % 5) for y in range(5) for x in range(5)]  # Destination of lane x + 5 * y
+RATE = 136  # Bytes absorbed per Keccak-256 block
+KECCAK_PAD = 0x01  # Ethereum's keccak256; SHA3-256 pads with 0x06 and is otherwise identical
+_EXACT = Context(prec=100)  # Wide enough that scaling any uint256 amount never rounds
+
+# Known-answer vectors for --self-test
+KECCAK256_VECTORS = {
+    b'': 'c5d2460186f7233c927e7db2dcc703c0e500b653ca82273b7bfad8045d85a470',
+    b'abc': '4e03657aea45a94fc7d47ba826c8d667c0d1e6e33a64a036ec44f58fa12d6c45',
+}
+SHA3_PAD = 0x06
+# Three claims, so the fixture covers a sorted pair and an odd node moved up; hashes computed independently
+FIXTURE_CLAIMS = [('0x' + '11' * 20, 10 ** 18), ('0x' + '22' * 20, 25 * 10 ** 17), ('0x' + '33' * 20, 1)]
+FIXTURE_LEAVES = [
+    'b38ec842db1cd54e5e5ce48491f1a404551e9726ebda349d0478e189e0996dd4',
+    'b92c48e9d7abe27fd8dfd6b5dfdbfb1c9a463f80c712b66f3a5180a090cccafc',
+    'c3d2e29c8ded2ca4aa700f83273d097a3fb1683f4b5f291a8ee7d74ff26fc6b3',
+]
+FIXTURE_ROOT = 'fe6cb027ba4bd7803cf97c9176fabc6bd81ef841a6b1ede9a38677f72fcebb53'
+
+
+def _rotl(lane, n):
+    return lane if n == 0 else (lane << np.uint64(n)) | (lane >> np.uint64(64 - n))
+
+
+def _keccak_f(lanes):
+    """The 24 rounds of Keccak-f[1600] over 25 lanes, each a uint64 array with one element per message"""
+    for rc in _ROUND_CONSTANTS:
+        c = [lanes[x] ^ lanes[x + 5] ^ lanes[x + 10] ^ lanes[x + 15] ^ lanes[x + 20] for x in range(5)]
+        d = [c[(x - 1) % 5] ^ _rotl(c[(x + 1) % 5], 1) for x in range(5)]
+        b = [None] * 25
+        for i in range(25):
+            b[_PI[i]] = _rotl(lanes[i] ^ d[i % 5], _ROTATIONS[i])
+        lanes = [b[i] ^ (~b[i - i % 5 + (i + 1) % 5] & b[i - i % 5 + (i + 2) % 5]) for i in range(25)]
+        lanes[0] = lanes[0] ^ rc
+    return lanes
+
+
+def keccak256_rows(data, pad=KECCAK_PAD):
+    """
+    keccak256 of every row of an (n, length) uint8 array, as an (n, 32) uint8
+    array. Rows must fit one block (length < 136), which covers leaves and
+    node pairs.
+    """
+    n, length = data.shape
+    if length >= RATE:
+        raise ValueError(f"Rows of {length} bytes need more than one Keccak block")
+    digests = np.empty((n, HASH_BYTES), dtype=np.uint8)
+    for start in range(0, n, HASH_BATCH):
+        rows = data[start:start + HASH_BATCH]
+        block = np.zeros((len(rows), RATE), dtype=np.uint8)
+        block[:, :length] = rows
+        block[:, length] ^= pad
+        block[:, RATE - 1] ^= 0x80
+        state = np.ascontiguousarray(block.view('<u8').T)
+        zeros = np.zeros(len(rows), dtype=np.uint64)
+        lanes = _keccak_f(list(state) + [zeros] * (25 - len(state)))
+        digests[start:start + len(rows)] = np.stack(lanes[:4], axis=1).astype('<u8').view(np.uint8)
+    return digests
+
+
+def hash_pairs(left, right):
+    """Parent hashes of (n, 32) child arrays: keccak256 of the two children in ascending byte order"""
+    # Byte order is decided by the first byte where the two hashes differ
+    rows = np.arange(len(left))
+    first = np.argmax(left != right, axis=1)
+    swap = left[rows, first] > right[rows, first]
+    pairs = np.empty((len(left), 2 * HASH_BYTES), dtype=np.uint8)
+    pairs[:, :HASH_BYTES] = np.where(swap[:, None], right, left)
+    pairs[:, HASH_BYTES:] = np.where(swap[:, None], left, right)
+    return keccak256_rows(pairs)
+
+
+def encode_amounts(amounts):
+    """Integer base units as an (n, 32) uint8 array of big-endian uint256 words"""
+    buffer = b''.join(amount.to_bytes(HASH_BYTES, 'big') for amount in amounts)
+    return np.frombuffer(buffer, dtype=np.uint8).reshape(-1, HASH_BYTES)
+
+
+def leaf_hashes(keys, amount_words):
+    """Leaf hashes of (address, amount) pairs: abi.encode is two 32-byte words, hashed twice"""
+    encoded = np.zeros((len(keys), 2 * HASH_BYTES), dtype=np.uint8)
+    encoded[:, HASH_BYTES - ADDRESS_BYTES:HASH_BYTES] = np.frombuffer(keys.tobytes(), dtype=np.uint8).reshape(-1, ADDRESS_BYTES)
+    encoded[:, HASH_BYTES:] = amount_words
+    return keccak256_rows(keccak256_rows(encoded))
+
+
+def parent_level(level):
+    """The level above: hashes of adjacent pairs, with an odd last node moved up unchanged"""
+    level = np.asarray(level)
+    paired = len(level) - len(level) % 2
+    parents = hash_pairs(level[0:paired:2], level[1:paired:2])
+    if paired < len(level):
+        parents = np.concatenate([parents, level[paired:]])
+    return parents
+
+
+def build_levels(leaves):
+    """Every level of the tree from the leaves up to the one-hash root level"""
+    levels = [leaves]
+    while len(levels[-1]) > 1:
+        levels.append(parent_level(levels[-1]))
+    return levels
+
+
+def to_base_units(value, decimals=DECIMALS):
+    """
+    Exact integer base units of a decimal token amount, rounded down; None if
+    it is not a number or does not fit a uint256
+    """
+    try:
+        amount = Decimal(value.strip() or 0)
+    except (InvalidOperation, AttributeError):
+        return None
+    if not amount.is_finite() or amount.adjusted() + decimals > 78:
+        return None
+    units = int(amount.scaleb(decimals, context=_EXACT).to_integral_value(rounding=ROUND_DOWN))
+    return units if units < 2 ** 256 else None
+
+
+def read_claims(input_file, amount_column=AMOUNT_COLUMN, decimals=DECIMALS, address_column='Address'):
+    """
+    Sorted unique address keys and their integer amounts from a results CSV.
+    Repeated addresses are summed; invalid addresses, unparsable amounts and
+    amounts that round to zero are dropped.
+    """
+    convert = pa_csv.ConvertOptions(include_columns=[address_column, amount_column],
+                                    column_types={address_column: pa.string(), amount_column: pa.string()})
+    table = pa_csv.read_csv(input_file, convert_options=convert)
+    keys, valid = to_keys(table.column(address_column))
+    # Amounts are parsed from the CSV text, never through float, so the base units are exact
+    amounts = [to_base_units(value, decimals) if value is not None else None
+               for value in table.column(amount_column).to_pylist()]
+
+    totals = {}
+    unparsable = 0
+    for key, ok, amount in zip(keys.tolist(), valid.tolist(), amounts):
+        if not ok:
+            continue
+        if amount is None or amount < 0:
+            unparsable += 1
+            continue
+        totals[key] = totals.get(key, 0) + amount
+
+    claims = sorted((key, amount) for key, amount in totals.items() if amount > 0)
+    stats = {'rows': table.num_rows, 'invalid': int((~valid).sum()), 'unparsable': unparsable,
+             'zero': len(totals) - len(claims), 'repeated': int(valid.sum()) - unparsable - len(totals)}
+    sorted_keys = np.array([key for key, _ in claims], dtype=KEY_DTYPE)
+    return sorted_keys, [amount for _, amount in claims], stats
+
+
+class ClaimTree:
+    """The claim set, its leaves and every tree level, built from sorted address keys and amounts"""
+
+    def __init__(self, keys, amount_words, levels, decimals=DECIMALS):
+        self.keys = keys
+        self.amount_words = amount_words
+        self.levels = levels
+        self.decimals = decimals
+
+    @classmethod
+    def build(cls, keys, amounts, decimals=DECIMALS):
+        amount_words = encode_amounts(amounts)
+        return cls(keys, amount_words, build_levels(leaf_hashes(keys, amount_words)), decimals)
+
+    @property
+    def root(self):
+        return self.levels[-1][0].tobytes() if len(self.levels[0]) else bytes(HASH_BYTES)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def index_of(self, address):
+        """Position of an address in the claim set, or None if it has no claim"""
+        keys, valid = to_keys([address])
+        if not valid[0] or not len(self.keys):
+            return None
+        raw = self.keys.view(RAW_DTYPE)
+        position = int(np.searchsorted(raw, keys.view(RAW_DTYPE)[0]))
+        return position if position < len(raw) and raw[position] == keys.view(RAW_DTYPE)[0] else None
+
+    def amount(self, index):
+        return int.from_bytes(self.amount_words[index].tobytes(), 'big')
+
+    def proof(self, index):
+        """Sibling hashes from the leaf up, one per level where the node has a sibling"""
+        siblings = []
+        for depth, level in enumerate(self.levels[:-1]):
+            sibling = (index >> depth) ^ 1
+            if sibling < len(level):
+                siblings.append(level[sibling].tobytes())
+        return siblings
+
+    def claim(self, address):
+        """The claim of one address as the JSON a claim page needs, or None"""
+        index = self.index_of(address)
+        if index is None:
+            return None
+        return {
+            'address': format_address(self.keys[index]),
+            'amount': str(self.amount(index)),
+            'leaf': '0x' + self.levels[0][index].tobytes().hex(),
+            'proof': ['0x' + sibling.hex() for sibling in self.proof(index)],
+        }
+
+    def verify(self):
+        """
+        Rebuild every leaf from its address and amount and every level from
+        the stored level below it. Proofs are read from the stored levels, so
+        all of them lead to the root exactly when no node differs; this takes
+        about 2n hashes instead of the n log2(n) of walking each proof.
+        Returns the number of nodes that differ.
+        """
+        if not len(self.keys):
+            return 0
+        mismatched = int((leaf_hashes(self.keys, self.amount_words) != self.levels[0]).any(axis=1).sum())
+        for below, level in zip(self.levels[:-1], self.levels[1:]):
+            rebuilt = parent_level(below)
+            if len(rebuilt) != len(level):
+                raise ValueError(f"Tree level of {len(level)} nodes cannot sit above a level of {len(below)}")
+            mismatched += int((rebuilt != level).any(axis=1).sum())
+        return mismatched
+
+    def save(self, output_file):
+        """Write the header, keys, amounts, level sizes and every level's hashes"""
+        with open(output_file, 'wb') as f:
+            f.write(HEADER.pack(PROOFS_MAGIC, len(self.keys), len(self.levels), self.decimals, self.root))
+            f.write(self.keys.tobytes())
+            f.write(self.amount_words.tobytes())
+            f.write(np.array([len(level) for level in self.levels], dtype='<u8').tobytes())
+            for level in self.levels:
+                f.write(np.ascontiguousarray(level).tobytes())
+
+    @classmethod
+    def load(cls, proofs_file):
+        """Memory-map a proofs file; lookups read only the pages they touch"""
+        with open(proofs_file, 'rb') as f:
+            magic, count, n_levels, decimals, root = HEADER.unpack(f.read(HEADER.size))
+        if magic != PROOFS_MAGIC:
+            raise ValueError(f"{proofs_file} is not a claim proofs file")
+        offset = HEADER.size
+        keys = np.memmap(proofs_file, dtype=KEY_DTYPE, mode='r', offset=offset, shape=(count,)) if count else \
+            np.zeros(0, dtype=KEY_DTYPE)
+        offset += count * ADDRESS_BYTES
+        amount_words = np.memmap(proofs_file, dtype=np.uint8, mode='r', offset=offset, shape=(count, HASH_BYTES)) \
+            if count else np.zeros((0, HASH_BYTES), dtype=np.uint8)
+        offset += count * HASH_BYTES
+        sizes = np.fromfile(proofs_file, dtype='<u8', count=n_levels, offset=offset).tolist()
+        offset += n_levels * 8
+        levels = []
+        for size in sizes:
+            levels.append(np.memmap(proofs_file, dtype=np.uint8, mode='r', offset=offset, shape=(size, HASH_BYTES))
+                          if size else np.zeros((0, HASH_BYTES), dtype=np.uint8))
+            offset += size * HASH_BYTES
+        tree = cls(keys, amount_words, levels, decimals)
+        if levels and tree.root != root:
+            raise ValueError(f"Root in the header of {proofs_file} does not match its top level")
+        return tree
+
+    def summary(self, **details):
+        total = sum(self.amount(i) for i in range(len(self.keys)))
+        return {
+            'root': '0x' + self.root.hex(),
+            'recipients': len(self.keys),
+            'total_base_units': str(total),
+            'total_tokens': str(Decimal(total).scaleb(-self.decimals)),
+            'decimals': self.decimals,
+            'levels': len(self.levels),
+            'leaf_encoding': LEAF_ENCODING,
+            **details,
+        }
+
+
+def verify_proof(leaf, proof, root):
+    """Check one proof the way OpenZeppelin's MerkleProof.verify does"""
+    computed = np.frombuffer(leaf, dtype=np.uint8)[None]
+    for sibling in proof:
+        computed = hash_pairs(computed, np.frombuffer(sibling, dtype=np.uint8)[None])
+    return computed[0].tobytes() == root
+
+
+def self_test():
+    """
+    Check the Keccak implementation and the tree layout against known answers.
+    Returns a list of failures, empty when everything matches.
+    """
+    failures = []
+    for message, expected in KECCAK256_VECTORS.items():
+        digest = keccak256_rows(np.frombuffer(message, dtype=np.uint8).reshape(1, -1))[0].tobytes().hex()
+        if digest != expected:
+            failures.append(f"keccak256({message!r}) = {digest}, expected {expected}")
+
+    # SHA3-256 is the same permutation with another pad byte, so hashlib checks every one-block length
+    rng = np.random.default_rng(0)
+    for length in range(RATE):
+        rows = rng.integers(0, 256, (3, length), dtype=np.uint8)
+        digests = keccak256_rows(rows, pad=SHA3_PAD)
+        for row, digest in zip(rows, digests):
+            if digest.tobytes() != hashlib.sha3_256(row.tobytes()).digest():
+                failures.append(f"SHA3-256 of a {length}-byte message does not match hashlib")
+                break
+
+    keys, _ = to_keys([address for address, _ in FIXTURE_CLAIMS])
+    tree = ClaimTree.build(keys, [amount for _, amount in FIXTURE_CLAIMS])
+    leaves = [leaf.tobytes().hex() for leaf in tree.levels[0]]
+    if leaves != FIXTURE_LEAVES:
+        failures.append(f"Fixture leaves {leaves}, expected {FIXTURE_LEAVES}")
+    if tree.root.hex() != FIXTURE_ROOT:
+        failures.append(f"Fixture root {tree.root.hex()}, expected {FIXTURE_ROOT}")
+    for index in range(len(tree)):
+        if not verify_proof(tree.levels[0][index].tobytes(), tree.proof(index), bytes.fromhex(FIXTURE_ROOT)):
+            failures.append(f"Fixture proof {index} does not verify")
+    return failures
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Build the Merkle root and claim proofs of an airdrop results table')
+    parser.add_argument('--input', type=str, default=INPUT_CSV, help='Results CSV with an Address column and token amounts')
+    parser.add_argument('--amount-column', type=str, default=AMOUNT_COLUMN, help='Column with the token amount to claim')
+    parser.add_argument('--decimals', type=int, default=DECIMALS, help='Decimals of the token in base units')
+    parser.add_argument('--output', type=str, default=PROOFS_FILE, help='Proofs file to write')
+    parser.add_argument('--root-file', type=str, default=ROOT_FILE, help='JSON file with the root and claim totals')
+    parser.add_argument('--verify', action='store_true', help='Verify every proof of an existing proofs file instead of building')
+    parser.add_argument('--lookup', type=str, metavar='ADDRESS', help='Print the claim and proof of one address from the proofs file')
+    parser.add_argument('--self-test', action='store_true', help='Check the hashing and tree layout against known answers and exit')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    if args.self_test:
+        failures = self_test()
+        for failure in failures:
+            print(failure)
+        print(f"Self-test {'passed' if not failures else 'FAILED'}")
+        raise SystemExit(1 if failures else 0)
+
+    if args.lookup:
+        claim = ClaimTree.load(args.output).claim(args.lookup)
+        print(json.dumps(claim, indent=2) if claim else f"No claim for {args.lookup} in {args.output}")
+        return
+
+    if args.verify:
+        started = time.time()
+        tree = ClaimTree.load(args.output)
+        failed = tree.verify()
+        print(f"Verified {len(tree)} proofs against root 0x{tree.root.hex()} in {time.time() - started:.1f}s: "
+              f"{'all valid' if not failed else f'{failed} tree nodes do not match, proofs INVALID'}")
+        return
+
+    started = time.time()
+    keys, amounts, stats = read_claims(args.input, args.amount_column, args.decimals)
+    print(f"Read {stats['rows']} rows -> {len(keys)} recipients ({stats['repeated']} repeated rows summed, "
+          f"{stats['invalid']} invalid addresses, {stats['unparsable']} unparsable and {stats['zero']} zero amounts dropped)")
+    if not len(keys):
+        print("No claims to build a tree from. Exiting.")
+        return
+
+    tree = ClaimTree.build(keys, amounts, args.decimals)
+    built = time.time()
+    failed = tree.verify()
+    if failed:
+        raise RuntimeError(f"{failed} proofs do not verify against the root")
+    tree.save(args.output)
+    summary = tree.summary(input=args.input, amount_column=args.amount_column)
+    with open(args.root_file, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"Built the tree of {len(tree)} claims in {built - started:.1f}s and verified every proof in "
+          f"{time.time() - built:.1f}s")
+    print(f"Root {summary['root']}, {summary['total_tokens']} tokens; proofs in {args.output}, root in {args.root_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,3 @@
-import boto3
-import requests
 import json
 import csv
 import time
@@ -10,37 +8,110 @@ from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 import argparse
 
+from address_index import dedupe_addresses
+from async_fetcher import fetch_stats_async, DEFAULT_RATE, DEFAULT_BURST, DEFAULT_MAX_IN_FLIGHT
+from fetch_context import FetchContext, open_fetch_context
+from fetch_control import load_dead_letters, DEFAULT_MAX_RETRIES
+from fetch_journal import open_journal
+from miner_feature_generator import S2_START_SECONDS, S2_DAYS
+from miner_state_store import open_state_store
+from parquet_output import ParquetMinerWriter, miner_record, save_to_parquet, OUTPUT_PARQUET
+from run_metrics import RunMetrics, timed_iter, timed_stage
+from s3_io import S3Target, S3_CACHE_DIR, iter_s3_lines, open_output
+from stats_cache import DEFAULT_CACHE_TTL
+from stats_client import stream_miner_stats
+
 # Configuration
 S3_BUCKET = 'heurist-adhoc-data-query'
 S3_FOLDER = 'season2-miners/'
 S3_ADDRESS_FILE = 's2-miner-addresses-2025-03-04T19-50-31-507Z.txt'  # Update with your actual filename
-STATS_API_ENDPOINT = 'https://11dugoz7j6.execute-api.us-east-1.amazonaws.com/prod/stats'
 OUTPUT_CSV = 'miners_complete_data.csv'
+JOURNAL_FILE = 'miners_complete_data.journal.jsonl'  # Checkpoint of completed miners for --resume
+DEAD_LETTER_FILE = 'miners_complete_data.dead_letter.jsonl'  # Miners that failed every retry
 MAX_WORKERS = 10  # Number of concurrent API requests
 REQUEST_DELAY = 0.2  # Delay between API requests to avoid rate limiting
 MAX_ADDRESSES = 0  # Set to a number for testing with fewer addresses, if 0, then all addresses will be processed
 
+# Fixed schema of the complete data CSV: address first, then every flattened field in sorted order
+COMPLETE_DATA_COLUMNS = ['address'] + sorted([
+    'hardware', 'status', 'totalImageCount', 'totalTextCount', 'last24HrsImageCount', 'last24HrsTextCount',
+    'last24HrsAvailability', 'totalLlamaPoints', 'totalWaifuPoints', 's2CurrentEpochLlamaPoints',
+    's2CurrentEpochWaifuPoints', 's2CurrentEpochLlamaRewards', 's2CurrentEpochWaifuRewards', 'raw_data',
+    'days_active', 'first_active_day', 'last_active_day', 'total_llama_reward_tokens', 'total_waifu_reward_tokens',
+    'days_with_llama', 'days_with_waifu', 'llama_pattern', 'waifu_pattern',
+])
+
 # Default configuration
 DEFAULT_CONFIG = {
     'input': None,  # No local input file by default
     'output': OUTPUT_CSV,
+    'format': 'csv',
     's3_input': f"{S3_FOLDER}{S3_ADDRESS_FILE}",
     's3_output': False,  # Don't upload to S3 by default
+    's3_endpoint_url': None,  # AWS S3 unless a local stand-in is given
     'max_miners': MAX_ADDRESSES,  # Process all miners by default
     'workers': MAX_WORKERS,
-    'delay': REQUEST_DELAY
+    'delay': REQUEST_DELAY,
+    'async_fetch': False,  # Use the thread pool unless asked otherwise
+    'rate': DEFAULT_RATE,
+    'burst': DEFAULT_BURST,
+    'max_in_flight': DEFAULT_MAX_IN_FLIGHT,
+    'cache_dir': None,  # No stats cache by default
+    'cache_ttl': DEFAULT_CACHE_TTL,
+    'offline': False,
+    'journal': JOURNAL_FILE,
+    'resume': False,  # Start a fresh journal by default
+    'stream': False,
+    'max_retries': DEFAULT_MAX_RETRIES,
+    'adaptive': False,  # Fixed workers and delay by default
+    'dead_letter': DEAD_LETTER_FILE,
+    'redrive': None,
+    'bulk_source': None,  # Fetch from the stats API by default
+    'bulk_query': None,
+    'state_db': None,  # Full rebuild from the fetched payloads by default
+    'metrics_output': None,  # Only print the run metrics by default
+    'prometheus_output': None
 }
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Collect complete miner data from the stats API')
     parser.add_argument('--input', type=str, help='Path to local file with miner addresses (one per line)')
-    parser.add_argument('--output', type=str, default=OUTPUT_CSV, help='Path to output CSV file')
+    parser.add_argument('--output', type=str, help=f'Path to output file (default {OUTPUT_CSV}, or {OUTPUT_PARQUET} with --format parquet)')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv',
+                        help='Output format; parquet keeps daily rewards as nested columns and patterns as bitmaps')
     parser.add_argument('--s3-input', type=str, help='S3 key for miner addresses file')
-    parser.add_argument('--s3-output', action='store_true', help='Upload result to S3')
+    parser.add_argument('--s3-output', action='store_true', help='Stream the result to S3 while it is written')
+    parser.add_argument('--s3-endpoint-url', type=str, help='S3-compatible endpoint to use instead of AWS (e.g. a local MinIO)')
     parser.add_argument('--max-miners', type=int, help='Maximum number of miners to process (for testing)')
     parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='Number of concurrent workers')
     parser.add_argument('--delay', type=float, default=REQUEST_DELAY, help='Delay between API requests')
-    return parser.parse_args()
+    parser.add_argument('--async-fetch', action='store_true', help='Fetch with the asyncio engine and a token-bucket rate limiter')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='Requests per second for --async-fetch (0 disables limiting)')
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST, help='Token-bucket burst size for --async-fetch')
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT, help='Maximum concurrent requests for --async-fetch')
+    parser.add_argument('--cache-dir', type=str, help='Directory of the on-disk stats cache (disabled if omitted)')
+    parser.add_argument('--cache-ttl', type=int, default=DEFAULT_CACHE_TTL, help='Seconds before a cached payload is refetched (0 = never)')
+    parser.add_argument('--offline', action='store_true', help='Only read payloads from the stats cache, never call the API')
+    parser.add_argument('--journal', type=str, default=JOURNAL_FILE, help='Checkpoint journal of completed miners')
+    parser.add_argument('--resume', action='store_true', help='Skip miners already completed in the checkpoint journal')
+    parser.add_argument('--stream', action='store_true', help='Write each miner as soon as its stats arrive, keeping memory flat')
+    parser.add_argument('--max-retries', type=int, default=DEFAULT_MAX_RETRIES, help='Retries for 429/5xx/timeouts before a miner is dead-lettered')
+    parser.add_argument('--adaptive', action='store_true', help='Adapt concurrency with AIMD up to --workers (--max-in-flight with --async-fetch) instead of using --delay')
+    parser.add_argument('--dead-letter', type=str, default=DEAD_LETTER_FILE, help='File recording miners that could not be fetched')
+    parser.add_argument('--redrive', type=str, help='Only fetch the addresses recorded in this dead-letter file (add --resume to keep earlier results)')
+    parser.add_argument('--bulk-source', type=str, help='Read every miner from one bulk query instead of the API: postgresql://..., sqlite:///path, a bulk export .csv, or a payload archive directory')
+    parser.add_argument('--bulk-query', type=str, help='SQL file replacing the default bulk query (see stats_source.py)')
+    parser.add_argument('--state-db', type=str, help='Incremental mode: merge new days into this SQLite state store and rebuild the output from it')
+    parser.add_argument('--metrics-output', type=str, help='Write the run metrics (stage timings, API latency histogram, status counts) as JSON')
+    parser.add_argument('--prometheus-output', type=str, help='Write the run metrics in the Prometheus text format')
+    args = parser.parse_args()
+    if args.stream and args.state_db:
+        parser.error('--state-db rebuilds the output from the stored state and cannot be combined with --stream')
+    if not args.output:
+        args.output = OUTPUT_PARQUET if args.format == 'parquet' else OUTPUT_CSV
+    if args.stream and args.async_fetch:
+        parser.error('--stream uses the thread pool and cannot be combined with --async-fetch')
+    return args
 
 def get_miner_addresses(config):
     """Get miner addresses from either local file or S3"""
@@ -56,17 +127,17 @@ def get_miner_addresses(config):
     elif config['s3_input'] or not addresses:
         s3_key = config['s3_input']
         try:
-            s3_client = boto3.client('s3')
-            response = s3_client.get_object(
-                Bucket=S3_BUCKET,
-                Key=s3_key
-            )
-            content = response['Body'].read().decode('utf-8')
-            addresses = [addr.strip() for addr in content.split('\n') if addr.strip()]
+            addresses = list(iter_s3_lines(S3_BUCKET, s3_key, config['s3_endpoint_url'], S3_CACHE_DIR))
             print(f"Loaded {len(addresses)} addresses from S3: {s3_key}")
         except Exception as e:
             print(f"Error retrieving addresses from S3: {e}")
     
+    # Fetch every miner once, even if the list repeats it in another case
+    loaded_count = len(addresses)
+    addresses = dedupe_addresses(addresses)
+    if len(addresses) < loaded_count:
+        print(f"Dropped {loaded_count - len(addresses)} duplicate addresses")
+    
     # Limit number of addresses if specified
     if config['max_miners'] and config['max_miners'] > 0:
         addresses = addresses[:config['max_miners']]
@@ -74,44 +145,22 @@ def get_miner_addresses(config):
     
     return addresses
 
-def fetch_miner_stats(address):
-    """Fetch complete stats for a specific miner address using the API endpoint"""
-    url = f"{STATS_API_ENDPOINT}?minerId={address}"
-    try:
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            try:
-                # Handle response based on content type
-                if isinstance(response.text, str):
-                    data = json.loads(response.text)
-                else:
-                    data = response.json()
-                
-                # Add the address to the data for reference
-                return {
-                    'address': address,
-                    'data': data
-                }
-            except json.JSONDecodeError:
-                print(f"Failed to parse JSON for {address}")
-                return None
-        else:
-            print(f"Error fetching stats for {address}: Status {response.status_code}")
-            return None
-    except Exception as e:
-        print(f"Exception while fetching stats for {address}: {str(e)}")
-        return None
-
-def fetch_stats_parallel(addresses, max_workers, delay):
+def fetch_stats_parallel(addresses, max_workers, delay, context=None):
     """Fetch stats for multiple addresses concurrently"""
-    results = []
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    context = context or FetchContext()
+    # One pooled connection per worker so every request reuses a warm connection
+    with context.client(max_workers) as client, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Cached payloads are served straight from disk, without the rate-limit delay
+        results, remaining = client.split_cached(addresses)
+        for result in results:
+            context.record(result)
         futures = []
         
         # Submit all tasks
-        for address in addresses:
-            futures.append(executor.submit(fetch_miner_stats, address))
-            time.sleep(delay)  # Prevent API rate limiting
+        for address in remaining:
+            futures.append(executor.submit(client.fetch_remote, address))
+            if delay:
+                time.sleep(delay)  # Prevent API rate limiting
         
         # Process results as they complete with progress bar
         for future in tqdm(futures, desc="Fetching miner stats", total=len(futures)):
@@ -119,6 +168,7 @@ def fetch_stats_parallel(addresses, max_workers, delay):
                 result = future.result()
                 if result:
                     results.append(result)
+                    context.record(result)
             except Exception as e:
                 print(f"Error processing result: {str(e)}")
     
@@ -161,26 +211,28 @@ def flatten_miner_data(miner_stats):
     if s2Rewards:
         # Sort by date
         s2Rewards.sort(key=lambda x: x['daily_date'])
-        
-        # Add number of active days
+
+        # Add number of active days, and the first and last active day
         flattened['days_active'] = len(s2Rewards)
-        
-        # Add first and last active day
-        if len(s2Rewards) > 0:
-            flattened['first_active_day'] = s2Rewards[0]['daily_date']
-            flattened['last_active_day'] = s2Rewards[-1]['daily_date']
-        
-        # Add total rewards
-        flattened['total_llama_reward_tokens'] = sum(day.get('llama_reward_tokens', 0) for day in s2Rewards)
-        flattened['total_waifu_reward_tokens'] = sum(day.get('waifu_reward_tokens', 0) for day in s2Rewards)
-        
-        # Count days with llama/waifu points
-        flattened['days_with_llama'] = sum(1 for day in s2Rewards if day.get('llama_points', 0) > 0)
-        flattened['days_with_waifu'] = sum(1 for day in s2Rewards if day.get('waifu_points', 0) > 0)
-        
-        # Create a compact representation of active days pattern
-        llama_pattern = ''.join(['1' if day.get('llama_points', 0) > 0 else '0' for day in s2Rewards])
-        waifu_pattern = ''.join(['1' if day.get('waifu_points', 0) > 0 else '0' for day in s2Rewards])
+        flattened['first_active_day'] = s2Rewards[0]['daily_date']
+        flattened['last_active_day'] = s2Rewards[-1]['daily_date']
+
+        # Reward totals, days with llama/waifu points and the compact active days
+        # patterns, all in one pass over the sorted days
+        llama_tokens = waifu_tokens = 0
+        llama_pattern = []
+        waifu_pattern = []
+        for day in s2Rewards:
+            llama_tokens += day.get('llama_reward_tokens', 0)
+            waifu_tokens += day.get('waifu_reward_tokens', 0)
+            llama_pattern.append('1' if day.get('llama_points', 0) > 0 else '0')
+            waifu_pattern.append('1' if day.get('waifu_points', 0) > 0 else '0')
+        llama_pattern = ''.join(llama_pattern)
+        waifu_pattern = ''.join(waifu_pattern)
+        flattened['total_llama_reward_tokens'] = llama_tokens
+        flattened['total_waifu_reward_tokens'] = waifu_tokens
+        flattened['days_with_llama'] = llama_pattern.count('1')
+        flattened['days_with_waifu'] = waifu_pattern.count('1')
         flattened['llama_pattern'] = llama_pattern
         flattened['waifu_pattern'] = waifu_pattern
     else:
@@ -190,8 +242,8 @@ def flatten_miner_data(miner_stats):
     
     return flattened
 
-def save_to_csv(processed_data, output_file):
-    """Save processed data to CSV file"""
+def save_to_csv(processed_data, output_file, s3=None):
+    """Save processed data to CSV file, streaming it to the S3Target s3 as well if given"""
     if not processed_data:
         print("No data to save")
         return False
@@ -209,7 +261,7 @@ def save_to_csv(processed_data, output_file):
             columns.append(col)
     
     try:
-        with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+        with open_output(output_file, s3) as csvfile:
             writer = csv.DictWriter(csvfile, fieldnames=columns)
             writer.writeheader()
             
@@ -223,21 +275,61 @@ def save_to_csv(processed_data, output_file):
         print(f"Error saving to CSV: {e}")
         return False
 
-def upload_to_s3(file_path):
-    """Upload the CSV file to S3"""
-    s3_client = boto3.client('s3')
+def stream_to_csv(addresses, config, context, delay, s3=None):
+    """Fetch, flatten and write each miner as soon as its stats arrive"""
+    output_file = config['output']
+    count = 0
+    try:
+        with open_output(output_file, s3) as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=COMPLETE_DATA_COLUMNS)
+            writer.writeheader()
+            
+            stream = stream_miner_stats(addresses, config['workers'], delay, context,
+                                        config['journal'], config['resume'])
+            for miner_stats in tqdm(timed_iter(context.metrics, 'fetch', stream), desc="Streaming miner data", total=len(addresses)):
+                with timed_stage(context.metrics, 'transform'):
+                    flattened = flatten_miner_data(miner_stats)
+                if flattened:
+                    with timed_stage(context.metrics, 'write'):
+                        writer.writerow(flattened)
+                    count += 1
+            if s3 and not count:
+                csvfile.cancel_upload()  # Only upload a file with data, as before streaming
+    except OSError as e:
+        print(f"Error saving to CSV: {e}")
+        return False
+    
+    print(f"Saved data for {count} miners to {output_file}")
+    return count > 0
+
+def stream_to_parquet(addresses, config, context, delay, s3=None):
+    """Fetch each miner and append it to the Parquet file one row group at a time"""
+    output_file = config['output']
+    try:
+        with ParquetMinerWriter(output_file, s3=s3) as writer:
+            stream = stream_miner_stats(addresses, config['workers'], delay, context,
+                                        config['journal'], config['resume'])
+            for miner_stats in tqdm(timed_iter(context.metrics, 'fetch', stream), desc="Streaming miner data", total=len(addresses)):
+                with timed_stage(context.metrics, 'transform'):
+                    record = miner_record(miner_stats)
+                if record:
+                    with timed_stage(context.metrics, 'write'):
+                        writer.write(record)
+            if not writer.count:
+                writer.cancel_upload()
+    except OSError as e:
+        print(f"Error saving to Parquet: {e}")
+        return False
+    
+    print(f"Saved data for {writer.count} miners to {output_file}")
+    return writer.count > 0
+
+def s3_output_key(file_path):
+    """S3 key the output file is streamed to, timestamped so runs never overwrite each other"""
     timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
     filename = os.path.basename(file_path)
     base, ext = os.path.splitext(filename)
-    s3_key = f"{S3_FOLDER}complete_data/{base}_{timestamp}{ext}"
-    
-    try:
-        s3_client.upload_file(file_path, S3_BUCKET, s3_key)
-        print(f"Uploaded complete miner data to s3://{S3_BUCKET}/{s3_key}")
-        return s3_key
-    except Exception as e:
-        print(f"Error uploading to S3: {e}")
-        return None
+    return f"{S3_FOLDER}complete_data/{base}_{timestamp}{ext}"
 
 def main():
     # Check if command line arguments are provided
@@ -247,56 +339,123 @@ def main():
         config = {
             'input': args.input,
             'output': args.output,
+            'format': args.format,
             's3_input': args.s3_input if args.s3_input else DEFAULT_CONFIG['s3_input'],
             's3_output': args.s3_output,
+            's3_endpoint_url': args.s3_endpoint_url,
             'max_miners': args.max_miners,
             'workers': args.workers,
-            'delay': args.delay
+            'delay': args.delay,
+            'async_fetch': args.async_fetch,
+            'rate': args.rate,
+            'burst': args.burst,
+            'max_in_flight': args.max_in_flight,
+            'cache_dir': args.cache_dir,
+            'cache_ttl': args.cache_ttl,
+            'offline': args.offline,
+            'journal': args.journal,
+            'resume': args.resume,
+            'stream': args.stream,
+            'max_retries': args.max_retries,
+            'adaptive': args.adaptive,
+            'dead_letter': args.dead_letter,
+            'redrive': args.redrive,
+            'bulk_source': args.bulk_source,
+            'bulk_query': args.bulk_query,
+            'state_db': args.state_db,
+            'metrics_output': args.metrics_output,
+            'prometheus_output': args.prometheus_output
         }
     else:
         # Use default configuration if no arguments provided
         config = DEFAULT_CONFIG
         print("No command line arguments provided. Using default configuration.")
+    metrics = RunMetrics('miner_data_fetch')
     
-    # Get miner addresses
+    # Get miner addresses, or only the failures of an earlier run when re-driving
     print("Getting miner addresses...")
-    addresses = get_miner_addresses(config)
+    with metrics.stage('address_load'):
+        if config['redrive']:
+            addresses = load_dead_letters(config['redrive'])
+        else:
+            addresses = get_miner_addresses(config)
     
     if not addresses:
         print("No addresses found. Exiting.")
         return
     
-    # Set workers and delay from config
+    # Set workers and delay from config; the adaptive controller replaces the fixed delay
     max_workers = config['workers']
-    delay = config['delay']
-    
-    # Fetch stats for each address
-    print(f"Fetching stats for {len(addresses)} addresses using {max_workers} workers...")
-    stats_data = fetch_stats_parallel(addresses, max_workers, delay)
-    print(f"Successfully fetched stats for {len(stats_data)} miners")
+    delay = 0 if config['adaptive'] else config['delay']
+    max_concurrency = config['max_in_flight'] if config['async_fetch'] else max_workers
     
-    # Process the stats to flatten the data
-    print("Processing stats to flatten the data...")
-    processed_data = []
-    for miner_stats in tqdm(stats_data, desc="Flattening miner data"):
-        flattened = flatten_miner_data(miner_stats)
-        if flattened:
-            processed_data.append(flattened)
-    
-    print(f"Successfully flattened data for {len(processed_data)} miners")
-    
-    # Save to CSV
+    # The output goes to S3 as it is written, instead of being uploaded afterwards
     output_file = config['output']
-    print(f"Saving to CSV file: {output_file}...")
-    success = save_to_csv(processed_data, output_file)
-    
-    # Upload to S3 if requested
-    if success and config['s3_output']:
-        print("Uploading to S3...")
-        s3_key = upload_to_s3(output_file)
-        if s3_key:
-            print(f"CSV file uploaded to S3: s3://{S3_BUCKET}/{s3_key}")
+    s3 = S3Target(S3_BUCKET, s3_output_key(output_file), config['s3_endpoint_url']) if config['s3_output'] else None
+    if config['stream']:
+        print(f"Streaming stats for {len(addresses)} addresses to {output_file} using {max_workers} workers...")
+        context = open_fetch_context(config, max_concurrency, metrics=metrics)
+        if config['format'] == 'parquet':
+            success = stream_to_parquet(addresses, config, context, delay, s3)
+        else:
+            success = stream_to_csv(addresses, config, context, delay, s3)
+        context.close()
+    else:
+        # Reuse miners completed by an earlier run and only fetch the rest
+        journal, stats_data = open_journal(config['journal'], config['resume'])
+        completed = {miner['address'] for miner in stats_data}
+        addresses = [address for address in addresses if address not in completed]
+        context = open_fetch_context(config, max_concurrency, journal, metrics)
+        
+        # Fetch stats for each address
+        with metrics.stage('fetch'):
+            if config['async_fetch']:
+                print(f"Fetching stats for {len(addresses)} addresses at {config['rate']} req/s "
+                      f"with up to {config['max_in_flight']} requests in flight...")
+                stats_data += fetch_stats_async(addresses, config['rate'], config['burst'], config['max_in_flight'],
+                                                context=context)
+            else:
+                print(f"Fetching stats for {len(addresses)} addresses using {max_workers} workers...")
+                stats_data += fetch_stats_parallel(addresses, max_workers, delay, context)
+        context.close()
+        print(f"Successfully fetched stats for {len(stats_data)} miners")
+        
+        # In incremental mode only new days are merged, and the output covers every stored miner
+        state = open_state_store(config['state_db'], S2_START_SECONDS, S2_DAYS)
+        if state:
+            with metrics.stage('state_merge'):
+                for miner_stats in tqdm(stats_data, desc="Merging into state store"):
+                    state.merge(miner_stats)
+            state.report()
+            stats_data = state.iter_payloads()
+        
+        if config['format'] == 'parquet':
+            # Typed columns straight from the payloads, no flattened CSV rows in between
+            print(f"Saving to Parquet file: {output_file}...")
+            with metrics.stage('write'):
+                success = save_to_parquet(stats_data, output_file, s3=s3)
+        else:
+            # Process the stats to flatten the data
+            print("Processing stats to flatten the data...")
+            processed_data = []
+            with metrics.stage('transform'):
+                for miner_stats in tqdm(stats_data, desc="Flattening miner data"):
+                    flattened = flatten_miner_data(miner_stats)
+                    if flattened:
+                        processed_data.append(flattened)
+            
+            print(f"Successfully flattened data for {len(processed_data)} miners")
+            
+            # Save to CSV
+            print(f"Saving to CSV file: {output_file}...")
+            with metrics.stage('write'):
+                success = save_to_csv(processed_data, output_file, s3)
+        if state:
+            state.close()
     
+    if s3 and not success:
+        print(f"No miner data saved, {output_file} was not uploaded to {s3}")
+    metrics.save(config['metrics_output'], config['prometheus_output'])
     print("Processing complete!")
 
 if __name__ == "__main__":
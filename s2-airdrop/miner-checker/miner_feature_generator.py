@@ -1,20 +1,32 @@
-import boto3
-import requests
-import json
 import csv
 import time
 import os
+import argparse
 from datetime import datetime
 import pandas as pd
 from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
+from activity_matrix import ActivityMatrixBuilder
+from address_index import dedupe_addresses
+from async_fetcher import fetch_stats_async, DEFAULT_RATE, DEFAULT_BURST, DEFAULT_MAX_IN_FLIGHT
+from fetch_context import FetchContext, open_fetch_context
+from fetch_control import load_dead_letters, DEFAULT_MAX_RETRIES
+from fetch_journal import open_journal
+from miner_state_store import open_state_store
+from run_metrics import RunMetrics, timed_iter, timed_stage
+from s3_io import S3Target, S3_CACHE_DIR, iter_s3_lines, open_output
+from stats_cache import DEFAULT_CACHE_TTL
+from stats_client import stream_miner_stats
+
 # Configuration
 S3_BUCKET = 'heurist-adhoc-data-query'
 S3_FOLDER = 'season2-miners/'
 S3_ADDRESS_FILE = 's2-miner-addresses-2025-03-04T19-50-31-507Z.txt'  # Update with your actual filename
-STATS_API_ENDPOINT = 'https://11dugoz7j6.execute-api.us-east-1.amazonaws.com/prod/stats'
 OUTPUT_CSV = 'miner_feature_vectors.csv'
+MATRIX_OUTPUT = 'miner_activity_matrix.npz'  # Calendar-aligned packed activity; a directory path saves memory-mappable .npy files
+JOURNAL_FILE = 'miner_feature_vectors.journal.jsonl'  # Checkpoint of completed miners for --resume
+DEAD_LETTER_FILE = 'miner_feature_vectors.dead_letter.jsonl'  # Miners that failed every retry
 MAX_WORKERS = 20  # Number of concurrent API requests
 REQUEST_DELAY = 0.2  # Delay between API requests to avoid rate limiting
 MAX_ADDRESSES = 0  # Set to a number for testing with fewer addresses, if 0, then all addresses will be processed
@@ -24,6 +36,39 @@ S2_START_SECONDS = 1721347200  # Fri Jul 19 2024 00:00:00 GMT+0000
 S2_END_SECONDS = 1737072000    # Fri Jan 17 2025 00:00:00 GMT+0000
 S2_START_DATE = datetime.utcfromtimestamp(S2_START_SECONDS).strftime('%Y-%m-%d')
 S2_END_DATE = datetime.utcfromtimestamp(S2_END_SECONDS).strftime('%Y-%m-%d')
+S2_DAYS = (S2_END_SECONDS - S2_START_SECONDS) // 86400 + 1  # Calendar days in the inclusive S2 window
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Generate per-miner activity feature vectors from the stats API')
+    parser.add_argument('--matrix-output', type=str, default=MATRIX_OUTPUT,
+                        help='Calendar-aligned bit-packed activity matrix (.npz, or a directory of memory-mappable .npy files)')
+    parser.add_argument('--async-fetch', action='store_true', help='Fetch with the asyncio engine and a token-bucket rate limiter')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='Requests per second for --async-fetch (0 disables limiting)')
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST, help='Token-bucket burst size for --async-fetch')
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT, help='Maximum concurrent requests for --async-fetch')
+    parser.add_argument('--cache-dir', type=str, help='Directory of the on-disk stats cache (disabled if omitted)')
+    parser.add_argument('--cache-ttl', type=int, default=DEFAULT_CACHE_TTL, help='Seconds before a cached payload is refetched (0 = never)')
+    parser.add_argument('--offline', action='store_true', help='Only read payloads from the stats cache, never call the API')
+    parser.add_argument('--journal', type=str, default=JOURNAL_FILE, help='Checkpoint journal of completed miners')
+    parser.add_argument('--resume', action='store_true', help='Skip miners already completed in the checkpoint journal')
+    parser.add_argument('--stream', action='store_true', help='Write each miner as soon as its stats arrive, keeping memory flat')
+    parser.add_argument('--max-retries', type=int, default=DEFAULT_MAX_RETRIES, help='Retries for 429/5xx/timeouts before a miner is dead-lettered')
+    parser.add_argument('--adaptive', action='store_true', help='Adapt concurrency with AIMD up to MAX_WORKERS (--max-in-flight with --async-fetch) instead of sleeping REQUEST_DELAY')
+    parser.add_argument('--dead-letter', type=str, default=DEAD_LETTER_FILE, help='File recording miners that could not be fetched')
+    parser.add_argument('--redrive', type=str, help='Only fetch the addresses recorded in this dead-letter file (add --resume to keep earlier results)')
+    parser.add_argument('--bulk-source', type=str, help='Read every miner from one bulk query instead of the API: postgresql://..., sqlite:///path, a bulk export .csv, or a payload archive directory')
+    parser.add_argument('--bulk-query', type=str, help='SQL file replacing the default bulk query (see stats_source.py)')
+    parser.add_argument('--state-db', type=str, help='Incremental mode: merge new days into this SQLite state store and rebuild the outputs from it')
+    parser.add_argument('--metrics-output', type=str, help='Write the run metrics (stage timings, API latency histogram, status counts) as JSON')
+    parser.add_argument('--prometheus-output', type=str, help='Write the run metrics in the Prometheus text format')
+    parser.add_argument('--s3-endpoint-url', type=str, help='S3-compatible endpoint to use instead of AWS (e.g. a local MinIO)')
+    args = parser.parse_args()
+    if args.stream and args.async_fetch:
+        parser.error('--stream uses the thread pool and cannot be combined with --async-fetch')
+    if args.stream and args.state_db:
+        parser.error('--state-db rebuilds the outputs from the stored state and cannot be combined with --stream')
+    return args
 
 def is_valid_evm_address(address):
     """Check if the given string is a valid EVM address"""
@@ -40,16 +85,10 @@ def is_valid_evm_address(address):
     except ValueError:
         return False
 
-def get_miner_addresses():
-    """Retrieve the list of miner addresses from S3"""
-    s3_client = boto3.client('s3')
+def get_miner_addresses(endpoint_url=None):
+    """Retrieve the list of miner addresses from S3, or its cached copy if it has not changed"""
     try:
-        response = s3_client.get_object(
-            Bucket=S3_BUCKET,
-            Key=f"{S3_FOLDER}{S3_ADDRESS_FILE}"
-        )
-        content = response['Body'].read().decode('utf-8')
-        all_addresses = [addr.strip() for addr in content.split('\n') if addr.strip()]
+        all_addresses = list(iter_s3_lines(S3_BUCKET, f"{S3_FOLDER}{S3_ADDRESS_FILE}", endpoint_url, S3_CACHE_DIR))
         print(f"Retrieved {len(all_addresses)} miner addresses from S3")
         
         # Filter out invalid addresses
@@ -58,6 +97,12 @@ def get_miner_addresses():
         print(f"Filtered out {invalid_count} invalid addresses")
         print(f"Remaining valid addresses: {len(valid_addresses)}")
         
+        # Fetch every miner once, even if the list repeats it in another case
+        unique_addresses = dedupe_addresses(valid_addresses)
+        if len(unique_addresses) < len(valid_addresses):
+            print(f"Dropped {len(valid_addresses) - len(unique_addresses)} duplicate addresses")
+        valid_addresses = unique_addresses
+        
         # Limit the number of addresses for testing if specified
         if MAX_ADDRESSES:
             valid_addresses = valid_addresses[:MAX_ADDRESSES]
@@ -68,24 +113,6 @@ def get_miner_addresses():
         print(f"Error retrieving addresses from S3: {e}")
         return []
 
-def fetch_miner_stats(address):
-    """Fetch stats for a specific miner address using the API endpoint"""
-    url = f"{STATS_API_ENDPOINT}?minerId={address}"
-    try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = json.loads(response.text)
-            return {
-                'address': address,
-                'data': data
-            }
-        else:
-            print(f"Error fetching stats for {address}: Status {response.status_code}")
-            return None
-    except Exception as e:
-        print(f"Exception while fetching stats for {address}: {str(e)}")
-        return None
-
 def process_miner_stats(miner_stats):
     """
     Process miner stats to create a feature vector with dimensions 2N 
@@ -174,16 +201,22 @@ def process_miner_stats(miner_stats):
     
     return None
 
-def fetch_stats_parallel(addresses):
+def fetch_stats_parallel(addresses, context=None, delay=REQUEST_DELAY):
     """Fetch stats for multiple addresses in parallel"""
-    results = []
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+    context = context or FetchContext()
+    # One pooled connection per worker so every request reuses a warm connection
+    with context.client(MAX_WORKERS) as client, ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        # Cached payloads are served straight from disk, without the rate-limit delay
+        results, remaining = client.split_cached(addresses)
+        for result in results:
+            context.record(result)
         futures = []
         
         # Submit all tasks
-        for address in addresses:
-            futures.append(executor.submit(fetch_miner_stats, address))
-            time.sleep(REQUEST_DELAY)  # Prevent API rate limiting
+        for address in remaining:
+            futures.append(executor.submit(client.fetch_remote, address))
+            if delay:
+                time.sleep(delay)  # Prevent API rate limiting
         
         # Process results as they complete with progress bar
         for future in tqdm(futures, desc="Fetching miner stats"):
@@ -191,13 +224,28 @@ def fetch_stats_parallel(addresses):
                 result = future.result()
                 if result:
                     results.append(result)
+                    context.record(result)
             except Exception as e:
                 print(f"Error processing result: {str(e)}")
     
     return results
 
-def save_to_csv(processed_data):
-    """Save processed feature vectors to CSV file"""
+def feature_header(max_features):
+    """Build the CSV header for feature vectors of the given length"""
+    header = ['address', 'days_active']
+    for i in range(max_features // 2):
+        header.extend([f'llama_day{i+1}', f'waifu_day{i+1}'])
+    return header
+
+def feature_row(item, max_features):
+    """Build one CSV row, padding the feature vector to the header length"""
+    row = [item['address'], item['days_active']]
+    feature_vector = item['feature_vector']
+    row.extend(feature_vector + [0] * (max_features - len(feature_vector)))
+    return row
+
+def save_to_csv(processed_data, output_file=OUTPUT_CSV, s3=None):
+    """Save processed feature vectors to CSV file, streaming it to the S3Target s3 as well if given"""
     if not processed_data:
         print("No data to save")
         return
@@ -205,76 +253,138 @@ def save_to_csv(processed_data):
     # Find the maximum feature vector length to determine header size
     max_features = max(len(item['feature_vector']) for item in processed_data if item)
     
-    with open(OUTPUT_CSV, 'w', newline='') as csvfile:
+    with open_output(output_file, s3) as csvfile:
         writer = csv.writer(csvfile)
-        
-        # Create header row
-        header = ['address', 'days_active']
-        for i in range(max_features // 2):
-            header.extend([f'llama_day{i+1}', f'waifu_day{i+1}'])
-        
-        writer.writerow(header)
+        writer.writerow(feature_header(max_features))
         
         # Write data rows
         for item in processed_data:
-            if not item:
-                continue
-                
-            row = [item['address'], item['days_active']]
-            
-            # Pad feature vector if needed
-            feature_vector = item['feature_vector']
-            padded_vector = feature_vector + [0] * (max_features - len(feature_vector))
-            row.extend(padded_vector)
-            
-            writer.writerow(row)
+            if item:
+                writer.writerow(feature_row(item, max_features))
     
-    print(f"Saved feature vectors for {len(processed_data)} miners to {OUTPUT_CSV}")
+    print(f"Saved feature vectors for {len(processed_data)} miners to {output_file}")
 
-def save_to_s3(file_path):
-    """Upload the CSV file to S3"""
-    s3_client = boto3.client('s3')
-    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-    s3_key = f"{S3_FOLDER}feature_vectors/miner_feature_vectors_{timestamp}.csv"
+def stream_to_csv(addresses, args, context, delay=REQUEST_DELAY, output_file=OUTPUT_CSV, matrix=None, s3=None):
+    """
+    Fetch, process and write each miner as soon as its stats arrive.
+    The header covers every day of the S2 window up front, since the longest
+    vector is not known until the last miner has been fetched. Each miner is
+    also added to the activity matrix builder if one is given, and the file
+    is streamed to the S3Target s3 if one is given.
+    """
+    max_features = 2 * S2_DAYS
+    count = 0
     
-    try:
-        s3_client.upload_file(file_path, S3_BUCKET, s3_key)
-        print(f"Uploaded feature vectors to s3://{S3_BUCKET}/{s3_key}")
-    except Exception as e:
-        print(f"Error uploading to S3: {e}")
+    with open_output(output_file, s3) as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(feature_header(max_features))
+        
+        stream = stream_miner_stats(addresses, MAX_WORKERS, delay, context, args.journal, args.resume)
+        for miner_stats in tqdm(timed_iter(context.metrics, 'fetch', stream), desc="Streaming feature vectors", total=len(addresses)):
+            with timed_stage(context.metrics, 'transform'):
+                processed = process_miner_stats(miner_stats)
+                if processed and matrix is not None:
+                    matrix.add(processed)
+            if processed:
+                with timed_stage(context.metrics, 'write'):
+                    writer.writerow(feature_row(processed, max_features))
+                count += 1
+        if s3 and not count:
+            csvfile.cancel_upload()  # Only upload a file with data
+    
+    print(f"Saved feature vectors for {count} miners to {output_file}")
+
+def s3_output_key(file_path=OUTPUT_CSV):
+    """S3 key the feature vectors are streamed to, timestamped so runs never overwrite each other"""
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    base, ext = os.path.splitext(os.path.basename(file_path))
+    return f"{S3_FOLDER}feature_vectors/{base}_{timestamp}{ext}"
 
 def main():
-    # Get miner addresses
+    args = parse_arguments()
+    metrics = RunMetrics('miner_feature_generator')
+
+    # Get miner addresses, or only the failures of an earlier run when re-driving
     print("Getting miner addresses...")
-    addresses = get_miner_addresses()
+    with metrics.stage('address_load'):
+        if args.redrive:
+            addresses = load_dead_letters(args.redrive)
+        else:
+            addresses = get_miner_addresses(args.s3_endpoint_url)
     
     if not addresses:
         print("No addresses found. Exiting.")
         return
     
+    # The adaptive controller replaces the fixed delay
+    delay = 0 if args.adaptive else REQUEST_DELAY
+    max_concurrency = args.max_in_flight if args.async_fetch else MAX_WORKERS
+    matrix = ActivityMatrixBuilder(S2_START_SECONDS, S2_DAYS)
+    # The feature vectors go to S3 as they are written, instead of being uploaded afterwards
+    s3 = S3Target(S3_BUCKET, s3_output_key(OUTPUT_CSV), args.s3_endpoint_url)
+    if args.stream:
+        print(f"Streaming stats for {len(addresses)} addresses to {OUTPUT_CSV}...")
+        context = open_fetch_context(vars(args), max_concurrency, metrics=metrics)
+        stream_to_csv(addresses, args, context, delay, matrix=matrix, s3=s3)
+        context.close()
+        with metrics.stage('write'):
+            matrix.build().save(args.matrix_output)
+        
+        metrics.save(args.metrics_output, args.prometheus_output)
+        print("Processing complete!")
+        return
+    
     # Fetch stats for each address
-    print(f"Fetching stats for {len(addresses)} addresses...")
-    stats_data = fetch_stats_parallel(addresses)
+    # Reuse miners completed by an earlier run and only fetch the rest
+    journal, stats_data = open_journal(args.journal, args.resume)
+    completed = {miner['address'] for miner in stats_data}
+    addresses = [address for address in addresses if address not in completed]
+    context = open_fetch_context(vars(args), max_concurrency, journal, metrics)
+    with metrics.stage('fetch'):
+        if args.async_fetch:
+            print(f"Fetching stats for {len(addresses)} addresses at {args.rate} req/s "
+                  f"with up to {args.max_in_flight} requests in flight...")
+            stats_data += fetch_stats_async(addresses, args.rate, args.burst, args.max_in_flight, context=context)
+        else:
+            print(f"Fetching stats for {len(addresses)} addresses...")
+            stats_data += fetch_stats_parallel(addresses, context, delay)
+    context.close()
     print(f"Successfully fetched stats for {len(stats_data)} miners")
     
+    # In incremental mode only new days are merged, and the outputs cover every stored miner
+    state = open_state_store(args.state_db, S2_START_SECONDS, S2_DAYS)
+    if state:
+        with metrics.stage('state_merge'):
+            for miner_stats in tqdm(stats_data, desc="Merging into state store"):
+                state.merge(miner_stats)
+        state.report()
+        stats_data = (miner for miner in state.iter_payloads() if is_valid_evm_address(miner['address']))
+    
     # Process the stats to create feature vectors
     print("Processing stats to create feature vectors...")
     processed_data = []
-    for miner_stats in tqdm(stats_data, desc="Processing feature vectors"):
-        processed = process_miner_stats(miner_stats)
-        if processed:
-            processed_data.append(processed)
+    with metrics.stage('transform'):
+        for miner_stats in tqdm(stats_data, desc="Processing feature vectors"):
+            processed = process_miner_stats(miner_stats)
+            if processed:
+                processed_data.append(processed)
+                if not state:
+                    matrix.add(processed)
     
     print(f"Successfully created feature vectors for {len(processed_data)} miners")
     
     # Save to CSV
     print("Saving to CSV...")
-    save_to_csv(processed_data)
-    
-    # Upload to S3
-    print("Uploading to S3...")
-    save_to_s3(OUTPUT_CSV)
+    with metrics.stage('write'):
+        save_to_csv(processed_data, s3=s3)
+        if state:
+            # The stored activity bits already are the merged feature matrix
+            state.activity_matrix(is_valid_evm_address).save(args.matrix_output)
+            state.close()
+        else:
+            matrix.build().save(args.matrix_output)
     
+    metrics.save(args.metrics_output, args.prometheus_output)
     print("Processing complete!")
 
 if __name__ == "__main__":
@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+Unified single-pass miner pipeline for the S2 airdrop
+
+Fetches each miner's stats once and fans the payload out to pluggable sinks,
+so the complete-data CSV, the feature-vector CSV and the rewards CSV are all
+produced from one consistent snapshot with a third of the API traffic. With
+--stream every sink writes its row as soon as a miner arrives, and with
+--s3-output every uploadable sink streams its file to S3 while writing it.
+Each sink's transform and write time is recorded in the run metrics. With
+--transform-workers the payloads are decoded and every sink's transform
+runs in worker processes (see transform_pool.py), and only the writes stay
+on the main process. --archive keeps every payload the outputs were built
+from in a compressed payload archive (see payload_archive.py), which a
+later run can replay as its --bulk-source.
+"""
+
+import argparse
+import csv
+import os
+from datetime import datetime
+
+from tqdm import tqdm
+
+import miner_data_fetch
+import miner_feature_generator
+import miner_rewards_calculator
+from activity_matrix import ActivityMatrixBuilder
+from async_fetcher import fetch_stats_async, DEFAULT_RATE, DEFAULT_BURST, DEFAULT_MAX_IN_FLIGHT
+from fetch_context import open_fetch_context
+from fetch_control import load_dead_letters, DEFAULT_MAX_RETRIES
+from fetch_journal import FetchJournal, open_journal
+from parquet_output import ParquetMinerWriter, miner_record, OUTPUT_PARQUET
+from payload_archive import ArchiveWriter
+from run_metrics import RunMetrics, timed_iter, timed_stage
+from s3_io import S3Target, open_output
+from stats_cache import DEFAULT_CACHE_TTL
+from stats_client import refetch_raw, stream_miner_stats
+from transform_pool import DEFAULT_BATCH_SIZE, TransformPool
+
+# Constants
+JOURNAL_FILE = "miner_pipeline.journal.jsonl"  # Checkpoint of completed miners for --resume
+DEAD_LETTER_FILE = "miner_pipeline.dead_letter.jsonl"  # Miners that failed every retry
+DEFAULT_SINKS = "complete,features,rewards"
+DEFAULT_REWARDS_OUTPUT = f"miner_rewards_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+
+
+class Sink:
+    """
+    Consumer of per-miner payloads that produces one output artifact.
+    In stream mode rows are written as they arrive; otherwise they are
+    collected and saved by the owning script's save_to_csv on close. If the
+    sink has an S3Target s3, the file is streamed to it while it is written.
+    transform is a static method so it can run in a worker process.
+    """
+
+    name = None
+    s3_key = None  # Function from the output file to its S3 key; None keeps the artifact local
+
+    def __init__(self, output_file, stream=False, metrics=None, s3=None):
+        self.output_file = output_file
+        self.stream = stream
+        self.metrics = metrics
+        self.s3 = s3
+        self.saved = False
+        self.rows = []
+        self.count = 0
+        self._file = None
+        self._writer = None
+        if stream:
+            self._file = open_output(output_file, s3)
+            self._writer = self.open_writer(self._file)
+
+    def open_writer(self, f):
+        """Create the CSV writer and write the fixed header for stream mode"""
+        raise NotImplementedError
+
+    @staticmethod
+    def transform(miner_stats):
+        """Turn one miner payload into zero or more output records"""
+        raise NotImplementedError
+
+    def write(self, record):
+        """Write one record in stream mode"""
+        raise NotImplementedError
+
+    def save(self):
+        """Save the collected records outside stream mode, returning True on success"""
+        raise NotImplementedError
+
+    def add(self, miner_stats):
+        """Consume the payload of one miner"""
+        with timed_stage(self.metrics, 'transform'):
+            records = self.transform(miner_stats)
+        self.consume(records)
+
+    def consume(self, records):
+        """Consume the transformed records of one miner"""
+        if not self.stream:
+            self.rows.extend(records)
+            return
+        with timed_stage(self.metrics, 'write'):
+            for record in records:
+                self.write(record)
+                self.count += 1
+
+    def close(self):
+        """Finish the output artifact once every miner has been consumed"""
+        with timed_stage(self.metrics, 'write'):
+            if self.stream:
+                if self.s3 and not self.count:
+                    self._file.cancel_upload()  # An empty output is not uploaded
+                self._file.close()
+                print(f"Saved {self.count} {self.name} rows to {self.output_file}")
+                self.saved = self.count > 0
+            else:
+                self.saved = self.save()
+
+
+class CompleteDataSink(Sink):
+    """Flattened per-miner records, as written by miner_data_fetch.py"""
+
+    name = 'complete'
+    s3_key = staticmethod(miner_data_fetch.s3_output_key)
+
+    def open_writer(self, f):
+        writer = csv.DictWriter(f, fieldnames=miner_data_fetch.COMPLETE_DATA_COLUMNS)
+        writer.writeheader()
+        return writer
+
+    @staticmethod
+    def transform(miner_stats):
+        flattened = miner_data_fetch.flatten_miner_data(miner_stats)
+        return [flattened] if flattened else []
+
+    def write(self, record):
+        self._writer.writerow(record)
+
+    def save(self):
+        return miner_data_fetch.save_to_csv(self.rows, self.output_file, self.s3)
+
+
+class FeatureVectorSink(Sink):
+    """Daily llama/waifu activity vectors, as written by miner_feature_generator.py"""
+
+    name = 'features'
+    s3_key = staticmethod(miner_feature_generator.s3_output_key)
+    # Stream mode cannot know the longest vector up front, so it covers the whole S2 window
+    max_features = 2 * miner_feature_generator.S2_DAYS
+
+    def open_writer(self, f):
+        writer = csv.writer(f)
+        writer.writerow(miner_feature_generator.feature_header(self.max_features))
+        return writer
+
+    @staticmethod
+    def transform(miner_stats):
+        # The feature generator only ever fetched valid EVM addresses
+        if not miner_feature_generator.is_valid_evm_address(miner_stats['address']):
+            return []
+        processed = miner_feature_generator.process_miner_stats(miner_stats)
+        return [processed] if processed else []
+
+    def write(self, record):
+        self._writer.writerow(miner_feature_generator.feature_row(record, self.max_features))
+
+    def save(self):
+        miner_feature_generator.save_to_csv(self.rows, self.output_file, self.s3)
+        return bool(self.rows)
+
+
+class RewardsSink(Sink):
+    """Per-address token reward totals, as written by miner_rewards_calculator.py"""
+
+    name = 'rewards'
+    s3_key = staticmethod(miner_rewards_calculator.s3_output_key)
+
+    def open_writer(self, f):
+        writer = csv.writer(f)
+        writer.writerow(miner_rewards_calculator.REWARDS_HEADERS)
+        return writer
+
+    @staticmethod
+    def transform(miner_stats):
+        return miner_rewards_calculator.calculate_token_rewards([miner_stats])
+
+    def write(self, record):
+        self._writer.writerow(miner_rewards_calculator.reward_row(record))
+
+    def save(self):
+        return bool(miner_rewards_calculator.save_to_csv(self.rows, self.output_file, self.s3))
+
+
+class ParquetSink(Sink):
+    """
+    Typed columnar copy of the complete miner data. The Parquet writer is
+    incremental in both modes, so records go out one row group at a time.
+    """
+
+    name = 'parquet'
+    s3_key = staticmethod(miner_data_fetch.s3_output_key)
+
+    def __init__(self, output_file, stream=False, metrics=None, s3=None):
+        super().__init__(output_file, metrics=metrics, s3=s3)
+        self.stream = stream
+        self._writer = ParquetMinerWriter(output_file, s3=s3)
+
+    @staticmethod
+    def transform(miner_stats):
+        record = miner_record(miner_stats)
+        return [record] if record else []
+
+    def consume(self, records):
+        with timed_stage(self.metrics, 'write'):
+            for record in records:
+                self._writer.write(record)
+
+    def close(self):
+        with timed_stage(self.metrics, 'write'):
+            if not self._writer.count:
+                self._writer.cancel_upload()
+            self._writer.close()
+        print(f"Saved {self._writer.count} {self.name} rows to {self.output_file}")
+        self.saved = self._writer.count > 0
+
+
+class ActivityMatrixSink(Sink):
+    """Calendar-aligned bit-packed activity matrix over the same miners as the feature vectors"""
+
+    name = 'matrix'
+
+    def __init__(self, output_file, stream=False, metrics=None, s3=None):
+        super().__init__(output_file, metrics=metrics)
+        self.stream = stream
+        self._builder = ActivityMatrixBuilder(miner_feature_generator.S2_START_SECONDS,
+                                              miner_feature_generator.S2_DAYS)
+
+    transform = staticmethod(FeatureVectorSink.transform)
+
+    def consume(self, records):
+        with timed_stage(self.metrics, 'transform'):
+            for processed in records:
+                self._builder.add(processed)
+                self.count += 1
+
+    def close(self):
+        with timed_stage(self.metrics, 'write'):
+            self._builder.build().save(self.output_file)
+        self.saved = self.count > 0
+
+
+SINKS = {sink.name: sink for sink in (CompleteDataSink, FeatureVectorSink, RewardsSink, ParquetSink, ActivityMatrixSink)}
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Fetch miner stats once and write every per-miner output')
+    parser.add_argument('--input', type=str, help='Path to local file with miner addresses (one per line)')
+    parser.add_argument('--s3-input', type=str, default=miner_data_fetch.DEFAULT_CONFIG['s3_input'],
+                        help='S3 key for miner addresses file')
+    parser.add_argument('--max-miners', type=int, default=0, help='Maximum number of miners to process (for testing)')
+    parser.add_argument('--sinks', type=str, default=DEFAULT_SINKS,
+                        help=f"Comma-separated outputs to produce ({', '.join(SINKS)})")
+    parser.add_argument('--complete-output', type=str, default=miner_data_fetch.OUTPUT_CSV, help='Complete miner data CSV')
+    parser.add_argument('--features-output', type=str, default=miner_feature_generator.OUTPUT_CSV, help='Feature vectors CSV')
+    parser.add_argument('--parquet-output', type=str, default=OUTPUT_PARQUET, help='Complete miner data as Parquet (parquet sink)')
+    parser.add_argument('--matrix-output', type=str, default=miner_feature_generator.MATRIX_OUTPUT,
+                        help='Bit-packed activity matrix (matrix sink; .npz or a directory of .npy files)')
+    parser.add_argument('--rewards-output', type=str, default=DEFAULT_REWARDS_OUTPUT, help='Token rewards CSV')
+    parser.add_argument('--s3-output', action='store_true', help='Stream every output except the activity matrix to S3 while it is written')
+    parser.add_argument('--s3-endpoint-url', type=str, help='S3-compatible endpoint to use instead of AWS (e.g. a local MinIO)')
+    parser.add_argument('--workers', type=int, default=miner_data_fetch.MAX_WORKERS, help='Number of concurrent workers')
+    parser.add_argument('--delay', type=float, default=miner_data_fetch.REQUEST_DELAY, help='Delay between API requests')
+    parser.add_argument('--async-fetch', action='store_true', help='Fetch with the asyncio engine and a token-bucket rate limiter')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='Requests per second for --async-fetch (0 disables limiting)')
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST, help='Token-bucket burst size for --async-fetch')
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT, help='Maximum concurrent requests for --async-fetch')
+    parser.add_argument('--cache-dir', type=str, help='Directory of the on-disk stats cache (disabled if omitted)')
+    parser.add_argument('--cache-ttl', type=int, default=DEFAULT_CACHE_TTL, help='Seconds before a cached payload is refetched (0 = never)')
+    parser.add_argument('--offline', action='store_true', help='Only read payloads from the stats cache, never call the API')
+    parser.add_argument('--journal', type=str, default=JOURNAL_FILE, help='Checkpoint journal of completed miners')
+    parser.add_argument('--resume', action='store_true', help='Skip miners already completed in the checkpoint journal')
+    parser.add_argument('--stream', action='store_true', help='Write each miner to every sink as soon as its stats arrive')
+    parser.add_argument('--transform-workers', type=int, default=0,
+                        help='Processes that decode payloads and run the sink transforms (0 = on the main thread)')
+    parser.add_argument('--transform-batch', type=int, default=DEFAULT_BATCH_SIZE, help='Miners sent to a transform process at a time')
+    parser.add_argument('--max-retries', type=int, default=DEFAULT_MAX_RETRIES, help='Retries for 429/5xx/timeouts before a miner is dead-lettered')
+    parser.add_argument('--adaptive', action='store_true', help='Adapt concurrency with AIMD up to --workers (--max-in-flight with --async-fetch) instead of using --delay')
+    parser.add_argument('--dead-letter', type=str, default=DEAD_LETTER_FILE, help='File recording miners that could not be fetched')
+    parser.add_argument('--redrive', type=str, help='Only fetch the addresses recorded in this dead-letter file (add --resume to keep earlier results)')
+    parser.add_argument('--bulk-source', type=str, help='Read every miner from one bulk query instead of the API: postgresql://..., sqlite:///path, a bulk export .csv, or a payload archive directory')
+    parser.add_argument('--bulk-query', type=str, help='SQL file replacing the default bulk query (see stats_source.py)')
+    parser.add_argument('--archive', type=str, help='Directory of a compressed archive of every payload this run consumes (replaces an earlier archive there)')
+    parser.add_argument('--metrics-output', type=str, help='Write the run metrics (stage timings, API latency histogram, status counts) as JSON')
+    parser.add_argument('--prometheus-output', type=str, help='Write the run metrics in the Prometheus text format')
+
+    args = parser.parse_args()
+    if args.stream and args.async_fetch:
+        parser.error('--stream uses the thread pool and cannot be combined with --async-fetch')
+    if args.transform_workers and args.async_fetch:
+        parser.error('--transform-workers takes raw bodies from the thread pool and cannot be combined with --async-fetch')
+    if args.archive and args.bulk_source and os.path.realpath(args.archive) == os.path.realpath(args.bulk_source):
+        parser.error('--archive would overwrite the archive read by --bulk-source; archive to another directory')
+    return vars(args)
+
+
+def build_sinks(config, metrics=None):
+    """Instantiate the sinks named on the command line"""
+    outputs = {
+        'complete': config['complete_output'],
+        'features': config['features_output'],
+        'rewards': config['rewards_output'],
+        'parquet': config['parquet_output'],
+        'matrix': config['matrix_output'],
+    }
+    sinks = []
+    for name in config['sinks'].split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in SINKS:
+            raise ValueError(f"Unknown sink '{name}', expected one of: {', '.join(SINKS)}")
+        sink_class = SINKS[name]
+        s3 = None
+        if config['s3_output'] and sink_class.s3_key:
+            s3 = S3Target(miner_data_fetch.S3_BUCKET, sink_class.s3_key(outputs[name]), config['s3_endpoint_url'])
+        elif config['s3_output']:
+            print(f"The {name} output {outputs[name]} is kept locally and not uploaded to S3")
+        sinks.append(sink_class(outputs[name], stream=config['stream'], metrics=metrics, s3=s3))
+    return sinks
+
+
+def main():
+    """Main function to run the single-pass pipeline"""
+    config = parse_arguments()
+    metrics = RunMetrics('miner_pipeline')
+    sinks = build_sinks(config, metrics)
+    if not sinks:
+        print("No sinks selected. Exiting.")
+        return
+
+    # Get miner addresses, or only the failures of an earlier run when re-driving
+    with metrics.stage('address_load'):
+        if config['redrive']:
+            addresses = load_dead_letters(config['redrive'])
+        else:
+            addresses = miner_data_fetch.get_miner_addresses(config)
+    if not addresses:
+        print("No addresses found. Exiting.")
+        return
+
+    # The adaptive controller replaces the fixed delay
+    delay = 0 if config['adaptive'] else config['delay']
+    max_concurrency = config['max_in_flight'] if config['async_fetch'] else config['workers']
+    archive = ArchiveWriter(config['archive']) if config['archive'] else None
+    if config['transform_workers']:
+        run_transform_pool(sinks, addresses, delay, config, metrics, archive)
+        finish_sinks(sinks, config, metrics, archive)
+        return
+    if config['stream']:
+        print(f"Streaming stats for {len(addresses)} addresses using {config['workers']} workers...")
+        context = open_fetch_context(config, max_concurrency, metrics=metrics)
+        stream = stream_miner_stats(addresses, config['workers'], delay, context, config['journal'], config['resume'])
+        for miner_stats in tqdm(timed_iter(metrics, 'fetch', stream), desc="Streaming miners", total=len(addresses)):
+            archive_payload(archive, miner_stats, metrics)
+            for sink in sinks:
+                sink.add(miner_stats)
+        context.close()
+        finish_sinks(sinks, config, metrics, archive)
+        return
+
+    # Reuse miners completed by an earlier run and only fetch the rest
+    journal, stats_data = open_journal(config['journal'], config['resume'])
+    completed = {miner['address'] for miner in stats_data}
+    addresses = [address for address in addresses if address not in completed]
+    context = open_fetch_context(config, max_concurrency, journal, metrics)
+
+    # Fetch every miner exactly once
+    with metrics.stage('fetch'):
+        if config['async_fetch']:
+            print(f"Fetching stats for {len(addresses)} addresses at {config['rate']} req/s "
+                  f"with up to {config['max_in_flight']} requests in flight...")
+            stats_data += fetch_stats_async(addresses, config['rate'], config['burst'], config['max_in_flight'],
+                                            context=context)
+        else:
+            print(f"Fetching stats for {len(addresses)} addresses using {config['workers']} workers...")
+            stats_data += miner_data_fetch.fetch_stats_parallel(addresses, config['workers'], delay, context)
+    context.close()
+    print(f"Successfully fetched stats for {len(stats_data)} miners")
+
+    # Fan each payload out to every sink
+    for miner_stats in tqdm(stats_data, desc=f"Processing ({', '.join(sink.name for sink in sinks)})"):
+        archive_payload(archive, miner_stats, metrics)
+        for sink in sinks:
+            sink.add(miner_stats)
+
+    finish_sinks(sinks, config, metrics, archive)
+
+
+def archive_payload(archive, miner_stats, metrics):
+    """Archive a payload before the sinks see it, as some transforms reorder it in place"""
+    if archive is not None:
+        with timed_stage(metrics, 'archive'):
+            archive.append(miner_stats)
+
+
+def run_transform_pool(sinks, addresses, delay, config, metrics, archive=None):
+    """
+    Fetch raw bodies on the thread pool and decode and transform them in
+    worker processes. Rows reach the sinks in completion order, as with
+    --stream, and are written at once or collected according to --stream.
+    """
+    # Sinks that share a transform (features and matrix) have it run once per miner
+    transforms = []
+    for sink in sinks:
+        if sink.transform not in transforms:
+            transforms.append(sink.transform)
+    slots = [transforms.index(sink.transform) for sink in sinks]
+
+    print(f"Fetching stats for {len(addresses)} addresses using {config['workers']} workers, "
+          f"transforming in {config['transform_workers']} processes...")
+    context = open_fetch_context(config, config['workers'], metrics=metrics)
+    journal = FetchJournal(config['journal'], truncate=not config['resume'])
+    items = stream_miner_stats(addresses, config['workers'], delay, context, config['journal'], config['resume'],
+                               raw=True)
+
+    def refetch(rejected):
+        return timed_iter(metrics, 'fetch', refetch_raw(rejected, config['workers'], delay, context))
+
+    with TransformPool(transforms, config['transform_workers'], config['transform_batch'], context, journal,
+                       archive) as pool:
+        for records in tqdm(pool.run(timed_iter(metrics, 'fetch', items), refetch), desc="Transforming miners",
+                            total=len(addresses)):
+            for sink, slot in zip(sinks, slots):
+                sink.consume(records[slot])
+    journal.close()
+    context.close()
+
+
+def finish_sinks(sinks, config, metrics, archive=None):
+    """Close every sink, which completes any S3 uploads, and the archive, and save the run metrics"""
+    for sink in sinks:
+        sink.close()
+    if archive is not None:
+        with timed_stage(metrics, 'archive'):
+            archive.close()
+
+    metrics.save(config['metrics_output'], config['prometheus_output'])
+    print("Pipeline complete!")
+
+
+if __name__ == "__main__":
+    main()
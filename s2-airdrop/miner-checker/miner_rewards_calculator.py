@@ -7,21 +7,30 @@ This script fetches miner data from the API, calculates total token rewards
 """
 
 import argparse
-import json
-import requests
 import csv
 import time
 import os
-import boto3
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from address_index import dedupe_addresses
+from async_fetcher import fetch_stats_async, DEFAULT_RATE, DEFAULT_BURST, DEFAULT_MAX_IN_FLIGHT
+from fetch_context import FetchContext, open_fetch_context
+from fetch_control import load_dead_letters, DEFAULT_MAX_RETRIES
+from fetch_journal import open_journal
+from run_metrics import RunMetrics, timed_iter, timed_stage
+from s3_io import S3Target, S3_CACHE_DIR, iter_s3_lines, open_output
+from stats_cache import DEFAULT_CACHE_TTL
+from stats_client import stream_miner_stats
+
 # Constants
-STATS_API_ENDPOINT = "https://11dugoz7j6.execute-api.us-east-1.amazonaws.com/prod/stats"
 S3_BUCKET = "heurist-adhoc-data-query"
 S3_FOLDER = "season2-miners/"
 S3_ADDRESS_FILE = "s2-miner-addresses-2025-03-04T19-50-31-507Z.txt"
 DEFAULT_OUTPUT_FILE = f"miner_rewards_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+REWARDS_HEADERS = ['Address', 'S2 waifu_reward_tokens', 'S2 llama_reward_tokens', 'S2 Total Base Tokens']
+JOURNAL_FILE = "miner_rewards.journal.jsonl"  # Fixed name so --resume finds it across timestamped runs
+DEAD_LETTER_FILE = "miner_rewards.dead_letter.jsonl"  # Miners that failed every retry
 
 def parse_arguments():
     """Parse command line arguments"""
@@ -31,10 +40,32 @@ def parse_arguments():
     parser.add_argument('--max-miners', type=int, default=0, help='Maximum number of miners to process (for testing)')
     parser.add_argument('--workers', type=int, default=10, help='Number of worker threads for parallel processing')
     parser.add_argument('--delay', type=float, default=0.1, help='Delay between API requests in seconds')
+    parser.add_argument('--async-fetch', action='store_true', help='Fetch with the asyncio engine and a token-bucket rate limiter')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='Requests per second for --async-fetch (0 disables limiting)')
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST, help='Token-bucket burst size for --async-fetch')
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT, help='Maximum concurrent requests for --async-fetch')
+    parser.add_argument('--cache-dir', type=str, help='Directory of the on-disk stats cache (disabled if omitted)')
+    parser.add_argument('--cache-ttl', type=int, default=DEFAULT_CACHE_TTL, help='Seconds before a cached payload is refetched (0 = never)')
+    parser.add_argument('--offline', action='store_true', help='Only read payloads from the stats cache, never call the API')
+    parser.add_argument('--journal', type=str, default=JOURNAL_FILE, help='Checkpoint journal of completed miners')
+    parser.add_argument('--resume', action='store_true', help='Skip miners already completed in the checkpoint journal')
+    parser.add_argument('--max-retries', type=int, default=DEFAULT_MAX_RETRIES, help='Retries for 429/5xx/timeouts before a miner is dead-lettered')
+    parser.add_argument('--adaptive', action='store_true', help='Adapt concurrency with AIMD up to --workers (--max-in-flight with --async-fetch) instead of using --delay')
+    parser.add_argument('--dead-letter', type=str, default=DEAD_LETTER_FILE, help='File recording miners that could not be fetched')
+    parser.add_argument('--redrive', type=str, help='Only fetch the addresses recorded in this dead-letter file (add --resume to keep earlier results)')
+    parser.add_argument('--bulk-source', type=str, help='Read every miner from one bulk query instead of the API: postgresql://..., sqlite:///path, a bulk export .csv, or a payload archive directory')
+    parser.add_argument('--bulk-query', type=str, help='SQL file replacing the default bulk query (see stats_source.py)')
     parser.add_argument('--output', type=str, default=DEFAULT_OUTPUT_FILE, help='Output CSV file path')
-    parser.add_argument('--upload-s3', action='store_true', help='Upload results to S3')
+    parser.add_argument('--upload-s3', action='store_true', help='Stream results to S3 while they are written')
+    parser.add_argument('--s3-endpoint-url', type=str, help='S3-compatible endpoint to use instead of AWS (e.g. a local MinIO)')
+    parser.add_argument('--stream', action='store_true', help='Write each miner as soon as its stats arrive, unsorted, keeping memory flat')
+    parser.add_argument('--metrics-output', type=str, help='Write the run metrics (stage timings, API latency histogram, status counts) as JSON')
+    parser.add_argument('--prometheus-output', type=str, help='Write the run metrics in the Prometheus text format')
     
-    return vars(parser.parse_args())
+    args = parser.parse_args()
+    if args.stream and args.async_fetch:
+        parser.error('--stream uses the thread pool and cannot be combined with --async-fetch')
+    return vars(args)
 
 def get_miner_addresses(config):
     """Get list of miner addresses from file or S3"""
@@ -51,17 +82,17 @@ def get_miner_addresses(config):
         # Use provided S3 key or default to the predefined path
         s3_key = config['s3_key'] if config['s3_key'] else f"{S3_FOLDER}{S3_ADDRESS_FILE}"
         try:
-            s3_client = boto3.client('s3')
-            response = s3_client.get_object(
-                Bucket=S3_BUCKET,
-                Key=s3_key
-            )
-            content = response['Body'].read().decode('utf-8')
-            addresses = [addr.strip() for addr in content.split('\n') if addr.strip()]
+            addresses = list(iter_s3_lines(S3_BUCKET, s3_key, config['s3_endpoint_url'], S3_CACHE_DIR))
             print(f"Loaded {len(addresses)} addresses from S3: {s3_key}")
         except Exception as e:
             print(f"Error retrieving addresses from S3: {e}")
     
+    # Fetch every miner once, even if the list repeats it in another case
+    loaded_count = len(addresses)
+    addresses = dedupe_addresses(addresses)
+    if len(addresses) < loaded_count:
+        print(f"Dropped {loaded_count - len(addresses)} duplicate addresses")
+    
     # Limit number of addresses if specified
     if config['max_miners'] and config['max_miners'] > 0:
         addresses = addresses[:config['max_miners']]
@@ -69,59 +100,39 @@ def get_miner_addresses(config):
     
     return addresses
 
-def fetch_miner_stats(address):
-    """Fetch complete stats for a specific miner address using the API endpoint"""
-    url = f"{STATS_API_ENDPOINT}?minerId={address}"
-    try:
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            try:
-                # Handle response based on content type
-                if isinstance(response.text, str):
-                    data = json.loads(response.text)
-                else:
-                    data = response.json()
-                
-                # Add the address to the data for reference
-                return {
-                    'address': address,
-                    'data': data
-                }
-            except json.JSONDecodeError:
-                print(f"Failed to parse JSON for {address}")
-                return None
-        else:
-            print(f"Error fetching data for {address}: HTTP {response.status_code}")
-            return None
-    except Exception as e:
-        print(f"Exception when fetching {address}: {e}")
-        return None
-
-def fetch_stats_parallel(addresses, max_workers, delay):
+def fetch_stats_parallel(addresses, max_workers, delay, context=None):
     """Fetch stats for multiple addresses in parallel with rate limiting"""
-    results = []
+    context = context or FetchContext()
     success_count = 0
     failure_count = 0
     
     print(f"Fetching data for {len(addresses)} addresses using {max_workers} workers...")
     
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        for i, result in enumerate(executor.map(fetch_miner_stats, addresses)):
+    # One pooled connection per worker so every request reuses a warm connection
+    with context.client(max_workers) as client, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Cached payloads are served straight from disk, without the rate-limit delay
+        results, remaining = client.split_cached(addresses)
+        if results:
+            print(f"Loaded {len(results)} miners from the stats cache")
+        for result in results:
+            context.record(result)
+        for i, result in enumerate(executor.map(client.fetch_remote, remaining)):
             if result:
                 results.append(result)
                 success_count += 1
+                context.record(result)
             else:
                 failure_count += 1
             
             # Print progress every 10 addresses
-            if (i + 1) % 10 == 0 or i + 1 == len(addresses):
-                print(f"Progress: {i+1}/{len(addresses)} (success: {success_count}, failed: {failure_count})")
+            if (i + 1) % 10 == 0 or i + 1 == len(remaining):
+                print(f"Progress: {i+1}/{len(remaining)} (success: {success_count}, failed: {failure_count})")
             
             # Add delay to avoid rate limiting
             if delay > 0:
                 time.sleep(delay)
     
-    print(f"Completed fetching data. Success: {success_count}, Failed: {failure_count}")
+    print(f"Completed fetching data. Cached: {len(results) - success_count}, Success: {success_count}, Failed: {failure_count}")
     return results
 
 def calculate_token_rewards(miner_stats):
@@ -155,28 +166,22 @@ def calculate_token_rewards(miner_stats):
     
     return processed_data
 
-def save_to_csv(processed_data, output_file):
-    """Save processed reward data to CSV file"""
+def save_to_csv(processed_data, output_file, s3=None):
+    """Save processed reward data to CSV file, streaming it to the S3Target s3 as well if given"""
     if not processed_data:
         print("No data to save")
         return None
     
-    # Create header and sort data by total rewards (descending)
-    headers = ['Address', 'S2 waifu_reward_tokens', 'S2 llama_reward_tokens', 'S2 Total Base Tokens']
+    # Sort data by total rewards (descending)
     sorted_data = sorted(processed_data, key=lambda x: x['total_reward_tokens'], reverse=True)
     
     try:
-        with open(output_file, 'w', newline='') as f:
+        with open_output(output_file, s3) as f:
             writer = csv.writer(f)
-            writer.writerow(headers)
+            writer.writerow(REWARDS_HEADERS)
             
             for item in sorted_data:
-                writer.writerow([
-                    item['address'],
-                    item['waifu_reward_tokens'],
-                    item['llama_reward_tokens'],
-                    item['total_reward_tokens']
-                ])
+                writer.writerow(reward_row(item))
         
         print(f"Saved data to {output_file}")
         return output_file
@@ -184,50 +189,107 @@ def save_to_csv(processed_data, output_file):
         print(f"Error saving to CSV: {e}")
         return None
 
-def upload_to_s3(file_path):
-    """Upload file to S3 bucket"""
-    if not file_path or not os.path.exists(file_path):
-        print("File not found, cannot upload to S3")
-        return
-    
+def reward_row(item):
+    """Build one CSV row of the rewards file"""
+    return [
+        item['address'],
+        item['waifu_reward_tokens'],
+        item['llama_reward_tokens'],
+        item['total_reward_tokens']
+    ]
+
+def stream_to_csv(addresses, config, context, delay, s3=None):
+    """
+    Fetch, calculate and write each miner's rewards as soon as its stats arrive.
+    Rows are written in completion order rather than sorted by total rewards.
+    """
+    output_file = config['output']
+    count = 0
     try:
-        file_name = os.path.basename(file_path)
-        s3_key = f"rewards/{file_name}"
-        
-        s3_client = boto3.client('s3')
-        s3_client.upload_file(file_path, S3_BUCKET, s3_key)
-        
-        print(f"Uploaded {file_path} to S3: {S3_BUCKET}/{s3_key}")
+        with open_output(output_file, s3) as f:
+            writer = csv.writer(f)
+            writer.writerow(REWARDS_HEADERS)
+            
+            stream = stream_miner_stats(addresses, config['workers'], delay, context,
+                                        config['journal'], config['resume'])
+            for i, miner in enumerate(timed_iter(context.metrics, 'fetch', stream)):
+                with timed_stage(context.metrics, 'transform'):
+                    rows = [reward_row(item) for item in calculate_token_rewards([miner])]
+                with timed_stage(context.metrics, 'write'):
+                    writer.writerows(rows)
+                count += 1
+                if (i + 1) % 100 == 0:
+                    print(f"Progress: {i+1}/{len(addresses)} written")
+            if s3 and not count:
+                f.cancel_upload()  # Nothing to upload, as before streaming
     except Exception as e:
-        print(f"Error uploading to S3: {e}")
+        print(f"Error saving to CSV: {e}")
+        return None
+    
+    print(f"Saved data for {count} miners to {output_file}")
+    return output_file if count else None
+
+def s3_output_key(file_path):
+    """S3 key the rewards file is streamed to"""
+    return f"rewards/{os.path.basename(file_path)}"
 
 def main():
     """Main function to run the reward calculation process"""
     # Parse command line arguments
     config = parse_arguments()
+    metrics = RunMetrics('miner_rewards_calculator')
     
-    # Get miner addresses
-    addresses = get_miner_addresses(config)
+    # Get miner addresses, or only the failures of an earlier run when re-driving
+    with metrics.stage('address_load'):
+        if config['redrive']:
+            addresses = load_dead_letters(config['redrive'])
+        else:
+            addresses = get_miner_addresses(config)
     if not addresses:
         print("No addresses found. Please provide a valid address file or S3 key.")
         return
     
+    # The adaptive controller replaces the fixed delay
+    delay = 0 if config['adaptive'] else config['delay']
+    max_concurrency = config['max_in_flight'] if config['async_fetch'] else config['workers']
+    # The results go to S3 as they are written, instead of being uploaded afterwards
+    s3 = S3Target(S3_BUCKET, s3_output_key(config['output']), config['s3_endpoint_url']) if config['upload_s3'] else None
+    if config['stream']:
+        context = open_fetch_context(config, max_concurrency, metrics=metrics)
+        stream_to_csv(addresses, config, context, delay, s3)
+        context.close()
+        metrics.save(config['metrics_output'], config['prometheus_output'])
+        print("Token rewards calculation completed.")
+        return
+    
     # Fetch miner stats
-    miner_stats = fetch_stats_parallel(addresses, config['workers'], config['delay'])
+    # Reuse miners completed by an earlier run and only fetch the rest
+    journal, miner_stats = open_journal(config['journal'], config['resume'])
+    completed = {miner['address'] for miner in miner_stats}
+    addresses = [address for address in addresses if address not in completed]
+    context = open_fetch_context(config, max_concurrency, journal, metrics)
+    with metrics.stage('fetch'):
+        if config['async_fetch']:
+            print(f"Fetching data for {len(addresses)} addresses at {config['rate']} req/s "
+                  f"with up to {config['max_in_flight']} requests in flight...")
+            miner_stats += fetch_stats_async(addresses, config['rate'], config['burst'], config['max_in_flight'],
+                                             context=context)
+        else:
+            miner_stats += fetch_stats_parallel(addresses, config['workers'], delay, context)
+    context.close()
     if not miner_stats:
         print("No miner stats retrieved. Exiting.")
         return
     
     # Calculate token rewards
-    processed_data = calculate_token_rewards(miner_stats)
+    with metrics.stage('transform'):
+        processed_data = calculate_token_rewards(miner_stats)
     
     # Save to CSV
-    output_file = save_to_csv(processed_data, config['output'])
-    
-    # Upload to S3 if requested
-    if config['upload_s3'] and output_file:
-        upload_to_s3(output_file)
+    with metrics.stage('write'):
+        save_to_csv(processed_data, config['output'], s3)
     
+    metrics.save(config['metrics_output'], config['prometheus_output'])
     print("Token rewards calculation completed.")
 
 if __name__ == "__main__":
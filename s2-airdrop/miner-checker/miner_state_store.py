@@ -0,0 +1,264 @@
+"""
+Incremental per-miner state for daily refresh runs
+
+A small SQLite database keeps each miner's daily s2Rewards history, running
+reward totals, calendar-aligned activity bits and the date of the last day
+merged. Merging a freshly fetched payload only writes the days from that
+last date onwards (the last stored day is merged again because it may have
+been partial when it was fetched), so a daily refresh touches one or two
+rows per miner instead of rewriting the whole season. Derived outputs are
+then rebuilt from the stored state rather than from the fetched payloads.
+Payloads in the older dailyPoints shape are stored as the same daily rows,
+with their points and no reward tokens.
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+from activity_matrix import ActivityMatrix, CHANNELS, LLAMA, WAIFU, day_offset
+
+# Configuration
+DEFAULT_STATE_DB = 'miner_state.sqlite'
+DEFAULT_COMMIT_EVERY = 500  # Merged miners between commits
+REWARD_FIELDS = ('llama_points', 'waifu_points', 'llama_reward_tokens', 'waifu_reward_tokens')
+DAILY_POINTS_FIELDS = ('daily_llama_points', 'daily_waifu_points')  # dailyPoints names of the two points fields
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS miners (
+    address TEXT PRIMARY KEY,
+    last_daily_date TEXT,
+    days_active INTEGER NOT NULL,
+    total_llama_reward_tokens REAL NOT NULL,
+    total_waifu_reward_tokens REAL NOT NULL,
+    activity BLOB NOT NULL,
+    summary TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily_rewards (
+    address TEXT NOT NULL,
+    daily_date TEXT NOT NULL,
+    llama_points REAL NOT NULL,
+    waifu_points REAL NOT NULL,
+    llama_reward_tokens REAL NOT NULL,
+    waifu_reward_tokens REAL NOT NULL,
+    PRIMARY KEY (address, daily_date)
+) WITHOUT ROWID;
+"""
+
+
+class MinerStateStore:
+    """SQLite-backed daily history, totals and activity bits per miner"""
+
+    def __init__(self, path, start_seconds, days, commit_every=DEFAULT_COMMIT_EVERY):
+        self.path = path
+        self.start_seconds = start_seconds
+        self.days = days
+        self.start_date = datetime.utcfromtimestamp(start_seconds).date()
+        self.day_bytes = (days + 7) // 8
+        self.commit_every = max(1, commit_every)
+        self.merged = 0
+        self.unchanged = 0
+        self.days_merged = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._check_calendar()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM miners").fetchone()[0]
+
+    def _check_calendar(self):
+        """Record the season calendar on first use and refuse a store built for another one"""
+        calendar = f"{self.start_seconds}:{self.days}"
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'calendar'").fetchone()
+        if row is None:
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('calendar', ?)", (calendar,))
+            self._conn.commit()
+        elif row[0] != calendar:
+            raise ValueError(f"State store {self.path} was built for calendar {row[0]}, not {calendar}")
+
+    def _set_bit(self, activity, channel, offset, value):
+        index = channel * self.day_bytes + (offset >> 3)
+        mask = 0x80 >> (offset & 7)
+        if value:
+            activity[index] |= mask
+        else:
+            activity[index] &= ~mask & 0xFF
+
+    @staticmethod
+    def _daily_rows(data):
+        """
+        Return a payload's days sorted by date, each with daily_date and the
+        REWARD_FIELDS, and the summary to store without them. An empty list in
+        the summary marks which of s2Rewards or dailyPoints the days came from.
+        """
+        if 's2Rewards' in data:
+            days = data['s2Rewards'] or []
+            summary = dict(data, s2Rewards=[])
+        elif 'dailyPoints' in data:
+            days = [{'daily_date': day['daily_date'],
+                     'llama_points': day.get(DAILY_POINTS_FIELDS[0]),
+                     'waifu_points': day.get(DAILY_POINTS_FIELDS[1])}
+                    for day in data['dailyPoints'] or []]
+            summary = dict(data, dailyPoints=[])
+        else:
+            days, summary = [], data
+        return sorted(days, key=lambda day: day['daily_date']), summary
+
+    def merge(self, miner_stats):
+        """Merge one fetched payload, returning how many days were new or changed"""
+        if not miner_stats or 'data' not in miner_stats:
+            return 0
+
+        address = miner_stats['address']
+        data = miner_stats['data']
+        days, summary = self._daily_rows(data)
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_daily_date, days_active, total_llama_reward_tokens, total_waifu_reward_tokens, activity "
+                "FROM miners WHERE address = ?", (address,)).fetchone()
+            if row:
+                last, days_active, llama_total, waifu_total, activity = row
+                activity = bytearray(activity)
+            else:
+                last, days_active, llama_total, waifu_total = None, 0, 0.0, 0.0
+                activity = bytearray(CHANNELS * self.day_bytes)
+
+            changed = 0
+            for day in days:
+                daily_date = day['daily_date']
+                if last is not None and daily_date < last:
+                    continue
+                values = tuple(float(day.get(field) or 0) for field in REWARD_FIELDS)
+
+                old = None
+                if daily_date == last:
+                    old = self._conn.execute(
+                        "SELECT llama_points, waifu_points, llama_reward_tokens, waifu_reward_tokens "
+                        "FROM daily_rewards WHERE address = ? AND daily_date = ?", (address, daily_date)).fetchone()
+                if old is not None:
+                    if tuple(old) == values:
+                        continue
+                    llama_total -= old[2]
+                    waifu_total -= old[3]
+                else:
+                    days_active += 1
+
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO daily_rewards (address, daily_date, llama_points, waifu_points, "
+                    "llama_reward_tokens, waifu_reward_tokens) VALUES (?, ?, ?, ?, ?, ?)", (address, daily_date) + values)
+                llama_total += values[2]
+                waifu_total += values[3]
+                offset = day_offset(daily_date, self.start_date)
+                if 0 <= offset < self.days:
+                    self._set_bit(activity, LLAMA, offset, values[0] > 0)
+                    self._set_bit(activity, WAIFU, offset, values[1] > 0)
+                changed += 1
+
+            if days and (last is None or days[-1]['daily_date'] > last):
+                last = days[-1]['daily_date']
+            self._conn.execute(
+                "INSERT OR REPLACE INTO miners (address, last_daily_date, days_active, total_llama_reward_tokens, "
+                "total_waifu_reward_tokens, activity, summary, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (address, last, days_active, llama_total, waifu_total, bytes(activity),
+                 json.dumps(summary, separators=(',', ':')), datetime.now(timezone.utc).isoformat()))
+
+            self.merged += 1
+            self.days_merged += changed
+            if not changed:
+                self.unchanged += 1
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._conn.commit()
+                self._pending = 0
+        return changed
+
+    def commit(self):
+        """Commit merges still pending"""
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def iter_payloads(self):
+        """
+        Yield every stored miner as an {'address', 'data'} payload, ordered by
+        address, so the scripts' existing transforms can rebuild their outputs.
+        Daily entries carry only daily_date and the REWARD_FIELDS (the two
+        DAILY_POINTS_FIELDS for a dailyPoints payload).
+        """
+        self.commit()
+        daily = self._conn.execute(
+            "SELECT address, daily_date, llama_points, waifu_points, llama_reward_tokens, waifu_reward_tokens "
+            "FROM daily_rewards ORDER BY address, daily_date")
+        pending = daily.fetchone()
+        for address, summary in self._conn.execute("SELECT address, summary FROM miners ORDER BY address"):
+            rewards = []
+            while pending is not None and pending[0] < address:
+                pending = daily.fetchone()
+            while pending is not None and pending[0] == address:
+                rewards.append(dict(zip(('daily_date',) + REWARD_FIELDS, pending[1:])))
+                pending = daily.fetchone()
+
+            data = json.loads(summary)
+            if 's2Rewards' in data:
+                data['s2Rewards'] = rewards
+            elif 'dailyPoints' in data:
+                data['dailyPoints'] = [
+                    {'daily_date': day['daily_date'], DAILY_POINTS_FIELDS[0]: day['llama_points'],
+                     DAILY_POINTS_FIELDS[1]: day['waifu_points']}
+                    for day in rewards]
+            yield {'address': address, 'data': data}
+
+    def activity_matrix(self, predicate=None):
+        """Stored activity bits as an ActivityMatrix, optionally only for addresses passing predicate"""
+        self.commit()
+        addresses = []
+        blobs = []
+        for address, activity in self._conn.execute("SELECT address, activity FROM miners ORDER BY address"):
+            if predicate is None or predicate(address):
+                addresses.append(address.encode('ascii'))
+                blobs.append(activity)
+        bits = np.frombuffer(b''.join(blobs), dtype=np.uint8).reshape(len(blobs), CHANNELS, self.day_bytes)
+        addresses = np.array(addresses, dtype=bytes) if addresses else np.zeros(0, dtype='S42')
+        return ActivityMatrix(addresses, bits, self.start_seconds, self.days)
+
+    def report(self):
+        """Print a one-line summary of this run's merges"""
+        print(f"State store: merged {self.merged} miners ({self.days_merged} new or changed days, "
+              f"{self.unchanged} unchanged), {len(self)} miners stored in {self.path}")
+
+    def close(self):
+        """Commit and close the database"""
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
+
+
+def open_state_store(path, start_seconds, days):
+    """Open the state store for an incremental run, or return None when incremental mode is off"""
+    if not path:
+        return None
+    store = MinerStateStore(path, start_seconds, days)
+    print(f"Incremental mode: {len(store)} miners already in {path}")
+    return store
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Streaming reader and binary index of the top-miner stats JSON
+
+The top-miner stats file is one JSON array of objects. Instead of loading it
+whole with json.load, the array is read in chunks and decoded one object at
+a time. Only the fields the rewards filter needs are kept: the 20-byte
+address key (see address_index.py), totalTokens, revisedTokens (NaN when an
+entry was not revised), numGPUs and startDate (milliseconds since the epoch).
+They go into NumPy columns a chunk of entries at a time, so memory stays at
+a few dozen bytes per miner instead of a dict per entry, and at no point is
+more than one read chunk of the JSON text held.
+
+The columns are sorted by key with the last entry winning for a repeated
+address, as the former dict did, and can be persisted next to the JSON as a
+binary sidecar: an 8-byte magic, the entry count, the size and mtime of the
+JSON it was built from, then each column as raw bytes. Later loads find the
+sidecar still matching the JSON and memory-map it instead of parsing again.
+"""
+
+import argparse
+import json
+import os
+import re
+import struct
+import time
+from itertools import compress, islice
+
+import numpy as np
+
+from address_index import KEY_DTYPE, RAW_DTYPE, format_address, to_keys
+
+# Defaults
+READ_CHUNK_SIZE = 1024 ** 2  # Characters of JSON read at a time
+FLUSH_ENTRIES = 16384  # Entries parsed before they are packed into NumPy columns
+SIDECAR_SUFFIX = '.idx'
+STATS_MAGIC = b'MINSTAT1'
+HEADER = struct.Struct('<8sQQq')  # magic, entries, JSON size, JSON mtime in ns
+NO_START = np.iinfo(np.int64).min  # startDate missing or unparsable
+COLUMNS = (  # Column name, dtype, in sidecar order after the keys
+    ('total_tokens', np.dtype('<f8')),
+    ('revised_tokens', np.dtype('<f8')),
+    ('num_gpus', np.dtype('<i8')),
+    ('start_ms', np.dtype('<i8')),
+)
+_SEPARATORS = re.compile(r'[\s,]*')
+
+
+def iter_json_array(file_path, chunk_size=READ_CHUNK_SIZE):
+    """Yield the elements of a top-level JSON array, decoding one element at a time from a chunked read"""
+    decode = json.JSONDecoder().raw_decode
+    skip = _SEPARATORS.match
+    with open(file_path, 'r', encoding='utf-8') as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f"{file_path} does not hold a JSON array")
+        position = 1
+        more = True
+        while True:
+            # Refill once less than half a chunk is left, so an element is rarely cut off
+            if more and len(buffer) - position < chunk_size // 2:
+                chunk = f.read(chunk_size)
+                more = bool(chunk)
+                buffer = buffer[position:] + chunk
+                position = 0
+            position = skip(buffer, position).end()
+            if position == len(buffer):
+                if more:
+                    continue
+                raise ValueError(f"{file_path} ends before its JSON array is closed")
+            if buffer[position] == ']':
+                return
+            try:
+                element, end = decode(buffer, position)
+            except json.JSONDecodeError:
+                if not more:
+                    raise
+                end = None
+            if end is None or (end == len(buffer) and more):
+                # An element longer than what is buffered: read further and decode it again
+                chunk = f.read(chunk_size)
+                more = bool(chunk)
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield element
+            position = end
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _numbers(values):
+    """Float column from JSON values, NaN for missing or non-numeric ones"""
+    try:
+        return np.array(values, dtype='<f8')  # None becomes NaN
+    except (TypeError, ValueError):
+        return np.array([_number(value) for value in values], dtype='<f8')
+
+
+def _start_ms(values):
+    """ISO startDate strings as milliseconds since the epoch, NO_START where missing"""
+    dates = np.array([value.rstrip('Z') if isinstance(value, str) and value else 'NaT' for value in values],
+                     dtype='datetime64[ms]')
+    return np.where(np.isnat(dates), NO_START, dates.astype(np.int64))
+
+
+class MinerStatsTable:
+    """The kept top-miner fields as NumPy columns, sorted by 20-byte address key"""
+
+    def __init__(self, keys, columns, entries=None, invalid=0):
+        self.keys = keys  # Sorted and unique
+        self.columns = columns  # name -> array aligned with keys
+        self.entries = len(keys) if entries is None else entries
+        self.invalid = invalid
+
+    @classmethod
+    def from_entries(cls, entries):
+        """Build from an iterable of stats objects, packing FLUSH_ENTRIES at a time"""
+        key_chunks = []
+        column_chunks = {name: [] for name, _ in COLUMNS}
+        count = invalid = 0
+        entries = iter(entries)
+        while True:
+            batch = list(islice(entries, FLUSH_ENTRIES))
+            if not batch:
+                break
+            count += len(batch)
+            keys, valid = to_keys([entry.get('address') if isinstance(entry, dict) else None for entry in batch])
+            invalid += int((~valid).sum())
+            key_chunks.append(keys[valid])
+            kept = list(compress(batch, valid.tolist()))
+            column_chunks['total_tokens'].append(_numbers([e.get('totalTokens') for e in kept]))
+            column_chunks['revised_tokens'].append(_numbers([e.get('revisedTokens') for e in kept]))
+            gpus = _numbers([e.get('numGPUs') for e in kept])
+            column_chunks['num_gpus'].append(np.where(np.isfinite(gpus), gpus, 0).astype('<i8'))
+            column_chunks['start_ms'].append(_start_ms([e.get('startDate') for e in kept]))
+
+        keys = np.concatenate(key_chunks) if key_chunks else np.zeros(0, dtype=KEY_DTYPE)
+        columns = {name: np.concatenate(column_chunks[name]) if column_chunks[name] else np.zeros(0, dtype=dtype)
+                   for name, dtype in COLUMNS}
+        # Last entry wins for a repeated address: keep the last of each run after a stable sort
+        order = np.argsort(keys.view(RAW_DTYPE), kind='stable')
+        keys = keys[order]
+        last = np.r_[keys[1:] != keys[:-1], True] if len(keys) else np.zeros(0, dtype=bool)
+        return cls(keys[last], {name: column[order][last] for name, column in columns.items()}, count, invalid)
+
+    @classmethod
+    def from_json(cls, file_path):
+        """Stream-parse a top-miner stats JSON array"""
+        return cls.from_entries(iter_json_array(file_path))
+
+    @classmethod
+    def open(cls, file_path, sidecar=True):
+        """
+        Load the stats of a JSON file from its sidecar index when the index
+        matches the file, else parse the JSON and (re)write the sidecar
+        """
+        sidecar_path = file_path + SIDECAR_SUFFIX
+        if sidecar and os.path.exists(sidecar_path):
+            try:
+                return cls.load(sidecar_path, source=file_path)
+            except ValueError as e:
+                print(f"Rebuilding {sidecar_path}: {e}")
+        table = cls.from_json(file_path)
+        if sidecar:
+            try:
+                table.save(sidecar_path, source=file_path)
+            except OSError as e:
+                print(f"Could not write the stats index {sidecar_path}: {e}")
+        return table
+
+    def __len__(self):
+        return len(self.keys)
+
+    def tokens(self):
+        """Effective token total per miner: revisedTokens where present, else totalTokens"""
+        revised = self.columns['revised_tokens']
+        return np.where(np.isnan(revised), self.columns['total_tokens'], revised)
+
+    def lookup(self, keys, valid=None):
+        """Positions of the keys in the table, -1 where an address has no stats"""
+        keys = np.ascontiguousarray(keys, dtype=KEY_DTYPE)
+        positions = np.full(len(keys), -1, dtype=np.int64)
+        if not len(self.keys) or not len(keys):
+            return positions
+        sorted_keys = np.ascontiguousarray(self.keys).view(RAW_DTYPE)
+        probe = keys.view(RAW_DTYPE)
+        found = np.minimum(np.searchsorted(sorted_keys, probe), len(sorted_keys) - 1)
+        hit = sorted_keys[found] == probe
+        if valid is not None:
+            hit &= valid
+        positions[hit] = found[hit]
+        return positions
+
+    def tokens_for(self, keys, valid=None):
+        """Effective token totals aligned with the keys, NaN where an address has no stats"""
+        positions = self.lookup(keys, valid)
+        result = np.full(len(positions), np.nan)
+        hit = positions >= 0
+        result[hit] = self.tokens()[positions[hit]]
+        return result
+
+    def entry(self, address):
+        """The kept fields of one address as a dict, or None"""
+        keys, valid = to_keys([address])
+        position = int(self.lookup(keys, valid)[0])
+        if position < 0:
+            return None
+        start = int(self.columns['start_ms'][position])
+        revised = float(self.columns['revised_tokens'][position])
+        return {
+            'address': format_address(self.keys[position]),
+            'totalTokens': float(self.columns['total_tokens'][position]),
+            'revisedTokens': None if np.isnan(revised) else revised,
+            'numGPUs': int(self.columns['num_gpus'][position]),
+            'startDate': None if start == NO_START else f"{np.datetime64(start, 'ms')}Z",
+        }
+
+    def save(self, path, source=None):
+        """Write the magic, the entry count, the source JSON's size and mtime, the keys and each column"""
+        size, mtime = _source_stamp(source)
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(STATS_MAGIC, len(self.keys), size, mtime))
+            f.write(np.ascontiguousarray(self.keys).tobytes())
+            for name, dtype in COLUMNS:
+                f.write(np.ascontiguousarray(self.columns[name], dtype=dtype).tobytes())
+
+    @classmethod
+    def load(cls, path, source=None, mmap=True):
+        """Read a sidecar written by save, refusing it if source is given and has changed since"""
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size or not header.startswith(STATS_MAGIC):
+            raise ValueError(f"{path} is not a miner stats index")
+        _, count, size, mtime = HEADER.unpack(header)
+        if source is not None and (size, mtime) != _source_stamp(source):
+            raise ValueError(f"{source} changed since the index was built")
+        expected = HEADER.size + count * (KEY_DTYPE.itemsize + sum(dtype.itemsize for _, dtype in COLUMNS))
+        if os.path.getsize(path) != expected:
+            raise ValueError(f"{path} is truncated")
+
+        def column(dtype, offset):
+            if not count:
+                return np.zeros(0, dtype=dtype)
+            if mmap:
+                return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+            return np.fromfile(path, dtype=dtype, count=count, offset=offset)
+
+        offset = HEADER.size
+        keys = column(KEY_DTYPE, offset)
+        offset += count * KEY_DTYPE.itemsize
+        columns = {}
+        for name, dtype in COLUMNS:
+            columns[name] = column(dtype, offset)
+            offset += count * dtype.itemsize
+        return cls(keys, columns)
+
+    def report(self):
+        revised = int((~np.isnan(self.columns['revised_tokens'])).sum())
+        print(f"Top-miner stats: {self.entries} entries -> {len(self.keys)} miners "
+              f"({revised} revised, {self.invalid} invalid addresses dropped)")
+
+
+def _source_stamp(source):
+    """(size, mtime in ns) of the JSON an index was built from, zeros without one"""
+    if source is None:
+        return 0, 0
+    stat = os.stat(source)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Build the binary index of a top-miner stats JSON')
+    parser.add_argument('stats_file', type=str, help='Top-miner stats JSON array')
+    parser.add_argument('--lookup', type=str, metavar='ADDRESS', help='Print the kept fields of one address')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    started = time.time()
+    table = MinerStatsTable.open(args.stats_file)
+    print(f"Loaded {len(table)} miners from {args.stats_file} (index {args.stats_file + SIDECAR_SUFFIX}) "
+          f"in {time.time() - started:.2f}s")
+    if args.lookup:
+        entry = table.entry(args.lookup)
+        print(json.dumps(entry, indent=2) if entry else f"No stats for {args.lookup}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Columnar Parquet output for the complete miner dataset
+
+Writes the same per-miner records as the complete data CSV, but with a typed
+Arrow schema: daily s2Rewards become a nested list<struct> column instead of
+an escaped JSON string, and the llama/waifu activity patterns are packed
+bitmaps (one bit per rewarded day, most significant bit first, the layout
+numpy.unpackbits expects). Rows are written in row groups, so the writer can
+be fed one miner at a time in stream mode, and the file can be streamed to
+S3 as it is written.
+"""
+
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from s3_io import open_output
+
+OUTPUT_PARQUET = 'miners_complete_data.parquet'
+PARQUET_COMPRESSION = 'zstd'
+ROW_GROUP_SIZE = 5000  # Miners buffered before a row group is written
+
+DAILY_REWARD_TYPE = pa.struct([
+    ('daily_date', pa.date32()),
+    ('llama_points', pa.float64()),
+    ('waifu_points', pa.float64()),
+    ('llama_reward_tokens', pa.float64()),
+    ('waifu_reward_tokens', pa.float64()),
+])
+
+COMPLETE_DATA_SCHEMA = pa.schema([
+    ('address', pa.string()),
+    ('hardware', pa.string()),
+    ('status', pa.string()),
+    ('totalImageCount', pa.int64()),
+    ('totalTextCount', pa.int64()),
+    ('last24HrsImageCount', pa.int64()),
+    ('last24HrsTextCount', pa.int64()),
+    ('last24HrsAvailability', pa.float64()),
+    ('totalLlamaPoints', pa.float64()),
+    ('totalWaifuPoints', pa.float64()),
+    ('s2CurrentEpochLlamaPoints', pa.float64()),
+    ('s2CurrentEpochWaifuPoints', pa.float64()),
+    ('s2CurrentEpochLlamaRewards', pa.float64()),
+    ('s2CurrentEpochWaifuRewards', pa.float64()),
+    ('days_active', pa.int32()),
+    ('first_active_day', pa.date32()),
+    ('last_active_day', pa.date32()),
+    ('total_llama_reward_tokens', pa.float64()),
+    ('total_waifu_reward_tokens', pa.float64()),
+    ('days_with_llama', pa.int32()),
+    ('days_with_waifu', pa.int32()),
+    ('llama_pattern', pa.binary()),  # Packed bitmap over s2_rewards, days_active bits long
+    ('waifu_pattern', pa.binary()),
+    ('s2_rewards', pa.list_(DAILY_REWARD_TYPE)),
+])
+
+
+def parse_day(value):
+    """Convert an API daily_date ('YYYY-MM-DD', optionally with a time part) to a date"""
+    if not value:
+        return None
+    return date.fromisoformat(str(value)[:10])
+
+
+def to_float(value):
+    """Coerce an API number (possibly a numeric string or null) to float"""
+    try:
+        return float(value) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def to_int(value):
+    """Coerce an API count (possibly a numeric string or null) to int"""
+    try:
+        return int(float(value)) if value is not None else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def pack_bits(flags):
+    """Pack a sequence of booleans into bytes, most significant bit first"""
+    packed = bytearray((len(flags) + 7) // 8)
+    for i, flag in enumerate(flags):
+        if flag:
+            packed[i >> 3] |= 0x80 >> (i & 7)
+    return bytes(packed)
+
+
+def unpack_bits(packed, length):
+    """Inverse of pack_bits, returning the first length flags as 0/1 ints"""
+    return [(packed[i >> 3] >> (7 - (i & 7))) & 1 for i in range(length)]
+
+
+def miner_record(miner_stats):
+    """Build one typed Parquet record from a miner payload, or None if it has no data"""
+    if not miner_stats or 'data' not in miner_stats:
+        return None
+
+    data = miner_stats['data']
+    s2Rewards = sorted(data.get('s2Rewards') or [], key=lambda day: day['daily_date'])
+    daily = [{
+        'daily_date': parse_day(day.get('daily_date')),
+        'llama_points': to_float(day.get('llama_points')),
+        'waifu_points': to_float(day.get('waifu_points')),
+        'llama_reward_tokens': to_float(day.get('llama_reward_tokens')),
+        'waifu_reward_tokens': to_float(day.get('waifu_reward_tokens')),
+    } for day in s2Rewards]
+    llama_flags = [day['llama_points'] > 0 for day in daily]
+    waifu_flags = [day['waifu_points'] > 0 for day in daily]
+
+    return {
+        'address': miner_stats['address'],
+        'hardware': data.get('hardware', ''),
+        'status': data.get('status', ''),
+        'totalImageCount': to_int(data.get('totalImageCount')),
+        'totalTextCount': to_int(data.get('totalTextCount')),
+        'last24HrsImageCount': to_int(data.get('last24HrsImageCount')),
+        'last24HrsTextCount': to_int(data.get('last24HrsTextCount')),
+        'last24HrsAvailability': to_float(data.get('last24HrsAvailability')),
+        'totalLlamaPoints': to_float(data.get('totalLlamaPoints')),
+        'totalWaifuPoints': to_float(data.get('totalWaifuPoints')),
+        's2CurrentEpochLlamaPoints': to_float(data.get('s2CurrentEpochLlamaPoints')),
+        's2CurrentEpochWaifuPoints': to_float(data.get('s2CurrentEpochWaifuPoints')),
+        's2CurrentEpochLlamaRewards': to_float(data.get('s2CurrentEpochLlamaRewards')),
+        's2CurrentEpochWaifuRewards': to_float(data.get('s2CurrentEpochWaifuRewards')),
+        'days_active': len(daily),
+        'first_active_day': daily[0]['daily_date'] if daily else None,
+        'last_active_day': daily[-1]['daily_date'] if daily else None,
+        'total_llama_reward_tokens': sum(day['llama_reward_tokens'] for day in daily),
+        'total_waifu_reward_tokens': sum(day['waifu_reward_tokens'] for day in daily),
+        'days_with_llama': sum(llama_flags),
+        'days_with_waifu': sum(waifu_flags),
+        'llama_pattern': pack_bits(llama_flags),
+        'waifu_pattern': pack_bits(waifu_flags),
+        's2_rewards': daily,
+    }
+
+
+class ParquetMinerWriter:
+    """
+    Incremental Parquet writer that flushes a row group every row_group_size
+    miners, streaming the file to the S3Target s3 as well if one is given.
+    """
+
+    def __init__(self, output_file, compression=PARQUET_COMPRESSION, row_group_size=ROW_GROUP_SIZE, s3=None):
+        self.output_file = output_file
+        self.row_group_size = row_group_size
+        self.count = 0
+        self._rows = []
+        self._file = open_output(output_file, s3, binary=True)
+        self._writer = pq.ParquetWriter(self._file, COMPLETE_DATA_SCHEMA, compression=compression)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type and hasattr(self._file, 'abort'):
+            self._writer.close()
+            self._writer = None
+            self._file.abort()  # Never complete the S3 copy of a file that failed halfway
+            return
+        self.close()
+
+    def write(self, record):
+        """Buffer one record from miner_record"""
+        self._rows.append(record)
+        self.count += 1
+        if len(self._rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered records as one row group"""
+        if self._rows:
+            table = pa.Table.from_pylist(self._rows, schema=COMPLETE_DATA_SCHEMA)
+            self._writer.write_table(table)
+            self._rows = []
+
+    def cancel_upload(self):
+        """Keep writing the local file but do not stream it to S3"""
+        if hasattr(self._file, 'cancel_upload'):
+            self._file.cancel_upload()
+
+    def close(self):
+        """Write the last row group and the file footer"""
+        if self._writer is None:
+            return
+        self.flush()
+        self._writer.close()
+        self._writer = None
+        self._file.close()
+
+
+def save_to_parquet(stats_data, output_file=OUTPUT_PARQUET, compression=PARQUET_COMPRESSION, s3=None):
+    """Write miner payloads to a Parquet file (and to s3 if given), returning True if any miner was saved"""
+    try:
+        with ParquetMinerWriter(output_file, compression, s3=s3) as writer:
+            for miner_stats in stats_data:
+                record = miner_record(miner_stats)
+                if record:
+                    writer.write(record)
+            if not writer.count:
+                writer.cancel_upload()  # An empty file is not worth an S3 object
+    except (OSError, pa.ArrowException) as e:
+        print(f"Error saving to Parquet: {e}")
+        return False
+
+    print(f"Saved data for {writer.count} miners to {output_file}")
+    return writer.count > 0
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Sharded, compressed archive of the raw miner stats payloads of a run
+
+Every payload a run consumes is stored as one {'address', 'data'} JSON line,
+the format of the fetch journal, compressed on its own as a gzip member.
+Members are appended to numbered shards (payloads-00000.jsonl.gz, ...) that
+roll over at a size limit. A shard is still an ordinary gzip file, so zcat
+prints it as JSON lines, yet any one miner can be read by decompressing its
+member alone. Members are written with a zero mtime, so the same payloads
+always compress to the same bytes.
+
+Closing the archive writes two sidecars. index.bin holds the 20-byte address
+keys (see address_index.py), sorted, with each member's shard, offset and
+length as columns after them, so a lookup is a binary search and one read.
+manifest.json records the shards with their record counts, sizes and
+SHA-256, which makes a snapshot auditable. Addresses that are not EVM
+addresses are archived but not indexed; a full scan still returns them.
+
+An archive directory works as a bulk source (see stats_source.py), so the
+transforms of every script can be re-run from it without refetching.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+from address_index import KEY_DTYPE, RAW_DTYPE, to_keys
+from fetch_journal import JOURNAL_ADDRESS, iter_journal_lines
+
+# Defaults
+SHARD_BYTES = 256 * 1024 ** 2  # Compressed bytes before a new shard is started
+COMPRESS_LEVEL = 6  # gzip level of each member
+SHARD_NAME = 'payloads-{:05d}.jsonl.gz'
+MANIFEST_FILE = 'manifest.json'
+INDEX_FILE = 'index.bin'
+INDEX_MAGIC = b'PAYLIDX1'
+HEADER = struct.Struct('<8sQ')  # magic, indexed records
+COLUMNS = (  # Column name, dtype, in index order after the keys
+    ('shard', np.dtype('<u4')),
+    ('offset', np.dtype('<u8')),
+    ('length', np.dtype('<u4')),
+)
+RANDOM_ACCESS_FRACTION = 0.05  # Below this share of the archive, a bulk read seeks instead of scanning
+SCAN_CHUNK_BYTES = 1024 ** 2  # Compressed bytes read at a time when scanning a shard
+
+
+def compress_line(line):
+    """One JSON line as a standalone, reproducible gzip member"""
+    return gzip.compress((line + '\n').encode('utf-8'), compresslevel=COMPRESS_LEVEL, mtime=0)
+
+
+def is_archive(path):
+    """Whether a path is an archive directory"""
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+
+class ArchiveWriter:
+    """Appends payloads to the shards of a new archive and writes its index and manifest on close"""
+
+    def __init__(self, directory, shard_bytes=SHARD_BYTES):
+        self.directory = directory
+        self.shard_bytes = shard_bytes
+        self.shards = []  # Manifest entry per finished shard
+        self.unindexed = 0
+        self._addresses = []
+        self._shard_ids = []
+        self._offsets = []
+        self._lengths = []
+        self._file = None
+        self._hash = None
+        self._records = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # A new archive replaces whatever the directory held
+        for name in os.listdir(directory):
+            if name.startswith('payloads-') and name.endswith('.jsonl.gz') or name in (MANIFEST_FILE, INDEX_FILE):
+                os.remove(os.path.join(directory, name))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self._addresses)
+
+    def append(self, result):
+        """Archive one {'address', 'data'} payload"""
+        self.append_line(result['address'], json.dumps(result, separators=(',', ':')))
+
+    def append_line(self, address, line):
+        """Archive one payload already serialized as a single JSON line"""
+        self.append_member(address, compress_line(line))
+
+    def append_member(self, address, member):
+        """Archive one payload already compressed by compress_line, e.g. in a worker process"""
+        with self._lock:
+            if self._file is None or self._file.tell() + len(member) > self.shard_bytes and self._records:
+                self._next_shard()
+            self._addresses.append(address)
+            self._shard_ids.append(len(self.shards))
+            self._offsets.append(self._file.tell())
+            self._lengths.append(len(member))
+            self._file.write(member)
+            self._hash.update(member)
+            self._records += 1
+
+    def _next_shard(self):
+        self._finish_shard()
+        self._file = open(os.path.join(self.directory, SHARD_NAME.format(len(self.shards))), 'wb')
+        self._hash = hashlib.sha256()
+        self._records = 0
+
+    def _finish_shard(self):
+        if self._file is None:
+            return
+        self.shards.append({'file': os.path.basename(self._file.name), 'records': self._records,
+                            'bytes': self._file.tell(), 'sha256': self._hash.hexdigest()})
+        self._file.close()
+        self._file = None
+
+    def close(self):
+        """Finish the last shard and write the index and the manifest"""
+        with self._lock:
+            if self._addresses is None:
+                return
+            self._finish_shard()
+            keys, valid = to_keys(self._addresses)
+            self.unindexed = int((~valid).sum())
+            columns = {'shard': self._shard_ids, 'offset': self._offsets, 'length': self._lengths}
+            columns = {name: np.array(columns[name], dtype=dtype)[valid] for name, dtype in COLUMNS}
+            keys = keys[valid]
+            # Last payload wins for a repeated address: keep the last of each run after a stable sort
+            order = np.argsort(keys.view(RAW_DTYPE), kind='stable')
+            keys = keys[order]
+            last = np.r_[keys[1:] != keys[:-1], True] if len(keys) else np.zeros(0, dtype=bool)
+            with open(os.path.join(self.directory, INDEX_FILE), 'wb') as f:
+                f.write(HEADER.pack(INDEX_MAGIC, int(last.sum())))
+                f.write(keys[last].tobytes())
+                for name, _ in COLUMNS:
+                    f.write(columns[name][order][last].tobytes())
+            manifest = {
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'records': len(self._addresses),
+                'indexed': int(last.sum()),
+                'unindexed': self.unindexed,
+                'compression': f'gzip member per record, level {COMPRESS_LEVEL}',
+                'shards': self.shards,
+            }
+            with open(os.path.join(self.directory, MANIFEST_FILE), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            print(f"Archived {len(self._addresses)} payloads in {len(self.shards)} shards "
+                  f"({sum(shard['bytes'] for shard in self.shards) / 1024 ** 2:.1f} MB) to {self.directory}")
+            self._addresses = None
+
+
+class PayloadArchive:
+    """Read side of an archive: random access through the index, or a sequential scan of the shards"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE), 'r') as f:
+            self.manifest = json.load(f)
+        index_path = os.path.join(directory, INDEX_FILE)
+        with open(index_path, 'rb') as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size or not header.startswith(INDEX_MAGIC):
+            raise ValueError(f"{index_path} is not a payload archive index")
+        _, count = HEADER.unpack(header)
+        expected = HEADER.size + count * (KEY_DTYPE.itemsize + sum(dtype.itemsize for _, dtype in COLUMNS))
+        if os.path.getsize(index_path) != expected:
+            raise ValueError(f"{index_path} is truncated")
+
+        def column(dtype, offset):
+            if not count:
+                return np.zeros(0, dtype=dtype)
+            return np.memmap(index_path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+
+        offset = HEADER.size
+        self.keys = column(KEY_DTYPE, offset)
+        offset += count * KEY_DTYPE.itemsize
+        self.columns = {}
+        for name, dtype in COLUMNS:
+            self.columns[name] = column(dtype, offset)
+            offset += count * dtype.itemsize
+        self._files = {}
+
+    def __len__(self):
+        return self.manifest['records']
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def shard_path(self, shard):
+        return os.path.join(self.directory, self.manifest['shards'][shard]['file'])
+
+    def locate(self, addresses):
+        """Positions of the addresses in the index, -1 where an address is not archived"""
+        keys, valid = to_keys(addresses)
+        positions = np.full(len(keys), -1, dtype=np.int64)
+        if not len(self.keys) or not len(keys):
+            return positions
+        sorted_keys = np.ascontiguousarray(self.keys).view(RAW_DTYPE)
+        probe = keys.view(RAW_DTYPE)
+        found = np.minimum(np.searchsorted(sorted_keys, probe), len(sorted_keys) - 1)
+        hit = (sorted_keys[found] == probe) & valid
+        positions[hit] = found[hit]
+        return positions
+
+    def read_line(self, position):
+        """The JSON line bytes of the index entry at a position, from one seek and one member"""
+        shard = int(self.columns['shard'][position])
+        f = self._files.get(shard)
+        if f is None:
+            f = self._files[shard] = open(self.shard_path(shard), 'rb')
+        f.seek(int(self.columns['offset'][position]))
+        return gzip.decompress(f.read(int(self.columns['length'][position]))).rstrip(b'\n')
+
+    def get_line(self, address):
+        """The archived JSON line of one address, or None"""
+        position = int(self.locate([address])[0])
+        return self.read_line(position) if position >= 0 else None
+
+    def get(self, address):
+        """The archived payload of one address, or None"""
+        line = self.get_line(address)
+        return json.loads(line) if line is not None else None
+
+    def iter_records(self):
+        """
+        Yield (shard, offset, address, JSON line bytes) of every record in
+        archive order, one gzip member after another, so a record can be
+        matched against its index entry
+        """
+        for shard in range(len(self.manifest['shards'])):
+            with open(self.shard_path(shard), 'rb') as f:
+                offset = 0
+                pending = b''
+                while True:
+                    start = offset
+                    member = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    parts = []
+                    while not member.eof:
+                        chunk = pending or f.read(SCAN_CHUNK_BYTES)
+                        if not chunk:
+                            break
+                        parts.append(member.decompress(chunk))
+                        pending = member.unused_data
+                        offset += len(chunk) - len(pending)
+                    if not member.eof:
+                        if offset > start:
+                            raise ValueError(f"{self.shard_path(shard)} ends in a truncated record")
+                        break
+                    line = b''.join(parts).rstrip(b'\n')
+                    match = JOURNAL_ADDRESS.match(line)
+                    address = match.group(1).decode('utf-8') if match else json.loads(line)['address']
+                    yield shard, start, address, line
+
+    def verify(self):
+        """Names of the shards whose size or SHA-256 no longer matches the manifest"""
+        failed = []
+        for shard in self.manifest['shards']:
+            digest = hashlib.sha256()
+            path = os.path.join(self.directory, shard['file'])
+            try:
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1024 ** 2), b''):
+                        digest.update(chunk)
+                size = os.path.getsize(path)
+            except OSError:
+                failed.append(shard['file'])
+                continue
+            if size != shard['bytes'] or digest.hexdigest() != shard['sha256']:
+                failed.append(shard['file'])
+        return failed
+
+
+class ArchiveStatsSource:
+    """
+    An archive as a bulk stats source: payloads are replayed exactly as they
+    were archived, and a miner that is not in the archive is reported missing
+    instead of being given an empty history.
+    """
+
+    name = 'archive'
+
+    def __init__(self, directory):
+        self.archive = PayloadArchive(directory)
+        self.miners = 0
+        self.missing = 0
+        self.seconds = 0.0
+
+    def fetch_lines(self, addresses):
+        """
+        Yield (address, JSON line bytes) for every requested address in the
+        archive. A small share of the archive is read member by member
+        through the index; otherwise the shards are scanned in order. Either
+        way a repeated address gets the record its index entry points to, the
+        last one archived; an address the index cannot hold gets its last
+        record from the scan.
+        """
+        addresses = list(addresses)
+        started = time.monotonic()
+        try:
+            if len(addresses) < len(self.archive) * RANDOM_ACCESS_FRACTION:
+                positions = self.archive.locate(addresses)
+                found = positions >= 0
+                self.missing += len({address.lower() for address, hit in zip(addresses, found) if not hit})
+                # Each record once however often it was requested, as the scan yields it
+                hits, first = np.unique(positions[found], return_index=True)
+                requested = np.array(addresses, dtype=object)[found][first]
+                # Read in shard and offset order so the shards are read front to back
+                order = np.lexsort((self.archive.columns['offset'][hits], self.archive.columns['shard'][hits]))
+                for address, position in zip(requested[order], hits[order]):
+                    self.miners += 1
+                    yield address, self.archive.read_line(position)
+                return
+            positions = self.archive.locate(addresses)
+            hits = positions[positions >= 0]
+            indexed = set(zip(self.archive.columns['shard'][hits].tolist(), self.archive.columns['offset'][hits].tolist()))
+            unindexed = {address.lower() for address, position in zip(addresses, positions.tolist()) if position < 0}
+            last = {}  # Last record of each requested address missing from the index
+            for shard, offset, address, line in self.archive.iter_records():
+                if (shard, offset) in indexed:
+                    self.miners += 1
+                    yield address, line
+                elif address.lower() in unindexed:
+                    last[address.lower()] = (address, line)
+            for address, line in last.values():
+                self.miners += 1
+                yield address, line
+            self.missing += len(unindexed) - len(last)
+        finally:
+            self.seconds += time.monotonic() - started
+
+    def fetch_many(self, addresses):
+        """Yield the archived payload of every requested address"""
+        for _, line in self.fetch_lines(addresses):
+            yield json.loads(line)
+
+    def fetch(self, address):
+        """Payload of a single miner, read through the index"""
+        return next(self.fetch_many([address]), None)
+
+    def report(self):
+        print(f"Archive source ({self.archive.directory}): {self.miners} miners replayed, "
+              f"{self.missing} requested miners not archived, in {self.seconds:.1f}s")
+
+    def close(self):
+        self.archive.close()
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Build, verify or read a sharded archive of raw miner stats payloads')
+    parser.add_argument('archive', type=str, help='Archive directory')
+    parser.add_argument('--from-journal', type=str, help='Build the archive from the payloads of a fetch journal')
+    parser.add_argument('--shard-mb', type=int, default=SHARD_BYTES // 1024 ** 2, help='Compressed MB per shard when building')
+    parser.add_argument('--verify', action='store_true', help='Check every shard against the SHA-256 in the manifest')
+    parser.add_argument('--lookup', type=str, metavar='ADDRESS', help='Print the archived payload of one address')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    if args.from_journal:
+        started = time.time()
+        with ArchiveWriter(args.archive, args.shard_mb * 1024 ** 2) as writer:
+            for address, line in iter_journal_lines(args.from_journal):
+                writer.append_line(address, line.decode('utf-8'))
+        print(f"Built in {time.time() - started:.1f}s")
+
+    archive = PayloadArchive(args.archive)
+    if args.verify:
+        failed = archive.verify()
+        print(f"{len(archive.manifest['shards']) - len(failed)} of {len(archive.manifest['shards'])} shards match the manifest"
+              + (f"; changed or missing: {', '.join(failed)}" if failed else ''))
+    if args.lookup:
+        payload = archive.get(args.lookup)
+        print(json.dumps(payload, indent=2) if payload else f"No payload for {args.lookup} in {args.archive}")
+    if not (args.verify or args.lookup or args.from_journal):
+        print(f"{args.archive}: {len(archive)} payloads ({archive.manifest['indexed']} indexed) "
+              f"in {len(archive.manifest['shards'])} shards, created {archive.manifest['created_at']}")
+    archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Run metrics for the fetcher scripts and the pipeline
+
+A RunMetrics object is shared by everything in one run. Stages (address
+load, fetch, decode, transform, write, S3 upload, ...) accumulate their
+time and call counts; stages entered from several fetch threads at once,
+like decode, add up the time of every thread. Stats API requests feed a
+latency histogram plus counters of status codes, bytes received, retries
+and miners given up on. The run summary is printed at the end and can be
+written as JSON and as a Prometheus text-format file (e.g. for the node
+exporter's textfile collector).
+"""
+
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+# Upper bounds in seconds of the request latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_PREFIX = 'miner_run'
+
+
+class RunMetrics:
+    """Thread-safe stage timings and stats API request metrics for one run"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.now(timezone.utc)
+        self.stage_seconds = Counter()
+        self.stage_calls = Counter()
+        self.statuses = Counter()  # HTTP status, or 'error' for a transport failure
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # Last bucket is +Inf
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.bytes_received = 0
+        self.retries = 0
+        self.failures = 0
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as one call of a stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def add_time(self, name, seconds, calls=1):
+        """Add time measured elsewhere to a stage"""
+        with self._lock:
+            self.stage_seconds[name] += seconds
+            self.stage_calls[name] += calls
+
+    def observe_request(self, latency, status, size=0):
+        """Record one stats API request; status is None for a transport error"""
+        with self._lock:
+            self.buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+            self.latency_sum += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.statuses['error' if status is None else str(status)] += 1
+            self.bytes_received += size
+
+    def observe_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def observe_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def summary(self):
+        """The run summary as a JSON-serializable dict"""
+        with self._lock:
+            requests = sum(self.buckets)
+            return {
+                'run': self.name,
+                'started_at': self.started_at.isoformat(),
+                'wall_seconds': time.monotonic() - self._started,
+                'stages': {name: {'seconds': self.stage_seconds[name], 'calls': self.stage_calls[name]}
+                           for name in self.stage_seconds},
+                'requests': {
+                    'count': requests,
+                    'statuses': dict(self.statuses),
+                    'bytes_received': self.bytes_received,
+                    'retries': self.retries,
+                    'failures': self.failures,
+                    'latency_mean_seconds': self.latency_sum / requests if requests else None,
+                    'latency_max_seconds': self.latency_max,
+                    'latency_histogram': {str(bound): count for bound, count
+                                          in zip(LATENCY_BUCKETS + ('+Inf',), self.buckets)},
+                },
+            }
+
+    def prometheus_text(self):
+        """The run summary in the Prometheus text exposition format"""
+        s = self.summary()
+        run = s['run']
+        p = METRIC_PREFIX
+        lines = [
+            f"# HELP {p}_stage_seconds_total Time spent per stage, summed over threads",
+            f"# TYPE {p}_stage_seconds_total counter",
+        ]
+        lines += [f'{p}_stage_seconds_total{{run="{run}",stage="{name}"}} {stage["seconds"]:.6f}'
+                  for name, stage in s['stages'].items()]
+        lines += [f"# HELP {p}_stage_calls_total Calls per stage", f"# TYPE {p}_stage_calls_total counter"]
+        lines += [f'{p}_stage_calls_total{{run="{run}",stage="{name}"}} {stage["calls"]}'
+                  for name, stage in s['stages'].items()]
+
+        lines += [f"# HELP {p}_request_seconds Stats API request latency", f"# TYPE {p}_request_seconds histogram"]
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), self.buckets):
+            cumulative += count
+            lines.append(f'{p}_request_seconds_bucket{{run="{run}",le="{bound}"}} {cumulative}')
+        lines.append(f'{p}_request_seconds_sum{{run="{run}"}} {self.latency_sum:.6f}')
+        lines.append(f'{p}_request_seconds_count{{run="{run}"}} {cumulative}')
+
+        lines += [f"# HELP {p}_responses_total Stats API responses by status", f"# TYPE {p}_responses_total counter"]
+        lines += [f'{p}_responses_total{{run="{run}",status="{status}"}} {count}'
+                  for status, count in sorted(s['requests']['statuses'].items())]
+        for metric, key, help_text in (('bytes_received_total', 'bytes_received', 'Response body bytes received'),
+                                       ('retries_total', 'retries', 'Stats API requests retried'),
+                                       ('failures_total', 'failures', 'Miners given up on after every retry')):
+            lines += [f"# HELP {p}_{metric} {help_text}", f"# TYPE {p}_{metric} counter",
+                      f'{p}_{metric}{{run="{run}"}} {s["requests"][key]}']
+        lines += [f"# HELP {p}_wall_seconds Wall time of the run", f"# TYPE {p}_wall_seconds gauge",
+                  f'{p}_wall_seconds{{run="{run}"}} {s["wall_seconds"]:.6f}']
+        return '\n'.join(lines) + '\n'
+
+    def report(self):
+        """Print where the run spent its time and how the API behaved"""
+        s = self.summary()
+        stages = ', '.join(f"{name} {stage['seconds']:.2f}s" for name, stage in s['stages'].items())
+        print(f"Run metrics: {s['wall_seconds']:.1f}s wall ({stages or 'no stages'})")
+        requests = s['requests']
+        if requests['count']:
+            statuses = ', '.join(f"{status}: {count}" for status, count in sorted(requests['statuses'].items()))
+            print(f"Stats API: {requests['count']} requests ({statuses}), "
+                  f"mean latency {requests['latency_mean_seconds']:.3f}s, max {requests['latency_max_seconds']:.3f}s, "
+                  f"{requests['bytes_received'] / 1024 ** 2:.1f} MiB received, {requests['retries']} retries, "
+                  f"{requests['failures']} failures")
+
+    def save(self, json_file=None, prometheus_file=None):
+        """Print the report and write the summary files that were asked for"""
+        self.report()
+        if json_file:
+            with open(json_file, 'w') as f:
+                json.dump(self.summary(), f, indent=2)
+            print(f"Saved run metrics to {json_file}")
+        if prometheus_file:
+            with open(prometheus_file, 'w') as f:
+                f.write(self.prometheus_text())
+            print(f"Saved Prometheus metrics to {prometheus_file}")
+
+
+def timed_stage(metrics, name):
+    """metrics.stage(name), or a no-op when the run records no metrics"""
+    return metrics.stage(name) if metrics else nullcontext()
+
+
+def timed_iter(metrics, name, iterable):
+    """Yield from iterable, adding the time spent waiting for each item to a stage"""
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            if metrics:
+                metrics.add_time(name, time.perf_counter() - started)
+        yield item
@@ -0,0 +1,311 @@
+"""
+Streaming S3 input and output for the fetcher scripts
+
+The miner address list is read line by line from the response stream instead
+of being downloaded and split in memory, and a copy is kept in a local cache
+together with its ETag. The next run sends a conditional GET (If-None-Match);
+when S3 answers 304 Not Modified the cached copy is read and the list is not
+downloaded again.
+
+Outputs are mirrored to S3 while they are written: every write goes to the
+local file and to a multipart upload whose parts are sent from a background
+thread as soon as PART_SIZE bytes have accumulated, so the upload finishes
+with the file instead of starting after it. Outputs smaller than one part go
+up in a single PUT. If S3 fails the upload is aborted, the error printed and
+the local file still written in full, as with the old upload-after-write.
+
+Every client is built with an optional endpoint URL, so the scripts can run
+against a local S3 stand-in such as MinIO or moto_server.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+# Defaults
+S3_CACHE_DIR = '.s3_cache'  # Local copies of S3 inputs, keyed by bucket/key, with their ETags
+PART_SIZE = 8 * 1024 ** 2  # Bytes per multipart part; S3 requires at least 5 MiB for all but the last
+MAX_PENDING_PARTS = 2  # Parts buffered or in flight before a write waits for the upload
+READ_CHUNK_SIZE = 64 * 1024  # Bytes read from the response stream at a time
+
+
+@lru_cache(maxsize=None)
+def s3_client(endpoint_url=None):
+    """Shared S3 client, for AWS or for the S3-compatible service at endpoint_url"""
+    return boto3.client('s3', endpoint_url=endpoint_url)
+
+
+class S3Target:
+    """An S3 object an output is streamed to"""
+
+    def __init__(self, bucket, key, endpoint_url=None):
+        self.bucket = bucket
+        self.key = key
+        self.client = s3_client(endpoint_url)
+
+    def __str__(self):
+        return f"s3://{self.bucket}/{self.key}"
+
+
+def _cache_paths(cache_dir, bucket, key):
+    name = hashlib.sha256(f"{bucket}/{key}".encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, name), os.path.join(cache_dir, f"{name}.json")
+
+
+def _not_modified(error):
+    return (error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 304
+            or error.response.get('Error', {}).get('Code') in ('304', 'NotModified'))
+
+
+def iter_s3_lines(bucket, key, endpoint_url=None, cache_dir=S3_CACHE_DIR):
+    """
+    Yield the stripped, non-empty lines of an S3 text object. With a
+    cache_dir, an unchanged object is read from the local copy after a 304,
+    and a changed one is streamed into the cache as it is read.
+    """
+    client = s3_client(endpoint_url)
+    if not cache_dir:
+        response = client.get_object(Bucket=bucket, Key=key)
+        for line in response['Body'].iter_lines(chunk_size=READ_CHUNK_SIZE):
+            line = line.decode('utf-8').strip()
+            if line:
+                yield line
+        return
+
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_file, meta_file = _cache_paths(cache_dir, bucket, key)
+    etag = None
+    if os.path.exists(cache_file) and os.path.exists(meta_file):
+        with open(meta_file, 'r') as f:
+            etag = json.load(f).get('etag')
+
+    try:
+        if etag:
+            response = client.get_object(Bucket=bucket, Key=key, IfNoneMatch=etag)
+        else:
+            response = client.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if not etag or not _not_modified(e):
+            raise
+        print(f"s3://{bucket}/{key} not modified, reading the cached copy")
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield line
+        return
+
+    # Stream into a temporary file so an interrupted read never leaves a partial copy behind
+    temp_file = f"{cache_file}.tmp"
+    completed = False
+    try:
+        with open(temp_file, 'wb') as cached:
+            for line in response['Body'].iter_lines(chunk_size=READ_CHUNK_SIZE):
+                cached.write(line + b'\n')
+                line = line.decode('utf-8').strip()
+                if line:
+                    yield line
+        os.replace(temp_file, cache_file)
+        with open(meta_file, 'w') as f:
+            json.dump({'bucket': bucket, 'key': key, 'etag': response.get('ETag')}, f)
+        completed = True
+    finally:
+        if not completed and os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+class S3MultipartWriter:
+    """
+    Binary file-like writer that streams to one S3 object. Parts are uploaded
+    in the background as they fill; close() completes the upload and abort()
+    discards it.
+    """
+
+    def __init__(self, target, part_size=PART_SIZE):
+        self.target = target
+        self.part_size = part_size
+        self.closed = False
+        self._buffer = bytearray()
+        self._position = 0
+        self._upload_id = None
+        self._parts = []
+        self._pending = []
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            self.abort()
+        else:
+            self.close()
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass  # Parts are only sent once they are large enough
+
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        if len(self._buffer) >= self.part_size:
+            self._send_part()
+        return len(data)
+
+    def _send_part(self):
+        """Hand the buffer to the upload thread, waiting while too many parts are outstanding"""
+        if self._upload_id is None:
+            response = self.target.client.create_multipart_upload(Bucket=self.target.bucket, Key=self.target.key)
+            self._upload_id = response['UploadId']
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        part_number = len(self._parts) + len(self._pending) + 1
+        body = bytes(self._buffer)
+        self._buffer = bytearray()
+        self._pending.append(self._executor.submit(self._upload_part, part_number, body))
+        while len(self._pending) >= MAX_PENDING_PARTS:
+            self._parts.append(self._pending.pop(0).result())
+
+    def _upload_part(self, part_number, body):
+        response = self.target.client.upload_part(Bucket=self.target.bucket, Key=self.target.key,
+                                                  UploadId=self._upload_id, PartNumber=part_number, Body=body)
+        return {'PartNumber': part_number, 'ETag': response['ETag']}
+
+    def close(self):
+        """Send the last part and complete the upload; a small object is sent with one PUT"""
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                self.target.client.put_object(Bucket=self.target.bucket, Key=self.target.key, Body=bytes(self._buffer))
+            else:
+                if self._buffer:
+                    self._send_part()
+                self._parts.extend(future.result() for future in self._pending)
+                self._pending = []
+                self.target.client.complete_multipart_upload(Bucket=self.target.bucket, Key=self.target.key,
+                                                             UploadId=self._upload_id,
+                                                             MultipartUpload={'Parts': self._parts})
+        except Exception:
+            self.abort()
+            raise
+        self._shutdown()
+        self.closed = True
+
+    def abort(self):
+        """Discard the upload, including any parts already sent"""
+        if self.closed:
+            return
+        self.closed = True
+        self._shutdown()
+        if self._upload_id is not None:
+            try:
+                self.target.client.abort_multipart_upload(Bucket=self.target.bucket, Key=self.target.key,
+                                                          UploadId=self._upload_id)
+            except (BotoCoreError, ClientError) as e:
+                print(f"Error aborting S3 upload of {self.target}: {e}")
+
+    def _shutdown(self):
+        if self._executor:
+            for future in self._pending:
+                future.cancel()
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._pending = []
+
+
+class TeeFile:
+    """
+    File object that writes to a local file and streams the same bytes to
+    S3. S3 errors are printed and stop only the upload, never the local file.
+    """
+
+    def __init__(self, output_file, target, binary=False):
+        self.output_file = output_file
+        self.target = target
+        self.uploaded = False
+        if binary:
+            self._local = open(output_file, 'wb')
+            self._encoding = None
+        else:
+            self._local = open(output_file, 'w', newline='', encoding='utf-8')
+            self._encoding = 'utf-8'
+        self._remote = S3MultipartWriter(target)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            self.abort()
+        else:
+            self.close()
+
+    @property
+    def closed(self):
+        return self._local.closed
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._local.tell()
+
+    def flush(self):
+        self._local.flush()
+
+    def write(self, data):
+        written = self._local.write(data)
+        if self._remote:
+            self._remote_call(self._remote.write, data.encode(self._encoding) if self._encoding else data)
+        return written
+
+    def _remote_call(self, method, *args):
+        try:
+            method(*args)
+        except (BotoCoreError, ClientError) as e:
+            print(f"Error uploading to S3: {e}")
+            self._remote.abort()
+            self._remote = None
+
+    def close(self):
+        """Close the local file and complete the S3 upload"""
+        if self.closed:
+            return
+        self._local.close()
+        if self._remote:
+            self._remote_call(self._remote.close)
+            self.uploaded = self._remote is not None
+            if self.uploaded:
+                print(f"Streamed {self.output_file} to {self.target}")
+
+    def cancel_upload(self):
+        """Discard the S3 upload but keep writing the local file"""
+        if self._remote:
+            self._remote.abort()
+            self._remote = None
+
+    def abort(self):
+        """Close the local file and discard the S3 upload"""
+        self._local.close()
+        if self._remote:
+            self._remote.abort()
+            self._remote = None
+
+
+def open_output(output_file, target=None, binary=False):
+    """Open an output file for writing, streamed to the S3Target as well if one is given"""
+    if target is None:
+        if binary:
+            return open(output_file, 'wb')
+        return open(output_file, 'w', newline='', encoding='utf-8')
+    return TeeFile(output_file, target, binary)
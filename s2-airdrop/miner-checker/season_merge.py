@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Keyed merge of per-season airdrop results into one cumulative table
+
+Each season's results CSV is read with Arrow one block at a time, keeping
+only the address column and the mapped token/point columns. Addresses are parsed into 20-byte
+keys (see address_index.py), so the join is case insensitive without ever
+building Python strings per row, and repeated addresses within a season are
+summed. The seasons are then joined with a sorted merge: the union of all
+keys is sorted once and every season's values are scattered into float64
+columns at their binary-searched positions. Nothing goes through pandas
+object dtype, so millions of rows merge in seconds and in a few hundred
+bytes per address.
+
+The output has one row per address with every season's mapped columns
+("S1 base_tokens", ...), a "Total <metric>" column per metric summed over
+the seasons, and a grand total of the metrics listed as token totals. The
+column mapping is built in for S1 and S2 and can be replaced with a JSON
+file for other seasons or layouts:
+
+    {"seasons": [{"name": "S3", "file": "s3.csv", "address_column": "Address",
+                  "columns": {"base_tokens": "S3 Base", "bonus_tokens": "S3 Bonus"}}],
+     "grand_total": ["base_tokens", "bonus_tokens"]}
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+from address_index import ADDRESS_BYTES, KEY_DTYPE, RAW_DTYPE, to_keys
+
+# Defaults
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+OUTPUT_CSV = 'cumulative_airdrop.csv'
+READ_BLOCK_BYTES = 4 * 1024 ** 2  # CSV bytes parsed at a time; only one block's strings are held
+GRAND_TOTAL_COLUMN = 'Grand Total Tokens'
+DEFAULT_MAPPING = {
+    'seasons': [
+        {
+            'name': 'S1',
+            'file': os.path.join(REPO_ROOT, 's1_results.csv'),
+            'address_column': 'Address',
+            'columns': {
+                'waifu_tokens': 'S1 Waifu Tokens',
+                'llama_tokens': 'S1 Llama Tokens',
+                'waifu_bonus_tokens': 'S1 Waifu Bonus Tokens',
+                'llama_bonus_tokens': 'S1 Llama Bonus Tokens',
+                'node_rental_bonus_tokens': 'S1 Node Rental Bonus Tokens',
+                'llama_points': 'S1 Llama Points',
+                'waifu_points': 'S1 Waifu Points',
+                'base_tokens': 'S1 Total Base Tokens',
+                'bonus_tokens': 'S1 Total Bonus Tokens',
+            },
+        },
+        {
+            'name': 'S2',
+            'file': os.path.join(REPO_ROOT, 's2-airdrop', 's2_results_draft.csv'),
+            'address_column': 'Address',
+            'columns': {
+                'waifu_tokens': 'S2 waifu_reward_tokens',
+                'llama_tokens': 'S2 llama_reward_tokens',
+                'base_tokens': 'S2 Total Base Tokens',
+            },
+        },
+    ],
+    'grand_total': ['base_tokens', 'bonus_tokens'],  # Metrics that add up to the tokens an address receives
+}
+_HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+
+
+class SeasonTable:
+    """One season's mapped columns, aggregated to one row per 20-byte address key"""
+
+    def __init__(self, name, keys, values, rows, invalid, duplicates, empty=None, invalid_totals=None):
+        self.name = name
+        self.keys = keys  # Sorted unique keys
+        self.values = values  # metric -> float64 array aligned with keys
+        self.rows = rows
+        self.invalid = invalid
+        self.duplicates = duplicates
+        self.empty = empty or dict.fromkeys(values, 0)  # metric -> empty values of valid rows, read as 0
+        self.invalid_totals = invalid_totals or dict.fromkeys(values, 0.0)  # metric -> sum over dropped rows
+
+    @classmethod
+    def read(cls, name, file_path, address_column, columns):
+        """Read the address column and the mapped metric columns of a season's results CSV"""
+        convert = pa_csv.ConvertOptions(
+            include_columns=[address_column] + list(columns.values()),
+            column_types={address_column: pa.string(), **{column: pa.float64() for column in columns.values()}})
+        reader = pa_csv.open_csv(file_path, read_options=pa_csv.ReadOptions(block_size=READ_BLOCK_BYTES),
+                                 convert_options=convert)
+        key_chunks = []
+        value_chunks = {metric: [] for metric in columns}
+        empty = dict.fromkeys(columns, 0)
+        invalid_totals = dict.fromkeys(columns, 0.0)
+        rows = invalid = 0
+        for batch in reader:
+            keys, valid = to_keys(batch.column(address_column))
+            rows += batch.num_rows
+            invalid += int((~valid).sum())
+            key_chunks.append(keys[valid])
+            for metric, column in columns.items():
+                column_values = batch.column(column).to_numpy(zero_copy_only=False)
+                empty[metric] += int(np.isnan(column_values[valid]).sum())
+                invalid_totals[metric] += float(np.nansum(column_values[~valid]))
+                value_chunks[metric].append(np.nan_to_num(column_values[valid]))
+        keys = np.concatenate(key_chunks) if key_chunks else np.zeros(0, dtype=KEY_DTYPE)
+        values = {metric: np.concatenate(chunks) if chunks else np.zeros(0) for metric, chunks in value_chunks.items()}
+
+        # Sum repeated addresses: sort by key and reduce each run of equal keys
+        order = np.argsort(keys.view(RAW_DTYPE), kind='stable')
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=np.intp)
+        values = {metric: np.add.reduceat(column[order], starts) if len(starts) else column[:0]
+                  for metric, column in values.items()}
+        return cls(name, keys[starts], values, rows, invalid, len(keys) - len(starts), empty, invalid_totals)
+
+    def report(self):
+        empty = sum(self.empty.values())
+        print(f"{self.name}: {self.rows} rows -> {len(self.keys)} addresses "
+              f"({self.duplicates} repeated rows summed, {self.invalid} invalid addresses dropped"
+              + (f", {empty} empty values read as 0" if empty else '') + ")")
+
+
+def merge_seasons(seasons, grand_total=()):
+    """
+    Sorted-merge join of the seasons on address key. Returns (keys, columns)
+    where columns maps output column names to float64 arrays aligned with keys.
+    """
+    union = np.unique(np.concatenate([season.keys for season in seasons]).view(RAW_DTYPE)).view(seasons[0].keys.dtype)
+    columns = {}
+    totals = {}
+    for season in seasons:
+        positions = np.searchsorted(union.view(RAW_DTYPE), season.keys.view(RAW_DTYPE))
+        for metric, values in season.values.items():
+            column = np.zeros(len(union))
+            column[positions] = values
+            columns[f"{season.name} {metric}"] = column
+            totals.setdefault(metric, np.zeros(len(union)))[positions] += values
+
+    for metric, column in totals.items():
+        columns[f"Total {metric}"] = column
+    columns[GRAND_TOTAL_COLUMN] = sum((totals[metric] for metric in grand_total if metric in totals),
+                                      np.zeros(len(union)))
+    return union, columns
+
+
+def address_strings(keys):
+    """Lowercase 0x addresses of the keys as an Arrow string array, without a Python string per row"""
+    raw = np.frombuffer(keys.tobytes(), dtype=np.uint8).reshape(-1, ADDRESS_BYTES)
+    text = np.empty((len(keys), 2 + 2 * ADDRESS_BYTES), dtype=np.uint8)
+    text[:, 0] = ord('0')
+    text[:, 1] = ord('x')
+    text[:, 2::2] = _HEX_DIGITS[raw >> 4]
+    text[:, 3::2] = _HEX_DIGITS[raw & 0x0F]
+    offsets = np.arange(0, text.size + 1, text.shape[1], dtype=np.int32)
+    return pa.Array.from_buffers(pa.string(), len(keys), [None, pa.py_buffer(offsets), pa.py_buffer(text)])
+
+
+def write_merged(keys, columns, output_file, address_column='Address'):
+    """Write the merged table sorted by grand total, largest first, ties by address"""
+    order = np.argsort(-columns[GRAND_TOTAL_COLUMN], kind='stable')
+    table = pa.table({address_column: address_strings(keys).take(pa.array(order)),
+                      **{name: pa.array(column[order]) for name, column in columns.items()}})
+    # Hex addresses and numbers never need quoting
+    pa_csv.write_csv(table, output_file, pa_csv.WriteOptions(quoting_style='none', quoting_header='none'))
+    return table
+
+
+def load_mapping(mapping_file=None, files=None):
+    """The season mapping from a JSON file or the built-in one, with NAME=PATH overrides of season files"""
+    if mapping_file:
+        with open(mapping_file, 'r') as f:
+            mapping = json.load(f)
+    else:
+        mapping = json.loads(json.dumps(DEFAULT_MAPPING))
+    for override in files or []:
+        name, _, path = override.partition('=')
+        season = next((season for season in mapping['seasons'] if season['name'] == name), None)
+        if season is None:
+            raise ValueError(f"Unknown season '{name}' in --season, expected one of: "
+                             f"{', '.join(season['name'] for season in mapping['seasons'])}")
+        season['file'] = path
+    return mapping
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Merge per-season airdrop results into one cumulative table by address')
+    parser.add_argument('--mapping', type=str, help='JSON file with the seasons, their files and column mappings (default: S1 and S2)')
+    parser.add_argument('--season', action='append', metavar='NAME=PATH', help='Read a season from another file (repeatable)')
+    parser.add_argument('--output', type=str, default=OUTPUT_CSV, help='Cumulative results CSV')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    mapping = load_mapping(args.mapping, args.season)
+
+    seasons = []
+    for spec in mapping['seasons']:
+        season = SeasonTable.read(spec['name'], spec['file'], spec.get('address_column', 'Address'), spec['columns'])
+        season.report()
+        seasons.append(season)
+    if not seasons:
+        print("No seasons to merge. Exiting.")
+        return
+
+    keys, columns = merge_seasons(seasons, mapping.get('grand_total', ()))
+    in_every = np.ones(len(keys), dtype=bool)
+    for season in seasons:
+        in_every &= np.isin(keys.view(RAW_DTYPE), season.keys.view(RAW_DTYPE), assume_unique=True)
+    write_merged(keys, columns, args.output)
+    print(f"Merged {len(keys)} addresses ({int(in_every.sum())} in every season), "
+          f"{columns[GRAND_TOTAL_COLUMN].sum():.2f} tokens in total, to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
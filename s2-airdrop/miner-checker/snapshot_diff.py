@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Keyed diff between two reward snapshots
+
+Both snapshots are read as SeasonTables (see season_merge.py): only the
+address column and the compared columns, with addresses parsed into 20-byte
+keys and repeated addresses summed, so each table is held once as sorted
+keys and float64 columns. The sorted union of the keys is walked in chunks;
+each chunk finds its rows in both tables by binary search and only the
+addresses that were added, removed or changed beyond the tolerance are
+written, chunk by chunk, so the diff itself is never built in memory.
+
+A value changed when |new - old| > max(tolerance, relative tolerance *
+max(|old|, |new|)). The diff CSV has, per address, its status and the old
+value, new value and delta of every compared column, with the missing side
+of an added or removed address left empty and counted as zero in the delta.
+The summary gives the address counts and, per column, both totals and the
+net delta split into added, removed and changed addresses. Rows that never
+reach the keyed diff are accounted for per side as well: rows without an
+EVM address (and the tokens they carry), repeated rows summed into one
+address and empty values read as 0; a change in any of them counts as a
+difference. With --fail-on-diff the exit status is 1 when anything differs,
+so the diff can gate the release of an airdrop list.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+from address_index import RAW_DTYPE
+from season_merge import READ_BLOCK_BYTES, SeasonTable, address_strings
+
+# Defaults
+OUTPUT_CSV = 'reward_diff.csv'
+TOLERANCE = 1e-6  # Absolute change in tokens below which a value counts as unchanged
+RELATIVE_TOLERANCE = 1e-9  # Change relative to the larger value below which it counts as unchanged
+CHUNK_ROWS = 65536  # Union addresses compared and written at a time
+STATUSES = ('added', 'removed', 'changed')
+
+
+def column_types(file_path):
+    """Column types of a CSV as inferred from its first block"""
+    reader = pa_csv.open_csv(file_path, read_options=pa_csv.ReadOptions(block_size=READ_BLOCK_BYTES))
+    return {field.name: field.type for field in reader.schema}
+
+
+def is_numeric(data_type):
+    """Whether a column read as data_type can be compared as float64 (all-empty columns read as null)"""
+    return pa.types.is_integer(data_type) or pa.types.is_floating(data_type) or pa.types.is_null(data_type)
+
+
+def shared_columns(old_file, new_file, address_column='Address'):
+    """Numeric columns of both CSVs other than the address in the order of the old file, and the shared
+    columns skipped as non-numeric"""
+    old_types, new_types = column_types(old_file), column_types(new_file)
+    shared = [column for column in old_types if column != address_column and column in new_types]
+    numeric = [column for column in shared if is_numeric(old_types[column]) and is_numeric(new_types[column])]
+    return numeric, [column for column in shared if column not in numeric]
+
+
+def check_columns(columns, old_file, new_file, address_column='Address'):
+    """Problems that keep the given columns from being compared, as messages"""
+    problems = []
+    for file_path in (old_file, new_file):
+        types = column_types(file_path)
+        for column in [address_column] + columns:
+            if column not in types:
+                problems.append(f"{file_path} has no column {column!r}")
+            elif column != address_column and not is_numeric(types[column]):
+                problems.append(f"column {column!r} of {file_path} is not numeric ({types[column]})")
+    return problems
+
+
+def _lookup(sorted_keys, probe):
+    """Positions of probe in sorted_keys and whether each was found"""
+    if not len(sorted_keys):
+        return np.zeros(len(probe), dtype=np.intp), np.zeros(len(probe), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_keys, probe), len(sorted_keys) - 1)
+    return positions, sorted_keys[positions] == probe
+
+
+def _take(values, positions, found):
+    """values at positions where found and zero elsewhere, also for an empty table"""
+    if not len(values):
+        return np.zeros(len(positions))
+    return np.where(found, values[positions], 0.0)
+
+
+class SnapshotDiff:
+    """Sorted-merge comparison of two snapshot tables over the same columns"""
+
+    def __init__(self, old, new, columns, tolerance=TOLERANCE, relative_tolerance=RELATIVE_TOLERANCE):
+        self.old = old
+        self.new = new
+        self.columns = columns
+        self.tolerance = tolerance
+        self.relative_tolerance = relative_tolerance
+        self.counts = dict.fromkeys(STATUSES + ('unchanged',), 0)
+        self.totals = {column: {'old': 0.0, 'new': 0.0, **{status: 0.0 for status in STATUSES}} for column in columns}
+        self.changed_by_column = dict.fromkeys(columns, 0)
+        self.largest = {}  # column -> (absolute delta, address) of the largest change
+        self.row_changes = self._row_changes()
+
+    def _changed(self, old_value, new_value):
+        allowed = max(self.tolerance, self.relative_tolerance * max(abs(old_value), abs(new_value)))
+        return abs(new_value - old_value) > allowed
+
+    def row_stats(self, table):
+        """Rows of a snapshot that are dropped, summed or read as 0 before the keyed diff"""
+        return {
+            'rows': table.rows,
+            'invalid_rows': table.invalid,
+            'repeated_rows': table.duplicates,
+            'empty_values': {column: table.empty[column] for column in self.columns},
+            'invalid_row_totals': {column: table.invalid_totals[column] for column in self.columns},
+        }
+
+    def _row_changes(self):
+        """Descriptions of the row statistics that differ between the snapshots"""
+        old, new = self.row_stats(self.old), self.row_stats(self.new)
+        changes = []
+        for name in ('invalid_rows', 'repeated_rows'):
+            if old[name] != new[name]:
+                changes.append(f"{name.replace('_', ' ')}: {old[name]} -> {new[name]}")
+        for column in self.columns:
+            if old['empty_values'][column] != new['empty_values'][column]:
+                changes.append(f"empty {column} values: {old['empty_values'][column]} -> {new['empty_values'][column]}")
+            if self._changed(old['invalid_row_totals'][column], new['invalid_row_totals'][column]):
+                changes.append(f"{column} in invalid-address rows: {old['invalid_row_totals'][column]:.6f} -> "
+                               f"{new['invalid_row_totals'][column]:.6f}")
+        return changes
+
+    def chunks(self, chunk_rows=CHUNK_ROWS):
+        """Yield an Arrow table of the differing addresses for each chunk of the key union"""
+        old_keys = np.ascontiguousarray(self.old.keys).view(RAW_DTYPE)
+        new_keys = np.ascontiguousarray(self.new.keys).view(RAW_DTYPE)
+        union = np.union1d(old_keys, new_keys)
+        for start in range(0, len(union), chunk_rows):
+            probe = union[start:start + chunk_rows]
+            old_at, in_old = _lookup(old_keys, probe)
+            new_at, in_new = _lookup(new_keys, probe)
+            changed = np.zeros(len(probe), dtype=bool)
+            values = {}
+            for column in self.columns:
+                old_values = _take(self.old.values[column], old_at, in_old)
+                new_values = _take(self.new.values[column], new_at, in_new)
+                delta = new_values - old_values
+                allowed = np.maximum(self.tolerance, self.relative_tolerance *
+                                     np.maximum(np.abs(old_values), np.abs(new_values)))
+                column_changed = in_old & in_new & (np.abs(delta) > allowed)
+                changed |= column_changed
+                values[column] = old_values, new_values, delta, column_changed
+            status = np.select([~in_old, ~in_new, changed], [0, 1, 2], default=3)
+            differs = status < 3
+            chunk_keys = probe.view(self.old.keys.dtype)
+            self._tally(status, values, chunk_keys)
+
+            kept = np.flatnonzero(differs)
+            table = {'Address': address_strings(chunk_keys[kept]),
+                     'Status': pa.array(np.array(STATUSES, dtype=object)[status[kept]], type=pa.string())}
+            for column, (old_values, new_values, delta, _) in values.items():
+                table[f"{column} old"] = pa.array(old_values[kept], mask=~in_old[kept])
+                table[f"{column} new"] = pa.array(new_values[kept], mask=~in_new[kept])
+                table[f"{column} delta"] = pa.array(delta[kept])
+            yield pa.table(table, schema=self.schema())
+
+    def _tally(self, status, values, chunk_keys):
+        for code, name in enumerate(STATUSES + ('unchanged',)):
+            self.counts[name] += int((status == code).sum())
+        for column, (old_values, new_values, delta, column_changed) in values.items():
+            totals = self.totals[column]
+            totals['old'] += float(old_values.sum())
+            totals['new'] += float(new_values.sum())
+            for code, name in enumerate(STATUSES):
+                totals[name] += float(delta[status == code].sum())
+            self.changed_by_column[column] += int(column_changed.sum())
+            if column_changed.any():
+                position = int(np.argmax(np.where(column_changed, np.abs(delta), -1.0)))
+                if abs(delta[position]) > self.largest.get(column, (-1.0, None))[0]:
+                    address = address_strings(chunk_keys[position:position + 1])[0].as_py()
+                    self.largest[column] = (float(abs(delta[position])), address)
+
+    def schema(self):
+        fields = [pa.field('Address', pa.string()), pa.field('Status', pa.string())]
+        for column in self.columns:
+            fields += [pa.field(f"{column} {part}", pa.float64()) for part in ('old', 'new', 'delta')]
+        return pa.schema(fields)
+
+    def write(self, output_file, chunk_rows=CHUNK_ROWS):
+        """Stream the differing addresses to a CSV; returns how many were written"""
+        written = 0
+        # Hex addresses, statuses and numbers never need quoting
+        options = pa_csv.WriteOptions(quoting_style='none', quoting_header='none')
+        with pa_csv.CSVWriter(output_file, self.schema(), write_options=options) as writer:
+            for table in self.chunks(chunk_rows):
+                writer.write_table(table)
+                written += table.num_rows
+        return written
+
+    @property
+    def differs(self):
+        return any(self.counts[status] for status in STATUSES) or bool(self.row_changes)
+
+    def summary(self, **details):
+        return {
+            **details,
+            'addresses': {'old': len(self.old.keys), 'new': len(self.new.keys), **self.counts},
+            'unkeyed_rows': {'old': self.row_stats(self.old), 'new': self.row_stats(self.new),
+                             'changes': self.row_changes},
+            'tolerance': self.tolerance,
+            'relative_tolerance': self.relative_tolerance,
+            'columns': {column: {**totals, 'delta': totals['new'] - totals['old'],
+                                 'changed_addresses': self.changed_by_column[column],
+                                 'largest_change': self.largest.get(column, (0.0, None))[0],
+                                 'largest_change_address': self.largest.get(column, (0.0, None))[1]}
+                        for column, totals in self.totals.items()},
+        }
+
+    def report(self):
+        counts = self.counts
+        print(f"{counts['added']} added, {counts['removed']} removed, {counts['changed']} changed and "
+              f"{counts['unchanged']} unchanged addresses")
+        for column, totals in self.totals.items():
+            largest, address = self.largest.get(column, (0.0, None))
+            print(f"  {column}: {totals['old']:.6f} -> {totals['new']:.6f} ({totals['new'] - totals['old']:+.6f}: "
+                  f"added {totals['added']:+.6f}, removed {totals['removed']:+.6f}, changed {totals['changed']:+.6f}); "
+                  f"{self.changed_by_column[column]} addresses changed"
+                  + (f", largest {largest:.6f} at {address}" if address else ''))
+        for change in self.row_changes:
+            print(f"  Rows outside the keyed diff changed: {change}")
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Diff two reward snapshots by address')
+    parser.add_argument('old', type=str, help='Earlier snapshot CSV')
+    parser.add_argument('new', type=str, help='Later snapshot CSV')
+    parser.add_argument('--columns', type=str, help='Comma-separated numeric columns to compare (default: every numeric column both files share)')
+    parser.add_argument('--address-column', type=str, default='Address', help='Address column of both files')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='Absolute change below which a value is unchanged')
+    parser.add_argument('--relative-tolerance', type=float, default=RELATIVE_TOLERANCE,
+                        help='Change relative to the larger value below which a value is unchanged')
+    parser.add_argument('--output', type=str, default=OUTPUT_CSV, help='CSV of the added, removed and changed addresses')
+    parser.add_argument('--summary-output', type=str, help='Write the counts and column totals as JSON')
+    parser.add_argument('--fail-on-diff', action='store_true', help='Exit with status 1 if any address was added, removed or changed')
+    args = parser.parse_args()
+
+    try:
+        if args.columns:
+            args.columns = [column.strip() for column in args.columns.split(',')]
+            problems = check_columns(args.columns, args.old, args.new, args.address_column)
+            if problems:
+                parser.error('; '.join(problems))
+        else:
+            args.columns, skipped = shared_columns(args.old, args.new, args.address_column)
+            if skipped:
+                print(f"Skipping non-numeric columns: {', '.join(skipped)}")
+    except (OSError, pa.ArrowInvalid) as e:
+        parser.error(f"cannot read the snapshots: {e}")
+    return args
+
+
+def main():
+    args = parse_arguments()
+    columns = args.columns
+    if not columns:
+        print(f"{args.old} and {args.new} share no numeric columns to compare. Exiting.")
+        return
+
+    started = time.time()
+    tables = []
+    for file_path in (args.old, args.new):
+        try:
+            table = SeasonTable.read(file_path, file_path, args.address_column, dict(zip(columns, columns)))
+        except pa.ArrowInvalid as e:
+            # Types are inferred from the first block only; a later block can still hold text
+            print(f"Cannot compare {file_path}: {e}", file=sys.stderr)
+            sys.exit(2)
+        table.report()
+        tables.append(table)
+    diff = SnapshotDiff(*tables, columns, args.tolerance, args.relative_tolerance)
+    written = diff.write(args.output)
+    diff.report()
+    print(f"Wrote {written} differing addresses to {args.output} in {time.time() - started:.1f}s")
+    if args.summary_output:
+        with open(args.summary_output, 'w') as f:
+            json.dump(diff.summary(old=args.old, new=args.new), f, indent=2)
+        print(f"Saved the diff summary to {args.summary_output}")
+    if args.fail_on_diff and diff.differs:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Persistent on-disk cache for per-miner stats payloads
+
+Raw response bodies are stored one file per (endpoint, address) so that a
+single network pull per season can feed every downstream script. Entries
+expire after a TTL and the least recently used files are evicted once the
+cache grows past its size limit.
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+# Configuration
+DEFAULT_CACHE_DIR = '.stats_cache'
+DEFAULT_CACHE_TTL = 7 * 24 * 3600  # Seconds before a cached payload is refetched, 0 keeps entries forever
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 ** 3  # Evict least recently used entries above this size
+EVICTION_TARGET = 0.9  # Fraction of the size limit to shrink to when evicting
+
+
+class StatsCache:
+    """Filesystem cache of raw stats payloads keyed by endpoint and address"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_CACHE_TTL, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_bytes = sum(size for _, _, size in self._entries())
+
+    def _path(self, endpoint, address):
+        key = hashlib.sha256(f"{endpoint}|{address.lower()}".encode('utf-8')).hexdigest()
+        # Shard into subfolders so no single directory holds every miner
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _entries(self):
+        """Yield (path, last access time, size) for every cached payload"""
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_atime, st.st_size
+
+    def get(self, endpoint, address, allow_expired=False):
+        """Return the cached body for an address, or None on a miss or expired entry"""
+        path = self._path(endpoint, address)
+        try:
+            st = os.stat(path)
+            if self.ttl and not allow_expired and time.time() - st.st_mtime > self.ttl:
+                with self._lock:
+                    self.expired += 1
+                    self.misses += 1
+                return None
+            with open(path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Bump the access time used for LRU eviction; mtime keeps the write time for the TTL
+        try:
+            os.utime(path, (time.time(), st.st_mtime))
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return body
+
+    def put(self, endpoint, address, body):
+        """Store a raw response body, evicting old entries if the cache is over its size limit"""
+        path = self._path(endpoint, address)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            previous = os.path.getsize(path)
+        except OSError:
+            previous = 0
+
+        # Write to a temp file and rename so readers never see a partial payload
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.writes += 1
+            self.total_bytes += len(body) - previous
+            over_limit = self.max_bytes and self.total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache is below the eviction target"""
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[1])
+            total = sum(size for _, _, size in entries)
+            target = self.max_bytes * EVICTION_TARGET
+            for path, _, size in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                self.evictions += 1
+            self.total_bytes = total
+
+    def stats(self):
+        """Return hit/miss counters for reporting"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'writes': self.writes,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size_bytes': self.total_bytes,
+        }
+
+    def report(self):
+        """Print a one-line summary of cache activity"""
+        s = self.stats()
+        print(f"Stats cache: {s['hits']} hits, {s['misses']} misses ({s['expired']} expired), "
+              f"hit rate {s['hit_rate']:.1%}, {s['writes']} writes, {s['evictions']} evictions, "
+              f"{s['size_bytes'] / 1024 ** 2:.1f} MiB on disk")
+
+
+def open_cache(cache_dir, ttl=DEFAULT_CACHE_TTL, offline=False):
+    """Open the cache requested on the command line; offline mode always needs one"""
+    if not cache_dir and offline:
+        cache_dir = DEFAULT_CACHE_DIR
+    if not cache_dir:
+        return None
+    return StatsCache(cache_dir, ttl=ttl)
@@ -0,0 +1,358 @@
+"""
+Shared client for the miner stats API
+
+Every fetcher script goes through a StatsClient, which owns a pooled
+keep-alive requests.Session. Connections to the API Gateway endpoint are
+reused across miners instead of paying a fresh TCP+TLS handshake per request.
+When a StatsCache is attached, payloads are served from disk before the
+network is tried, and offline mode never touches the network at all.
+Retryable failures are retried with backoff (see fetch_control.py) and
+miners that still fail are recorded in an optional dead-letter file. An
+attached RunMetrics (see run_metrics.py) records every request's latency,
+status and size, retries, failures and JSON decode time. With a bulk source
+(see stats_source.py) every miner comes from one scan and the API is not
+called at all.
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from fetch_control import DEFAULT_MAX_RETRIES, RETRYABLE_STATUSES, retry_wait
+from fetch_journal import FetchJournal, iter_journal, iter_journal_lines
+
+# Configuration
+STATS_API_ENDPOINT = 'https://11dugoz7j6.execute-api.us-east-1.amazonaws.com/prod/stats'
+REQUEST_TIMEOUT = 10  # Seconds to wait for the API before giving up on a miner
+DEFAULT_POOL_SIZE = 10  # Keep-alive connections held open to the API
+STREAM_WINDOW_PER_WORKER = 2  # Requests queued per worker when streaming results
+STREAM_CHUNK_SIZE = 64 * 1024  # Bytes read per chunk when streaming a response body
+
+# Where an undecoded payload came from, for the transform stage that decodes it
+ORIGIN_API = 'api'  # Response body from the API, not cached until it decodes
+ORIGIN_CACHE = 'cache'  # Body served from the stats cache
+ORIGIN_JOURNAL = 'journal'  # Whole {'address', 'data'} journal line replayed by --resume
+ORIGIN_BULK = 'bulk'  # Payload already decoded by a bulk source
+ORIGIN_ARCHIVE = 'archive'  # Whole {'address', 'data'} line replayed from a payload archive
+
+
+def parse_stats_body(address, body):
+    """Decode a raw stats response body into the {'address', 'data'} record the scripts consume"""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        print(f"Failed to parse JSON for {address}")
+        return None
+
+    # Add the address to the data for reference
+    return {
+        'address': address,
+        'data': data
+    }
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE):
+    """Create a requests session with a keep-alive connection pool of the given size"""
+    session = requests.Session()
+    # pool_block makes extra threads wait for a free connection instead of
+    # opening throwaway ones that would each need their own TLS handshake
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'Accept': 'application/json',
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+    })
+    return session
+
+
+def decode_stats_body(address, body, metrics=None):
+    """parse_stats_body, timed as the decode stage when metrics are attached"""
+    if metrics is None:
+        return parse_stats_body(address, body)
+    with metrics.stage('decode'):
+        return parse_stats_body(address, body)
+
+
+def split_cached(addresses, cache, endpoint=STATS_API_ENDPOINT, offline=False, metrics=None, source=None):
+    """
+    Serve whatever the cache holds for the given addresses.
+    Returns (cached results, addresses that still need a network fetch);
+    in offline mode, or when a bulk source serves every address from one
+    scan, the second list is always empty.
+    """
+    if source is not None:
+        return list(source.fetch_many(addresses)), []
+    results = []
+    missing = []
+    if cache is None:
+        return results, list(addresses)
+
+    for address in addresses:
+        body = cache.get(endpoint, address, allow_expired=offline)
+        result = decode_stats_body(address, body, metrics) if body is not None else None
+        if result:
+            results.append(result)
+        else:
+            missing.append(address)
+
+    if offline and missing:
+        print(f"Offline mode: skipping {len(missing)} addresses not found in the stats cache")
+        missing = []
+    return results, missing
+
+
+class StatsClient:
+    """Thread-safe client for the stats API backed by a pooled session"""
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, endpoint=STATS_API_ENDPOINT, timeout=REQUEST_TIMEOUT,
+                 cache=None, offline=False, max_retries=DEFAULT_MAX_RETRIES, controller=None, dead_letter=None,
+                 metrics=None, source=None):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.cache = cache
+        self.offline = offline
+        self.max_retries = max_retries
+        self.controller = controller
+        self.dead_letter = dead_letter
+        self.metrics = metrics
+        self.source = source
+        self.session = create_session(max(1, pool_size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
+
+    def split_cached(self, addresses):
+        """Split addresses into cached results and addresses that still need fetching"""
+        return split_cached(addresses, self.cache, self.endpoint, self.offline, self.metrics, self.source)
+
+    def get_cached_body(self, address):
+        """Return the raw cached body for a miner, or None if the cache does not hold it"""
+        if self.cache is None:
+            return None
+        return self.cache.get(self.endpoint, address, allow_expired=self.offline)
+
+    def get_cached(self, address):
+        """Return the cached stats for a miner, or None if the cache does not hold them"""
+        body = self.get_cached_body(address)
+        if body is None:
+            return None
+        return decode_stats_body(address, body, self.metrics)
+
+    def fetch(self, address):
+        """Fetch complete stats for a specific miner, trying the cache before the API"""
+        if self.source is not None:
+            return self.source.fetch(address)
+        cached = self.get_cached(address)
+        if cached:
+            return cached
+        if self.offline:
+            return None
+        return self.fetch_remote(address)
+
+    def fetch_remote(self, address, decode=True):
+        """
+        Fetch complete stats for a specific miner address using the API endpoint.
+        429, 5xx and transport errors are retried with backoff; a miner that
+        still fails is dead-lettered and None is returned. With decode=False
+        the raw body is returned undecoded and uncached, for a transform stage
+        that caches it once it has decoded.
+        """
+        url = f"{self.endpoint}?minerId={address}"
+        reason = None
+        attempt = 0
+        while True:
+            status, body, retry_after, error, latency = self._request(url)
+
+            if body is not None:
+                result = decode_stats_body(address, body, self.metrics) if decode else body
+                if result:
+                    if self.controller:
+                        self.controller.on_success(latency)
+                    # Only cache payloads that decoded, so a bad response is refetched next run
+                    if decode and self.cache is not None:
+                        self.cache.put(self.endpoint, address, body)
+                    return result
+                reason = 'invalid JSON'
+                break
+
+            reason = error or f"HTTP {status}"
+            if status is not None and status not in RETRYABLE_STATUSES:
+                print(f"Error fetching stats for {address}: Status {status}")
+                break
+            if self.controller:
+                self.controller.on_congestion()
+            if attempt >= self.max_retries:
+                break
+            if self.metrics:
+                self.metrics.observe_retry()
+            time.sleep(retry_wait(attempt, retry_after))
+            attempt += 1
+
+        print(f"Giving up on {address} after {attempt + 1} attempts: {reason}")
+        if self.metrics:
+            self.metrics.observe_failure()
+        if self.dead_letter:
+            self.dead_letter.record(address, reason, attempt + 1)
+        return None
+
+    def _request(self, url):
+        """Make one GET, returning (status, body, Retry-After, error, latency)"""
+        status = body = retry_after = error = None
+        if self.controller:
+            self.controller.acquire()
+        started = time.monotonic()
+        try:
+            # Stream the body so the connection goes back to the pool as soon
+            # as it has been read, without buffering it twice as text
+            with self.session.get(url, timeout=self.timeout, stream=True) as response:
+                status = response.status_code
+                if status == 200:
+                    body = b''.join(response.iter_content(chunk_size=STREAM_CHUNK_SIZE))
+                else:
+                    retry_after = response.headers.get('Retry-After')
+        except requests.RequestException as e:
+            status = body = None
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            if self.controller:
+                self.controller.release()
+        latency = time.monotonic() - started
+        if self.metrics:
+            self.metrics.observe_request(latency, status, len(body) if body else 0)
+        return status, body, retry_after, error, latency
+
+
+def iter_miner_stats(addresses, max_workers, delay=0, context=None, raw=False, use_cache=True):
+    """
+    Yield miner stats as requests complete, using a thread pool.
+    Only a small window of requests is queued at a time, so memory stays flat
+    however many addresses there are. The optional FetchContext supplies the
+    cache, retry policy and adaptive controller. With raw, nothing is decoded
+    on these threads: (address, body, origin) items are yielded instead, with
+    the body as bytes (a bulk source's payload is yielded as it is). Without
+    use_cache, the cache is not read, only written.
+    """
+    window = max(1, max_workers) * STREAM_WINDOW_PER_WORKER
+    skipped = 0
+    client = context.client(max_workers) if context else StatsClient(pool_size=max_workers)
+    if client.source is not None:
+        # One scan yields every miner; there are no requests to spread over threads
+        with client:
+            if raw and hasattr(client.source, 'fetch_lines'):
+                # An archive replays undecoded lines, so decoding stays with the transform stage
+                for address, line in client.source.fetch_lines(addresses):
+                    yield address, line, ORIGIN_ARCHIVE
+                return
+            for payload in client.source.fetch_many(addresses):
+                yield (payload['address'], payload, ORIGIN_BULK) if raw else payload
+        return
+    with client, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {}  # Future -> address
+        for address in addresses:
+            if not use_cache:
+                cached = None
+            elif raw:
+                body = client.get_cached_body(address)
+                cached = (address, body, ORIGIN_CACHE) if body is not None else None
+            else:
+                cached = client.get_cached(address)
+            if cached:
+                yield cached
+                continue
+            if client.offline:
+                skipped += 1
+                continue
+
+            # Drain finished requests before queueing more than the window allows
+            while len(in_flight) >= window:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    if result:
+                        yield (in_flight[future], result, ORIGIN_API) if raw else result
+                    del in_flight[future]
+
+            in_flight[executor.submit(client.fetch_remote, address, not raw)] = address
+            if delay:
+                time.sleep(delay)  # Prevent API rate limiting
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result:
+                    yield (in_flight[future], result, ORIGIN_API) if raw else result
+                del in_flight[future]
+
+    if skipped:
+        print(f"Offline mode: skipped {skipped} addresses not found in the stats cache")
+
+
+def stream_miner_stats(addresses, max_workers, delay=0, context=None, journal_path=None, resume=False, raw=False):
+    """
+    Yield every miner's stats exactly once for a streaming run.
+    With resume, miners already in the journal are replayed from it first and
+    only the rest are fetched; every newly fetched miner is journaled. With
+    raw, undecoded (address, body, origin) items are yielded as by
+    iter_miner_stats, journal lines included, and journaling is left to the
+    stage that decodes them; see refetch_raw for lines that do not decode.
+    """
+    completed = set()
+    if journal_path and resume:
+        if raw:
+            for address, line in iter_journal_lines(journal_path):
+                if address not in completed:
+                    completed.add(address)
+                    yield address, line, ORIGIN_JOURNAL
+        else:
+            for result in iter_journal(journal_path):
+                if result['address'] not in completed:
+                    completed.add(result['address'])
+                    yield result
+        if raw:
+            print(f"Resuming: replaying {len(completed)} journaled miners from {journal_path}, "
+                  f"refetching any whose line does not decode")
+        else:
+            print(f"Resuming: {len(completed)} miners already completed in {journal_path}")
+
+    remaining = (address for address in addresses if address not in completed)
+    if raw:
+        yield from iter_miner_stats(remaining, max_workers, delay, context, raw=True)
+        return
+    journal = FetchJournal(journal_path, truncate=not resume) if journal_path else None
+    try:
+        for result in iter_miner_stats(remaining, max_workers, delay, context):
+            if journal:
+                journal.append(result)
+            yield result
+    finally:
+        if journal:
+            journal.close()
+
+
+def refetch_raw(rejected, max_workers, delay=0, context=None):
+    """
+    Yield raw items again for (address, origin) pairs whose journal line or
+    cached body did not decode, the way the inline path would have fetched
+    them: a torn journal line goes back through the cache, while a bad cache
+    entry goes straight to the API.
+    """
+    journaled = [address for address, origin in rejected if origin == ORIGIN_JOURNAL]
+    cached = [address for address, origin in rejected if origin == ORIGIN_CACHE]
+    if journaled:
+        yield from iter_miner_stats(journaled, max_workers, delay, context, raw=True)
+    if cached:
+        yield from iter_miner_stats(cached, max_workers, delay, context, raw=True, use_cache=False)
+
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Bulk sources of miner stats that bypass the per-miner stats API
+
+The stats API answers one miner per HTTP request, but the daily points and
+rewards it serves come from the miner_performance table the address Lambda
+in note.md already queries. A bulk source reads every S2 miner's daily rows
+in one set-based query (SQLite, or Postgres through psycopg2) or from one
+bulk export CSV of that query, and splits the rows into the same
+{'address', 'data'} payloads the API produces, with s2Rewards and the S2
+point and reward totals. Fields the daily table cannot provide (hardware,
+status, request counts) are left out, so the scripts fall back to their
+defaults for them.
+
+A payload archive written by a pipeline run (see payload_archive.py) is a
+bulk source too, replaying the complete payloads exactly as archived.
+
+Rows must come ordered by miner_id so each miner's payload can be built as
+soon as its last row has been read, without holding the whole scan in
+memory. A custom --bulk-query must return the columns miner_id, daily_date,
+llama_points, waifu_points, llama_reward_tokens and waifu_reward_tokens in
+that order, and may use the :start and :end parameters of the S2 window
+(end is exclusive: midnight after the last S2 day, which S2_DAYS counts).
+
+Run as a script to build a local SQLite stand-in for miner_performance from
+a fetch journal (e.g. a synthetic season), or to export a source to CSV.
+"""
+
+import argparse
+import csv
+import re
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+from fetch_journal import iter_journal
+from payload_archive import ArchiveStatsSource, is_archive
+
+# Defaults
+FETCH_BATCH_SIZE = 10000  # Rows pulled from the database cursor at a time
+EXPORT_COLUMNS = ['miner_id', 'daily_date', 'llama_points', 'waifu_points', 'llama_reward_tokens', 'waifu_reward_tokens']
+BULK_QUERY = """
+SELECT miner_id,
+       DATE(hourly_time) AS daily_date,
+       SUM(llama_points) AS llama_points,
+       SUM(waifu_points) AS waifu_points,
+       SUM(llama_reward_tokens) AS llama_reward_tokens,
+       SUM(waifu_reward_tokens) AS waifu_reward_tokens
+FROM miner_performance
+WHERE hourly_time >= :start AND hourly_time < :end
+GROUP BY miner_id, DATE(hourly_time)
+ORDER BY miner_id, daily_date
+"""
+STANDIN_SCHEMA = """
+CREATE TABLE IF NOT EXISTS miner_performance (
+    miner_id TEXT NOT NULL,
+    hourly_time TEXT NOT NULL,
+    llama_points REAL NOT NULL DEFAULT 0,
+    waifu_points REAL NOT NULL DEFAULT 0,
+    llama_reward_tokens REAL NOT NULL DEFAULT 0,
+    waifu_reward_tokens REAL NOT NULL DEFAULT 0
+)
+"""
+STANDIN_HOUR = '12:00:00'  # Time of day of the one hourly row a stand-in holds per active day
+
+
+def season_window():
+    """
+    S2 start and exclusive end as 'YYYY-MM-DD HH:MM:SS', comparable with
+    hourly_time in SQLite and Postgres; the end is the midnight after the
+    last S2 day, so every hour of that day is included.
+    """
+    # Imported late: miner_feature_generator imports this module through fetch_context
+    from miner_feature_generator import S2_START_SECONDS, S2_DAYS
+    return tuple(datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+                 for seconds in (S2_START_SECONDS, S2_START_SECONDS + S2_DAYS * 86400))
+
+
+def build_payload(address, days):
+    """API-shaped stats record from one miner's daily rows"""
+    llama_points = sum(day['llama_points'] for day in days)
+    waifu_points = sum(day['waifu_points'] for day in days)
+    return {
+        'address': address,
+        'data': {
+            'totalLlamaPoints': llama_points,
+            'totalWaifuPoints': waifu_points,
+            's2CurrentEpochLlamaPoints': llama_points,
+            's2CurrentEpochWaifuPoints': waifu_points,
+            's2CurrentEpochLlamaRewards': sum(day['llama_reward_tokens'] for day in days),
+            's2CurrentEpochWaifuRewards': sum(day['waifu_reward_tokens'] for day in days),
+            's2Rewards': days,
+        },
+    }
+
+
+def daily_record(row):
+    """One s2Rewards entry from a (miner_id, daily_date, points..., tokens...) row"""
+    daily_date = row[1]
+    daily_date = daily_date.isoformat() if hasattr(daily_date, 'isoformat') else str(daily_date)[:10]
+    return {
+        'daily_date': daily_date,
+        'llama_points': float(row[2] or 0),
+        'waifu_points': float(row[3] or 0),
+        'llama_reward_tokens': float(row[4] or 0),
+        'waifu_reward_tokens': float(row[5] or 0),
+    }
+
+
+class BulkStatsSource:
+    """
+    Base of the bulk sources: subclasses yield rows ordered by miner_id and
+    this class groups them into per-miner payloads.
+    """
+
+    name = None
+
+    def __init__(self):
+        self.rows_read = 0
+        self.miners = 0
+        self.empty = 0
+        self.seconds = 0.0
+
+    def rows(self):
+        """Yield (miner_id, daily_date, llama_points, waifu_points, llama_reward_tokens, waifu_reward_tokens)"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def grouped(self):
+        """Yield (miner_id, daily records) for each run of rows of the same miner"""
+        miner_id = None
+        days = []
+        for row in self.rows():
+            self.rows_read += 1
+            if row[0] != miner_id:
+                if days:
+                    yield miner_id, days
+                miner_id = row[0]
+                days = []
+            days.append(daily_record(row))
+        if days:
+            yield miner_id, days
+
+    def fetch_many(self, addresses):
+        """
+        Yield the payload of every requested address from one scan. A
+        requested miner without any S2 rows gets an empty history, as the
+        API returns for a miner that earned nothing.
+        """
+        wanted = {address.lower(): address for address in addresses}
+        done = set()
+        started = time.monotonic()
+        try:
+            for miner_id, days in self.grouped():
+                key = str(miner_id).lower()
+                if key in done:
+                    raise ValueError(f"Bulk rows for {miner_id} are not contiguous; the query must ORDER BY miner_id")
+                address = wanted.pop(key, None)
+                if address is None:
+                    continue
+                done.add(key)
+                self.miners += 1
+                yield build_payload(address, days)
+            for address in wanted.values():
+                self.empty += 1
+                yield build_payload(address, [])
+        finally:
+            self.seconds += time.monotonic() - started
+
+    def fetch(self, address):
+        """Payload of a single miner; this still scans the whole source"""
+        return next(self.fetch_many([address]), None)
+
+    def report(self):
+        print(f"Bulk source ({self.name}): {self.rows_read} daily rows -> {self.miners} miners "
+              f"and {self.empty} without S2 rows in {self.seconds:.1f}s")
+
+
+class SqlStatsSource(BulkStatsSource):
+    """One set-based query against miner_performance over a DB-API connection"""
+
+    name = 'sql'
+
+    def __init__(self, connection, query=BULK_QUERY, paramstyle='named', server_side=False):
+        super().__init__()
+        self.connection = connection
+        self.query = query
+        self.paramstyle = paramstyle
+        self.server_side = server_side
+
+    def rows(self):
+        start, end = season_window()
+        query = self.query
+        if self.paramstyle == 'pyformat':
+            # psycopg2 spells :start as %(start)s; leave Postgres ::casts alone
+            query = re.sub(r'(?<!:):(start|end)\b', r'%(\1)s', query.replace('%', '%%'))
+        # A named cursor makes Postgres stream the result instead of sending it all at once
+        cursor = self.connection.cursor(name='bulk_miner_stats') if self.server_side else self.connection.cursor()
+        try:
+            cursor.execute(query, {'start': start, 'end': end})
+            while True:
+                batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+                if not batch:
+                    break
+                yield from batch
+        finally:
+            cursor.close()
+
+    def close(self):
+        self.connection.close()
+
+
+class ExportStatsSource(BulkStatsSource):
+    """Rows of a bulk export CSV with the EXPORT_COLUMNS header, e.g. from psql \\copy"""
+
+    name = 'export'
+
+    def __init__(self, export_file):
+        super().__init__()
+        self.export_file = export_file
+
+    def rows(self):
+        with open(self.export_file, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                yield tuple(row[column] for column in EXPORT_COLUMNS)
+
+
+def open_stats_source(spec, query_file=None):
+    """
+    Open the bulk source named on the command line, or return None to use the
+    API: postgresql://... (needs psycopg2), sqlite:///path, a .db/.sqlite
+    file, a .csv bulk export, or a payload archive directory (see
+    payload_archive.py). query_file replaces the default SQL query.
+    """
+    if not spec:
+        return None
+    query = BULK_QUERY
+    if query_file:
+        with open(query_file, 'r') as f:
+            query = f.read()
+
+    if spec.startswith(('postgresql://', 'postgres://')):
+        try:
+            import psycopg2
+        except ImportError:
+            raise ImportError("A Postgres bulk source needs psycopg2 (pip install psycopg2-binary)")
+        return SqlStatsSource(psycopg2.connect(spec), query, paramstyle='pyformat', server_side=True)
+    if spec.startswith('sqlite:///'):
+        return SqlStatsSource(sqlite3.connect(spec[len('sqlite:///'):]), query)
+    if spec.endswith(('.db', '.sqlite', '.sqlite3')):
+        return SqlStatsSource(sqlite3.connect(spec), query)
+    if spec.endswith('.csv'):
+        return ExportStatsSource(spec)
+    if is_archive(spec):
+        return ArchiveStatsSource(spec)
+    raise ValueError(f"Unknown bulk source '{spec}', expected postgresql://, sqlite:///, a .db file, "
+                     f"a .csv export or a payload archive")
+
+
+def write_standin_db(db_file, payloads):
+    """Fill a SQLite miner_performance stand-in with one row per active day of each payload"""
+    connection = sqlite3.connect(db_file)
+    connection.execute(STANDIN_SCHEMA)
+    miners = rows = 0
+    for payload in payloads:
+        days = (payload.get('data') or {}).get('s2Rewards') or []
+        connection.executemany(
+            "INSERT INTO miner_performance VALUES (?, ?, ?, ?, ?, ?)",
+            [(payload['address'], f"{day['daily_date']} {STANDIN_HOUR}", day.get('llama_points', 0),
+              day.get('waifu_points', 0), day.get('llama_reward_tokens', 0), day.get('waifu_reward_tokens', 0))
+             for day in days])
+        miners += 1
+        rows += len(days)
+    connection.commit()
+    connection.close()
+    print(f"Wrote {rows} daily rows for {miners} miners to {db_file}")
+
+
+def export_source(source, output_file):
+    """Write a bulk source's rows as an export CSV"""
+    count = 0
+    with open(output_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for miner_id, days in source.grouped():
+            for day in days:
+                writer.writerow([miner_id] + [day[column] for column in EXPORT_COLUMNS[1:]])
+                count += 1
+    print(f"Exported {count} daily rows to {output_file}")
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Build a local miner_performance stand-in or export a bulk source to CSV')
+    parser.add_argument('--journal', type=str, help='Fetch journal whose payloads fill the stand-in')
+    parser.add_argument('--standin-db', type=str, help='SQLite file to create (or append to) with a miner_performance table')
+    parser.add_argument('--source', type=str, help='Bulk source to export (postgresql://..., sqlite:///..., .db file)')
+    parser.add_argument('--query', type=str, help='SQL file replacing the default bulk query')
+    parser.add_argument('--export', type=str, help='Bulk export CSV to write from --source')
+    args = parser.parse_args()
+    if not (args.journal and args.standin_db) and not (args.source and args.export):
+        parser.error('give --journal and --standin-db, or --source and --export')
+    return args
+
+
+def main():
+    args = parse_arguments()
+    if args.journal and args.standin_db:
+        write_standin_db(args.standin_db, iter_journal(args.journal))
+    if args.source and args.export:
+        source = open_stats_source(args.source, args.query)
+        export_source(source, args.export)
+        source.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the miner stats API
+
+Serves deterministic synthetic stats payloads on the same ?minerId= interface
+as STATS_API_ENDPOINT, so the fetchers can be exercised and benchmarked
+without calling the production API Gateway endpoint. Response latency, 5xx
+errors and 429 throttling (at random, or above a request rate) are
+configurable, and the server counts every response it sends.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from miner_feature_generator import S2_START_SECONDS, S2_DAYS
+
+# Defaults
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8000
+STATS_PATH = '/prod/stats'  # Same path as the production endpoint
+DEFAULT_LATENCY = 0.05  # Seconds spent before answering a request
+DEFAULT_JITTER = 0.5  # Latency varies uniformly by this fraction either way
+DEFAULT_RETRY_AFTER = 1  # Retry-After seconds sent with a 429, None sends no header
+PAYLOAD_FORMATS = ('s2Rewards', 'dailyPoints')
+REQUEST_QUEUE_SIZE = 1024  # Listen backlog, so a burst of new connections is not refused
+
+
+def synthetic_stats(address, days=S2_DAYS, payload_format='s2Rewards'):
+    """
+    Deterministic stats payload for an address: the same address always gets
+    the same activity, so runs against the stub are reproducible.
+    """
+    rng = random.Random(address.lower())
+    activity = rng.uniform(0.05, 0.95)  # Share of the season the miner was online
+    llama_share = rng.random()
+    start = datetime.utcfromtimestamp(S2_START_SECONDS).date()
+
+    daily = []
+    for day in range(days):
+        if rng.random() >= activity:
+            continue
+        llama_points = rng.uniform(1, 500) if rng.random() < llama_share else 0.0
+        waifu_points = rng.uniform(1, 500) if rng.random() >= llama_share else 0.0
+        daily_date = (start + timedelta(days=day)).isoformat()
+        if payload_format == 'dailyPoints':
+            daily.append({
+                'daily_date': daily_date,
+                'daily_llama_points': llama_points,
+                'daily_waifu_points': waifu_points,
+            })
+        else:
+            daily.append({
+                'daily_date': daily_date,
+                'llama_points': llama_points,
+                'waifu_points': waifu_points,
+                'llama_reward_tokens': llama_points * 0.01,
+                'waifu_reward_tokens': waifu_points * 0.01,
+            })
+
+    llama_total = sum(day.get('llama_points', day.get('daily_llama_points')) for day in daily)
+    waifu_total = sum(day.get('waifu_points', day.get('daily_waifu_points')) for day in daily)
+    return {
+        'hardware': rng.choice(['NVIDIA GeForce RTX 4090', 'NVIDIA GeForce RTX 3090', 'NVIDIA A100']),
+        'status': rng.choice(['active', 'inactive']),
+        'totalImageCount': int(waifu_total * 3),
+        'totalTextCount': int(llama_total * 5),
+        'last24HrsImageCount': rng.randint(0, 500),
+        'last24HrsTextCount': rng.randint(0, 800),
+        'last24HrsAvailability': round(rng.random(), 4),
+        'totalLlamaPoints': llama_total,
+        'totalWaifuPoints': waifu_total,
+        's2CurrentEpochLlamaPoints': llama_total,
+        's2CurrentEpochWaifuPoints': waifu_total,
+        's2CurrentEpochLlamaRewards': llama_total * 0.01,
+        's2CurrentEpochWaifuRewards': waifu_total * 0.01,
+        payload_format: daily,
+    }
+
+
+class StubStatsHandler(BaseHTTPRequestHandler):
+    """Answers GET /prod/stats?minerId=... like the stats API"""
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so pooled client connections are reused
+    # Headers and body go out as separate writes; without TCP_NODELAY a
+    # keep-alive client waits out a delayed ACK on every request
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        address = parse_qs(url.query).get('minerId', [None])[0]
+        if url.path != STATS_PATH:
+            self._send(404, b'{"message":"Not Found"}')
+            return
+        if not address:
+            self._send(400, b'{"message":"minerId is required"}')
+            return
+
+        server.wait_latency()
+        status = server.pick_status()
+        if status == 429:
+            headers = {} if server.retry_after is None else {'Retry-After': str(server.retry_after)}
+            self._send(429, b'{"message":"Too Many Requests"}', headers)
+        elif status != 200:
+            self._send(status, b'{"message":"Internal server error"}')
+        else:
+            body = json.dumps(synthetic_stats(address, server.days, server.payload_format)).encode('utf-8')
+            self._send(200, body)
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count(status, len(body))
+
+    def log_message(self, format, *args):
+        pass  # One line per request would drown the benchmark output
+
+
+class StubStatsServer(ThreadingHTTPServer):
+    """
+    Threaded stub server. Use as a context manager to serve from a background
+    thread; port 0 picks a free port, see endpoint.
+    """
+
+    daemon_threads = True
+    request_queue_size = REQUEST_QUEUE_SIZE
+
+    def __init__(self, host=DEFAULT_HOST, port=0, latency=DEFAULT_LATENCY, jitter=DEFAULT_JITTER,
+                 error_rate=0.0, throttle_rate=0.0, max_rps=0, retry_after=DEFAULT_RETRY_AFTER,
+                 days=S2_DAYS, payload_format='s2Rewards', seed=None):
+        super().__init__((host, port), StubStatsHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.max_rps = max_rps
+        self.retry_after = retry_after
+        self.days = days
+        self.payload_format = payload_format
+        self.statuses = Counter()
+        self.bytes_sent = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = float(max(1, max_rps))
+        self._updated = time.monotonic()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        self.server_close()
+
+    @property
+    def endpoint(self):
+        """URL to use in place of STATS_API_ENDPOINT"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{STATS_PATH}"
+
+    def wait_latency(self):
+        """Sleep for this request's simulated latency"""
+        if self.latency > 0:
+            with self._lock:
+                factor = self._rng.uniform(1 - self.jitter, 1 + self.jitter)
+            time.sleep(max(0.0, self.latency * factor))
+
+    def _over_rate(self):
+        """Token bucket of max_rps per second with a one-second burst; 0 never throttles"""
+        if self.max_rps <= 0:
+            return False
+        now = time.monotonic()
+        self._tokens = min(self.max_rps, self._tokens + (now - self._updated) * self.max_rps)
+        self._updated = now
+        if self._tokens < 1:
+            return True
+        self._tokens -= 1
+        return False
+
+    def pick_status(self):
+        """Status for the next response: 429 when throttled, 500 for an injected error, else 200"""
+        with self._lock:
+            if self._over_rate() or self._rng.random() < self.throttle_rate:
+                return 429
+            if self._rng.random() < self.error_rate:
+                return 500
+            return 200
+
+    def count(self, status, size):
+        with self._lock:
+            self.statuses[status] += 1
+            self.bytes_sent += size
+
+    def reset_stats(self):
+        """Zero the response counters, e.g. between benchmark cases"""
+        with self._lock:
+            self.statuses = Counter()
+            self.bytes_sent = 0
+
+    def stats(self):
+        """Response counters so far"""
+        with self._lock:
+            return {
+                'requests': sum(self.statuses.values()),
+                'ok': self.statuses[200],
+                'throttled': self.statuses[429],
+                'errors': sum(count for status, count in self.statuses.items() if status >= 500),
+                'bytes_sent': self.bytes_sent,
+            }
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Serve synthetic miner stats locally in place of the stats API')
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST, help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY, help='Seconds before each response')
+    parser.add_argument('--jitter', type=float, default=DEFAULT_JITTER, help='Fraction the latency varies either way')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with HTTP 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of requests answered with HTTP 429')
+    parser.add_argument('--max-rps', type=float, default=0, help='Answer 429 above this many requests per second (0 = no limit)')
+    parser.add_argument('--retry-after', type=int, default=DEFAULT_RETRY_AFTER, help='Retry-After seconds sent with a 429 (negative sends none)')
+    parser.add_argument('--days', type=int, default=S2_DAYS, help='Season days covered by each payload')
+    parser.add_argument('--payload-format', choices=PAYLOAD_FORMATS, default='s2Rewards', help='Daily history field to serve')
+    parser.add_argument('--seed', type=int, help='Seed for latency, error and throttle decisions')
+    return parser.parse_args()
+
+
+def main():
+    """Run the stub until interrupted"""
+    args = parse_arguments()
+    server = StubStatsServer(args.host, args.port, args.latency, args.jitter, args.error_rate, args.throttle_rate,
+                             args.max_rps, args.retry_after if args.retry_after >= 0 else None,
+                             args.days, args.payload_format, args.seed)
+    print(f"Serving synthetic miner stats at {server.endpoint}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    print(f"Stub stats: {server.stats()}")
+
+
+if __name__ == "__main__":
+    main()
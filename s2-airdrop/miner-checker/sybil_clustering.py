@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Local sybil clustering of miner activity patterns
+
+Replaces the Colab notebook described in note.md. Reads the bit-packed
+activity matrix written by miner_feature_generator.py, computes pairwise
+Jaccard or Hamming distances in fixed-size blocks of rows spread over
+several processes (pair counts come from a matrix product of the unpacked
+bits), groups miners whose distance stays under a threshold into main
+clusters (connected components), splits every main cluster with
+average-linkage hierarchical clustering (on a sample for very large
+clusters, see split_subclusters), and writes one
+cluster_X_subcluster_Y_addresses.csv per subcluster with the columns
+address,main_cluster,subcluster.
+"""
+
+import argparse
+import csv
+import glob
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from activity_matrix import ActivityMatrix
+from miner_feature_generator import MATRIX_OUTPUT
+
+# Constants
+OUTPUT_DIR = 'sybils-address-clusters'
+CLUSTER_FILE_PATTERN = 'cluster_*_subcluster_*_addresses.csv'
+DEFAULT_METRIC = 'jaccard'
+DEFAULT_THRESHOLD = 0.1  # Maximum distance for two miners to be linked into the same main cluster
+DEFAULT_SUB_THRESHOLD = 0.05  # Average-linkage cut inside a main cluster
+MIN_DAYS_ACTIVE = 7  # Shorter histories match each other by chance and are not clustered
+MIN_CLUSTER_SIZE = 100
+MIN_SUBCLUSTER_SIZE = 20
+BLOCK_BYTES = 32 * 1024 * 1024  # Working set of one distance block
+BLOCK_ROWS = 1024  # Rows per distance task, compared against the later rows a column chunk at a time
+DISTANCE_BYTES = 16  # Bytes held per pair while a block is compared (product, counts and distances)
+MAX_LINKAGE_ROWS = 10000  # Largest main cluster linked whole; its condensed distances take 400 MB
+
+# Per-worker state, set by _init_worker so the matrix is shipped once per process
+_BITS = None
+_METRIC = None
+_THRESHOLD = None
+
+
+def unpack_rows(packed):
+    """Packed uint8 rows as float32 0/1 rows, so pair counts come from one BLAS product"""
+    return np.unpackbits(packed, axis=1).astype(np.float32)
+
+
+def pair_distances(left, right, metric=DEFAULT_METRIC):
+    """Distances between every row of left and every row of right (unpacked float32 0/1 rows)"""
+    shared = left @ right.T  # Exact: counts stay far below float32's 2**24
+    left_counts = left.sum(axis=1)[:, None]
+    right_counts = right.sum(axis=1)[None, :]
+    if metric == 'hamming':
+        return (left_counts + right_counts - 2 * shared) / left.shape[1]
+    either = left_counts + right_counts - shared
+    return 1.0 - shared / np.maximum(either, 1)
+
+
+def block_columns(n_rows):
+    """Columns compared at a time against a block of n_rows, so its distances stay around BLOCK_BYTES"""
+    return max(1, BLOCK_BYTES // (max(1, n_rows) * DISTANCE_BYTES))
+
+
+def _init_worker(bits, metric, threshold):
+    global _BITS, _METRIC, _THRESHOLD
+    _BITS = bits
+    _METRIC = metric
+    _THRESHOLD = threshold
+
+
+def _block_edges(bounds):
+    """Pairs (i, j), i < j, within the threshold for rows start..stop against every later row"""
+    start, stop = bounds
+    left = unpack_rows(_BITS[start:stop])
+    step = block_columns(stop - start)
+    rows, cols = [], []
+    for column in range(start, len(_BITS), step):
+        distances = pair_distances(left, unpack_rows(_BITS[column:column + step]), _METRIC)
+        block_rows, block_cols = np.nonzero(distances <= _THRESHOLD)
+        block_rows += start
+        block_cols += column
+        upper = block_cols > block_rows
+        rows.append(block_rows[upper].astype(np.int32))
+        cols.append(block_cols[upper].astype(np.int32))
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+def find_main_clusters(bits, metric, threshold, jobs):
+    """Label every row with its connected component in the thresholded distance graph"""
+    n = len(bits)
+    blocks = [(start, min(start + BLOCK_ROWS, n)) for start in range(0, n, BLOCK_ROWS)]
+
+    if jobs > 1:
+        with Pool(jobs, initializer=_init_worker, initargs=(bits, metric, threshold)) as pool:
+            edges = pool.map(_block_edges, blocks, chunksize=max(1, len(blocks) // (jobs * 4)))
+    else:
+        _init_worker(bits, metric, threshold)
+        edges = [_block_edges(block) for block in blocks]
+
+    rows = np.concatenate([e[0] for e in edges]) if edges else np.zeros(0, dtype=np.int32)
+    cols = np.concatenate([e[1] for e in edges]) if edges else np.zeros(0, dtype=np.int32)
+    print(f"Found {len(rows)} linked pairs among {n} miners")
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+    return labels
+
+
+def condensed_distances(rows, metric):
+    """The condensed (upper-triangle) distance vector of unpacked rows, built block by block"""
+    n = len(rows)
+    condensed = np.empty(n * (n - 1) // 2)
+    position = 0
+    for start in range(0, n, BLOCK_ROWS):
+        stop = min(start + BLOCK_ROWS, n)
+        block = pair_distances(rows[start:stop], rows[start:], metric)
+        for i in range(stop - start):
+            tail = block[i, i + 1:]
+            condensed[position:position + len(tail)] = tail
+            position += len(tail)
+    return condensed
+
+
+def nearest_labels(rows, sample_rows, sample_labels, metric):
+    """Label of the nearest sampled row for every row, in blocks"""
+    labels = np.empty(len(rows), dtype=sample_labels.dtype)
+    step = min(BLOCK_ROWS, block_columns(len(sample_rows)))
+    for start in range(0, len(rows), step):
+        distances = pair_distances(rows[start:start + step], sample_rows, metric)
+        labels[start:start + step] = sample_labels[np.argmin(distances, axis=1)]
+    return labels
+
+
+def split_subclusters(bits, metric, sub_threshold, max_rows=MAX_LINKAGE_ROWS):
+    """
+    Average-linkage labels (1-based) for the rows of one main cluster. The
+    linkage needs every pairwise distance, so a cluster of more than
+    max_rows rows is linked on an evenly drawn sample of max_rows, and every
+    other row joins the subcluster of its nearest sampled row.
+    """
+    if len(bits) < 2:
+        return np.ones(len(bits), dtype=np.int32)
+    rows = unpack_rows(bits)
+    sample = np.arange(len(rows))
+    if len(rows) > max_rows:
+        sample = np.sort(np.random.default_rng(0).choice(len(rows), max_rows, replace=False))
+        print(f"Linking a sample of {max_rows} of {len(rows)} miners; the rest join their nearest sampled miner")
+    tree = linkage(condensed_distances(rows[sample], metric), method='average')
+    sample_labels = fcluster(tree, t=sub_threshold, criterion='distance')
+    if len(sample) == len(rows):
+        return sample_labels
+    labels = nearest_labels(rows, rows[sample], sample_labels, metric)
+    labels[sample] = sample_labels
+    return labels
+
+
+def ranked_groups(labels, min_size):
+    """Member indices per label, largest first, dropping groups under min_size"""
+    values, counts = np.unique(labels, return_counts=True)
+    order = np.argsort(-counts, kind='stable')
+    return [np.flatnonzero(labels == values[i]) for i in order if counts[i] >= min_size]
+
+
+def cluster_addresses(matrix, config):
+    """
+    Cluster the miners of an activity matrix.
+    Returns a list of (main_cluster, subcluster, [addresses]) tuples.
+    """
+    active = np.flatnonzero(matrix.days_active() >= config['min_days'])
+    print(f"Clustering {len(active)} of {len(matrix)} miners with at least {config['min_days']} active days")
+    bits = np.ascontiguousarray(matrix.flat_bits()[active])
+    addresses = [address.decode('ascii') for address in matrix.addresses[active]]
+
+    labels = find_main_clusters(bits, config['metric'], config['threshold'], config['jobs'])
+    results = []
+    for cluster_id, members in enumerate(ranked_groups(labels, config['min_cluster_size'])):
+        sub_labels = split_subclusters(bits[members], config['metric'], config['sub_threshold'],
+                                       config['max_linkage_rows'])
+        for sub_id, sub_members in enumerate(ranked_groups(sub_labels, config['min_subcluster_size'])):
+            results.append((cluster_id, sub_id, [addresses[members[i]] for i in sub_members]))
+        print(f"Main cluster {cluster_id}: {len(members)} miners")
+    return results
+
+
+def save_clusters(clusters, output_dir=OUTPUT_DIR):
+    """
+    Write one address,main_cluster,subcluster CSV per subcluster, replacing
+    the cluster files of an earlier run so a cluster that shrank or vanished
+    no longer excludes its old addresses
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    stale = glob.glob(os.path.join(output_dir, CLUSTER_FILE_PATTERN))
+    for output_file in stale:
+        os.remove(output_file)
+    if stale:
+        print(f"Removed {len(stale)} cluster files of an earlier run from {output_dir}")
+    for cluster_id, sub_id, addresses in clusters:
+        output_file = os.path.join(output_dir, f"cluster_{cluster_id}_subcluster_{sub_id}_addresses.csv")
+        with open(output_file, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['address', 'main_cluster', 'subcluster'])
+            for address in addresses:
+                writer.writerow([address, cluster_id, sub_id])
+        print(f"Saved {len(addresses)} addresses to {output_file}")
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Cluster miners with near-identical daily activity patterns')
+    parser.add_argument('--matrix', type=str, default=MATRIX_OUTPUT,
+                        help='Activity matrix written by miner_feature_generator.py (.npz or directory)')
+    parser.add_argument('--output-dir', type=str, default=OUTPUT_DIR, help='Directory for the cluster CSV files')
+    parser.add_argument('--metric', choices=['jaccard', 'hamming'], default=DEFAULT_METRIC, help='Distance between activity patterns')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='Maximum distance linking two miners into a main cluster')
+    parser.add_argument('--sub-threshold', type=float, default=DEFAULT_SUB_THRESHOLD, help='Average-linkage distance cut for subclusters')
+    parser.add_argument('--min-days', type=int, default=MIN_DAYS_ACTIVE, help='Skip miners active on fewer days')
+    parser.add_argument('--min-cluster-size', type=int, default=MIN_CLUSTER_SIZE, help='Smallest main cluster to keep')
+    parser.add_argument('--min-subcluster-size', type=int, default=MIN_SUBCLUSTER_SIZE, help='Smallest subcluster to write')
+    parser.add_argument('--max-linkage-rows', type=int, default=MAX_LINKAGE_ROWS,
+                        help='Largest main cluster linked whole; bigger ones are linked on a sample of this size')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='Processes computing distance blocks')
+    return vars(parser.parse_args())
+
+
+def main():
+    """Main function to cluster the activity matrix"""
+    config = parse_arguments()
+    start = time.time()
+    matrix = ActivityMatrix.load(config['matrix'])
+    clusters = cluster_addresses(matrix, config)
+    save_clusters(clusters, config['output_dir'])
+    if not clusters:
+        print("No clusters above the minimum size. Nothing written.")
+        return
+    print(f"Clustering complete in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Synthetic season generator for scale testing
+
+Generates a realistic season of N miners over the S2 window, in the exact
+formats the scripts consume, so every stage can be stress-tested at 10k,
+100k or 1M miners without the API:
+
+    miner_addresses.txt          address list for --input / --address-file
+    stats.journal.jsonl          per-miner stats payloads (daily s2Rewards with
+                                 llama/waifu points and reward tokens) as a fetch
+                                 journal; run a script with --journal and
+                                 --resume to consume it without fetching
+    miner_rewards_synthetic.csv  per-address reward totals, as written by
+                                 miner_rewards_calculator.py
+    top-miner-stats.json         top miners with numGPUs and revisedTokens
+    rewards_claimed_addresses.csv
+    sybils-address-clusters/     the planted sybil clusters, one
+                                 cluster_X_subcluster_Y_addresses.csv each
+    unique_addresses.csv         planted sybils plus claimed addresses, as
+                                 written by collect_unique_addresses.py
+
+Honest miners join at a random day, are online a random share of days and
+mine llama, waifu or both with heavy-tailed GPU counts. Sybil clusters share
+one activity pattern per subcluster (a small perturbation of the cluster's
+base pattern) and every member flips a few more days, so they are
+near-identical but not equal. Flips are counted as a share of the pattern's
+active days, so Jaccard distances do not depend on how busy a farm is:
+members of a subcluster stay about 0.01 apart and subclusters of a cluster
+about 0.08, which sybil_clustering.py's default --threshold 0.1 and
+--sub-threshold 0.05 recover as the planted clusters and subclusters.
+The same seed always gives the same season.
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from activity_matrix import ActivityMatrix, CHANNELS, LLAMA, WAIFU
+from miner_feature_generator import S2_START_SECONDS, S2_DAYS
+from miner_rewards_calculator import REWARDS_HEADERS
+
+# Defaults
+OUTPUT_DIR = 'synthetic_season'
+SIZE_PRESETS = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+DEFAULT_SIZES = '10k'
+DEFAULT_SEED = 2
+CHUNK_MINERS = 20_000  # Miners generated and written per batch
+SYBIL_SHARE = 0.25  # Share of miners planted in sybil clusters
+CLUSTER_SIZE_RANGE = (100, 1000)  # Members per planted cluster
+MAX_SUBCLUSTERS = 3
+SUBCLUSTER_NOISE = 0.04  # Flips from the cluster's base pattern, as a share of its active days
+MEMBER_NOISE = 0.005  # Mean flips from the subcluster's pattern, as a share of its active days
+CLAIMED_SHARE = 0.35  # Share of miners that already claimed rewards
+TOP_MINER_SHARE = 0.08  # Share of miners listed in the top-miner stats
+REVISED_SHARE = 0.02  # Share of top miners whose tokens were revised
+REVISED_FACTOR = 0.1
+HARDWARE = ('NVIDIA GeForce RTX 4090', 'NVIDIA GeForce RTX 3090', 'NVIDIA GeForce RTX 3080', 'NVIDIA A100', 'NVIDIA H100')
+
+
+def parse_size(value):
+    """Miner count from a preset (10k, 100k, 1M) or a plain number"""
+    return SIZE_PRESETS.get(value.strip().lower()) or int(value)
+
+
+def random_addresses(rng, count):
+    """Lowercase 0x-prefixed random addresses, decoded in one pass"""
+    digits = rng.integers(0, 256, (count, 20), dtype=np.uint8).tobytes().hex()
+    return ['0x' + digits[i:i + 40] for i in range(0, len(digits), 40)]
+
+
+def flip_days(rng, pattern, count):
+    """A copy of a (channels, days) pattern with count random days flipped"""
+    flipped = pattern.copy()
+    flipped.reshape(-1)[rng.choice(pattern.size, min(count, pattern.size), replace=False)] ^= True
+    return flipped
+
+
+def season_dates(days=S2_DAYS):
+    """ISO dates of the season's days"""
+    start = datetime.utcfromtimestamp(S2_START_SECONDS).date()
+    return [(start + timedelta(days=d)).isoformat() for d in range(days)]
+
+
+class SeasonPlan:
+    """Which miners are sybils, the planted patterns and the per-day token rates"""
+
+    def __init__(self, n_miners, rng, days=S2_DAYS, sybil_share=SYBIL_SHARE):
+        self.n_miners = n_miners
+        self.days = days
+        self.cluster_of = np.full(n_miners, -1, dtype=np.int32)
+        self.subcluster_of = np.full(n_miners, -1, dtype=np.int32)
+
+        # Cluster sizes until the sybil budget is used, members spread across the address list
+        budget = int(n_miners * sybil_share)
+        sizes = []
+        while budget >= CLUSTER_SIZE_RANGE[0]:
+            size = min(budget, int(rng.integers(CLUSTER_SIZE_RANGE[0], CLUSTER_SIZE_RANGE[1] + 1)))
+            sizes.append(size)
+            budget -= size
+        members = rng.permutation(n_miners)[:sum(sizes)]
+        self.patterns = []  # Per cluster, (subclusters, channels, days) bool
+        offset = 0
+        for cluster, size in enumerate(sizes):
+            base = self._base_pattern(rng)
+            n_sub = int(rng.integers(1, MAX_SUBCLUSTERS + 1))
+            flips = int(round(SUBCLUSTER_NOISE * base.sum()))
+            self.patterns.append(np.stack([flip_days(rng, base, flips) for _ in range(n_sub)]))
+            cluster_members = members[offset:offset + size]
+            self.cluster_of[cluster_members] = cluster
+            # Subcluster sizes are uneven, like the real ones
+            self.subcluster_of[cluster_members] = np.sort(rng.integers(0, n_sub, size))
+            offset += size
+
+        # Tokens per point of each channel and day, shared by every miner
+        self.token_rates = rng.uniform(0.5, 1.5, (CHANNELS, days))
+
+    def _base_pattern(self, rng):
+        """A sybil farm's schedule: joins at some day, then online most days on one or both models"""
+        start = int(rng.integers(0, self.days // 2))
+        online = (np.arange(self.days) >= start) & (rng.random(self.days) < rng.uniform(0.6, 0.95))
+        channels = [[True, False], [False, True], [True, True]][int(rng.integers(0, 3))]
+        return np.stack([online & channels[LLAMA], online & channels[WAIFU]])
+
+
+def generate_chunk(plan, rng, start, stop):
+    """
+    Activity, points and GPU counts for miners start..stop.
+    Returns (active (m, channels, days) bool, points (m, channels, days) float, gpus (m,) int).
+    """
+    m = stop - start
+    days = plan.days
+    day = np.arange(days)
+
+    # Honest miners: join day, availability and model mix
+    joined = rng.integers(0, days, m)[:, None]
+    availability = rng.beta(2.0, 1.5, m)[:, None]
+    online = (day[None] >= joined) & (rng.random((m, days)) < availability)
+    mix = rng.choice(3, m, p=[0.35, 0.35, 0.3])  # llama only, waifu only, both
+    active = np.stack([online & (mix != 1)[:, None], online & (mix != 0)[:, None]], axis=1)
+
+    # Sybils: their subcluster's pattern with a few member-specific flips
+    cluster = plan.cluster_of[start:stop]
+    for i in np.flatnonzero(cluster >= 0):
+        pattern = plan.patterns[cluster[i]][plan.subcluster_of[start + i]]
+        active[i] = flip_days(rng, pattern, int(rng.poisson(MEMBER_NOISE * pattern.sum())))
+
+    # Heavy-tailed GPU counts for honest miners; sybil farms run one or two GPUs per address
+    gpus = np.minimum(1 + rng.pareto(1.2, m).astype(np.int64), 3000)
+    gpus[cluster >= 0] = rng.integers(1, 3, int((cluster >= 0).sum()))
+    points = active * gpus[:, None, None] * rng.lognormal(3.0, 0.6, (m, CHANNELS, days))
+    return active, points, gpus
+
+
+def payload_line(address, dates, active, points, tokens, rng_values):
+    """One journal line: the stats payload of one miner"""
+    days = np.flatnonzero(active.any(axis=0)).tolist()
+    llama_points, waifu_points = points.tolist()
+    llama_rewards, waifu_rewards = tokens.tolist()
+    rewards = ','.join(
+        f'{{"daily_date":"{dates[d]}","llama_points":{llama_points[d]!r},"waifu_points":{waifu_points[d]!r},'
+        f'"llama_reward_tokens":{llama_rewards[d]!r},"waifu_reward_tokens":{waifu_rewards[d]!r}}}'
+        for d in days)
+    llama_total, waifu_total = points.sum(axis=1).tolist()
+    llama_tokens, waifu_tokens = tokens.sum(axis=1).tolist()
+    hardware, status, images, texts, availability = rng_values
+    data = (f'{{"hardware":"{hardware}","status":"{status}","totalImageCount":{int(waifu_total) * 3},'
+            f'"totalTextCount":{int(llama_total) * 5},"last24HrsImageCount":{images},"last24HrsTextCount":{texts},'
+            f'"last24HrsAvailability":{availability},"totalLlamaPoints":{llama_total!r},"totalWaifuPoints":{waifu_total!r},'
+            f'"s2CurrentEpochLlamaPoints":{llama_total!r},"s2CurrentEpochWaifuPoints":{waifu_total!r},'
+            f'"s2CurrentEpochLlamaRewards":{llama_tokens!r},"s2CurrentEpochWaifuRewards":{waifu_tokens!r},'
+            f'"s2Rewards":[{rewards}]}}')
+    return f'{{"address":"{address}","data":{data}}}\n'
+
+
+def write_address_csv(path, header, addresses):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([header])
+        writer.writerows([address] for address in addresses)
+
+
+def generate_season(n_miners, output_dir, seed=DEFAULT_SEED, sybil_share=SYBIL_SHARE, matrix=False):
+    """Generate one season of n_miners into output_dir"""
+    started = time.time()
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    plan = SeasonPlan(n_miners, rng, sybil_share=sybil_share)
+    addresses = random_addresses(rng, n_miners)
+    dates = season_dates(plan.days)
+    print(f"Generating {n_miners} miners ({int((plan.cluster_of >= 0).sum())} sybils in "
+          f"{len(plan.patterns)} clusters) into {output_dir}")
+
+    with open(os.path.join(output_dir, 'miner_addresses.txt'), 'w') as f:
+        f.write('\n'.join(addresses) + '\n')
+
+    # Stream the payloads chunk by chunk, keeping only per-miner totals
+    token_totals = np.zeros((n_miners, CHANNELS))
+    gpu_counts = np.zeros(n_miners, dtype=np.int64)
+    first_day = np.zeros(n_miners, dtype=np.int64)
+    bits = [] if matrix else None
+    with open(os.path.join(output_dir, 'stats.journal.jsonl'), 'w', encoding='utf-8') as journal:
+        for start in range(0, n_miners, CHUNK_MINERS):
+            stop = min(start + CHUNK_MINERS, n_miners)
+            active, points, gpus = generate_chunk(plan, rng, start, stop)
+            tokens = points * plan.token_rates[None]
+            token_totals[start:stop] = tokens.sum(axis=2)
+            gpu_counts[start:stop] = gpus
+            either = active.any(axis=1)
+            first_day[start:stop] = np.where(either.any(axis=1), either.argmax(axis=1), plan.days - 1)
+            if bits is not None:
+                bits.append(np.packbits(active, axis=-1))
+
+            hardware = rng.choice(len(HARDWARE), stop - start)
+            status = rng.random(stop - start) < 0.7
+            images = rng.integers(0, 500, stop - start)
+            texts = rng.integers(0, 800, stop - start)
+            availability = rng.random(stop - start).round(4)
+            for i in range(stop - start):
+                rng_values = (HARDWARE[hardware[i]], 'active' if status[i] else 'inactive',
+                              int(images[i]), int(texts[i]), float(availability[i]))
+                journal.write(payload_line(addresses[start + i], dates, active[i], points[i], tokens[i], rng_values))
+            print(f"Generated {stop}/{n_miners} miners")
+
+    # Reward totals, sorted by total tokens like miner_rewards_calculator.py
+    waifu, llama = token_totals[:, WAIFU], token_totals[:, LLAMA]
+    total = waifu + llama
+    with open(os.path.join(output_dir, 'miner_rewards_synthetic.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(REWARDS_HEADERS)
+        for i in np.argsort(-total, kind='stable').tolist():
+            writer.writerow([addresses[i], float(waifu[i]), float(llama[i]), float(total[i])])
+
+    # Top miners by GPU count; a few got their tokens revised down
+    top = np.argsort(-gpu_counts, kind='stable')[:max(1, int(n_miners * TOP_MINER_SHARE))]
+    revised = rng.random(len(top)) < REVISED_SHARE
+    top_stats = []
+    for i, is_revised in zip(top.tolist(), revised.tolist()):
+        entry = {
+            'address': addresses[i],
+            'totalWaifu': float(waifu[i]),
+            'totalLlama': float(llama[i]),
+            'totalTokens': float(total[i]),
+        }
+        if is_revised:
+            entry['revisedTokens'] = float(total[i]) * REVISED_FACTOR
+        entry['numGPUs'] = int(gpu_counts[i])
+        entry['startDate'] = f"{dates[first_day[i]]}T00:00:00.000Z"
+        top_stats.append(entry)
+    with open(os.path.join(output_dir, 'top-miner-stats.json'), 'w') as f:
+        json.dump(top_stats, f, indent=2)
+
+    # Planted clusters as the clustering stage writes them, plus the claimed and unique address lists
+    cluster_dir = os.path.join(output_dir, 'sybils-address-clusters')
+    os.makedirs(cluster_dir, exist_ok=True)
+    sybils = np.flatnonzero(plan.cluster_of >= 0)
+    for cluster in range(len(plan.patterns)):
+        for sub in range(len(plan.patterns[cluster])):
+            members = sybils[(plan.cluster_of[sybils] == cluster) & (plan.subcluster_of[sybils] == sub)]
+            if not len(members):
+                continue
+            with open(os.path.join(cluster_dir, f"cluster_{cluster}_subcluster_{sub}_addresses.csv"), 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['address', 'main_cluster', 'subcluster'])
+                writer.writerows([addresses[i], cluster, sub] for i in members.tolist())
+    claimed = np.flatnonzero(rng.random(n_miners) < CLAIMED_SHARE)
+    write_address_csv(os.path.join(output_dir, 'rewards_claimed_addresses.csv'), 'Address',
+                      [addresses[i] for i in claimed.tolist()])
+    excluded = sorted({addresses[i] for i in sybils.tolist()} | {addresses[i] for i in claimed.tolist()})
+    write_address_csv(os.path.join(output_dir, 'unique_addresses.csv'), 'address', excluded)
+
+    if bits is not None:
+        ActivityMatrix(np.array(addresses, dtype='S42'), np.concatenate(bits), S2_START_SECONDS,
+                       plan.days).save(os.path.join(output_dir, 'miner_activity_matrix.npz'))
+    print(f"Season of {n_miners} miners written to {output_dir} in {time.time() - started:.1f}s")
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Generate synthetic seasons of miner data for scale testing')
+    parser.add_argument('--miners', type=str, default=DEFAULT_SIZES,
+                        help=f"Comma-separated season sizes, presets ({', '.join(SIZE_PRESETS)}) or miner counts")
+    parser.add_argument('--output-dir', type=str, default=OUTPUT_DIR, help='Each size is written to a subfolder named after it')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Seed; the same seed gives the same season')
+    parser.add_argument('--sybil-share', type=float, default=SYBIL_SHARE, help='Share of miners planted in sybil clusters')
+    parser.add_argument('--matrix', action='store_true', help='Also write the activity matrix, skipping the feature generation stage')
+    return parser.parse_args()
+
+
+def main():
+    """Generate every requested season size"""
+    args = parse_arguments()
+    for size in args.miners.split(','):
+        if not size.strip():
+            continue
+        generate_season(parse_size(size), os.path.join(args.output_dir, size.strip()), args.seed,
+                        args.sybil_share, args.matrix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Multi-process decode and transform stage for the miner pipeline
+
+The fetch threads only move bytes: with raw streaming (see stats_client.py)
+they hand over each miner's undecoded response body, cached body or journal
+line. Those are grouped into batches and sent to a pool of worker
+processes, which decode them straight from bytes and run every sink's
+transform on the decoded payload, so the JSON decode and the per-miner
+aggregation scale across cores instead of running on the main thread under
+the GIL. The main process only caches, journals and writes what comes back;
+payloads bound for a payload archive are compressed in the workers too.
+
+A few batches per worker are kept in flight and results come back in
+submission order, so memory stays flat and the network workers keep
+fetching while the pool is busy. A body that does not decode is handled as
+StatsClient would: an API response is dead-lettered and never cached, and
+the miner of a bad cache entry or torn journal line is handed to a refetch
+callback once the input is exhausted, so it is fetched again rather than
+dropped. Decode and transform times are measured in the workers and added
+up over processes.
+"""
+
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from payload_archive import compress_line
+from stats_client import ORIGIN_API, ORIGIN_ARCHIVE, ORIGIN_BULK, ORIGIN_CACHE, ORIGIN_JOURNAL, parse_stats_body
+
+# Defaults
+DEFAULT_BATCH_SIZE = 64  # Miners sent to a worker process at a time
+BATCHES_PER_WORKER = 2  # Batches queued per worker process
+
+_transforms = ()  # Set in each worker process by _init_worker
+
+
+def _init_worker(transforms):
+    global _transforms
+    _transforms = transforms
+
+
+def _decode(address, payload, origin, serialize):
+    """The {'address', 'data'} record of one item and, if serialize, its compact JSON line"""
+    if origin in (ORIGIN_JOURNAL, ORIGIN_ARCHIVE):
+        try:
+            miner_stats = json.loads(payload)
+        except ValueError:
+            return None, None
+        return miner_stats, payload.decode('utf-8') if serialize else None
+    miner_stats = payload if origin == ORIGIN_BULK else parse_stats_body(address, payload)
+    if miner_stats is None:
+        return None, None
+    # Serialized before the transforms, which may reorder the payload in place
+    return miner_stats, json.dumps(miner_stats, separators=(',', ':')) if serialize else None
+
+
+def _transform_batch(items, journal, archive):
+    """
+    Decode and transform a batch in a worker process. Returns, per item, the
+    records of every transform (None if it did not decode), the journal line
+    and the compressed archive member, plus the decode and transform seconds
+    of the batch.
+    """
+    results = []
+    decode_seconds = transform_seconds = 0.0
+    for address, payload, origin in items:
+        started = time.perf_counter()
+        miner_stats, line = _decode(address, payload, origin, journal or archive)
+        decoded = time.perf_counter()
+        decode_seconds += decoded - started
+        if miner_stats is None:
+            results.append((None, None, None))
+            continue
+        journal_line = line if journal and origin != ORIGIN_JOURNAL else None
+        member = compress_line(line) if archive else None
+        results.append(([transform(miner_stats) for transform in _transforms], journal_line, member))
+        transform_seconds += time.perf_counter() - decoded
+    return results, decode_seconds, transform_seconds
+
+
+class TransformPool:
+    """
+    Worker processes that turn raw (address, body, origin) items into the
+    records of a fixed list of transforms. Transforms must be picklable
+    module-level functions or static methods.
+    """
+
+    def __init__(self, transforms, workers, batch_size=DEFAULT_BATCH_SIZE, context=None, journal=None, archive=None):
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.context = context
+        self.journal = journal
+        self.archive = archive
+        self.failed = 0
+        self.rejected = []  # (address, origin) of journal lines and cached bodies that did not decode
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(tuple(transforms),))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+
+    def run(self, items, refetch=None):
+        """
+        Yield the list of records of every transform for each item that
+        decodes, in input order. With refetch, the (address, origin) pairs of
+        journal lines and cached bodies that did not decode are passed to
+        refetch once the items run out, and the raw items it yields are
+        transformed as well.
+        """
+        yield from self._run(items)
+        while self.rejected:
+            rejected, self.rejected = self.rejected, []
+            if refetch is None:
+                print(f"Skipping {len(rejected)} miners whose journal line or cached body did not decode")
+                break
+            print(f"Refetching {len(rejected)} miners whose journal line or cached body did not decode")
+            yield from self._run(refetch(rejected))
+
+    def _run(self, items):
+        window = self.workers * BATCHES_PER_WORKER
+        pending = deque()
+        items = iter(items)
+        while True:
+            batch = list(islice(items, self.batch_size))
+            if not batch:
+                break
+            pending.append((batch, self._executor.submit(_transform_batch, batch, self.journal is not None,
+                                                         self.archive is not None)))
+            if len(pending) >= window:
+                yield from self._collect(*pending.popleft())
+        while pending:
+            yield from self._collect(*pending.popleft())
+
+    def _collect(self, batch, future):
+        results, decode_seconds, transform_seconds = future.result()
+        metrics = self.context.metrics if self.context else None
+        if metrics:
+            metrics.add_time('decode', decode_seconds, len(batch))
+            metrics.add_time('transform', transform_seconds, len(batch))
+        for (address, payload, origin), (records, line, member) in zip(batch, results):
+            if records is None:
+                self._reject(address, origin)
+                continue
+            # Only cache payloads that decoded, so a bad response is refetched next run
+            if origin == ORIGIN_API and self.context and self.context.cache is not None:
+                self.context.cache.put(self.context.endpoint, address, payload)
+            if line is not None:
+                self.journal.append_line(line)
+            if member is not None:
+                self.archive.append_member(address, member)
+            yield records
+
+    def _reject(self, address, origin):
+        """Account for an item that did not decode the way StatsClient does"""
+        self.failed += 1
+        if origin in (ORIGIN_JOURNAL, ORIGIN_CACHE):
+            self.rejected.append((address, origin))
+            return
+        if origin != ORIGIN_API:
+            print(f"Skipping undecodable {origin} payload for {address}")
+            return
+        print(f"Giving up on {address}: invalid JSON")
+        if self.context and self.context.metrics:
+            self.context.metrics.observe_failure()
+        if self.context and self.context.dead_letter:
+            self.context.dead_letter.record(address, 'invalid JSON', 1)
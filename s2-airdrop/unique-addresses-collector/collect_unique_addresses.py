@@ -1,55 +1,133 @@
 import os
-import pandas as pd
+import sys
+import csv
+import json
 import glob
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+# The shared address index lives next to the miner scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'miner-checker'))
+from address_index import AddressIndex
+
+MANIFEST_FILE = 'unique_addresses.manifest.json'  # Size, mtime and hash of every source file seen
+CACHE_DIR = '.address_cache'  # Parsed address keys per source file content, as AddressIndex files
+MAX_WORKERS = os.cpu_count() or 1
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Collect the unique sybil and claimed addresses')
+    parser.add_argument('--full', action='store_true', help='Ignore the manifest and re-parse every source file')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='Processes parsing changed files')
+    return parser.parse_args()
+
+def file_digest(file_path):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def read_address_column(file_path):
+    """Stream the address column of a CSV (header 'address' in any case, else the first column)"""
+    addresses = []
+    with open(file_path, 'r', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        names = [name.strip().lower() for name in header]
+        if 'address' in names:
+            column = names.index('address')
+        else:
+            column = 0
+            addresses.extend(header[:1])  # No header: the first row is data
+        for row in reader:
+            if len(row) > column:
+                addresses.append(row[column])
+    return addresses
+
+def parse_source(file_path, cache_dir):
+    """Parse one source file into its cached key file, returning its manifest entry"""
+    st = os.stat(file_path)
+    digest = file_digest(file_path)
+    cache_file = os.path.join(cache_dir, f"{digest}.idx")
+    # Identical content (e.g. a file that was only touched) reuses the keys parsed before
+    if not os.path.exists(cache_file):
+        AddressIndex.from_addresses(read_address_column(file_path)).save(cache_file)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': digest}
+
+def load_manifest(manifest_file):
+    """Read the manifest of the previous run, or an empty one"""
+    if not os.path.exists(manifest_file):
+        return {'sources': {}}
+    with open(manifest_file, 'r') as f:
+        return json.load(f)
 
 def main():
+    args = parse_arguments()
+    
     # Define paths - updated for the new location inside s2-airdrop folder
     sybils_folder = os.path.join('..', 'miner-checker', 'sybils-address-clusters')
     rewards_file = os.path.join('..', 'rewards-contract-checker', 'rewards_claimed_addresses.csv')
     output_file = 'unique_addresses.csv'
+    index_file = 'unique_addresses.idx'  # Binary AddressIndex of the same addresses
     
-    # Initialize a set to store unique addresses
-    unique_addresses = set()
-    
-    # Process all CSV files in the sybils-address-clusters folder
+    # Every cluster file plus the claimed addresses
     print(f"Processing files in {sybils_folder}...")
-    sybil_files = glob.glob(os.path.join(sybils_folder, '*.csv'))
-    
-    for file_path in sybil_files:
-        print(f"Reading {os.path.basename(file_path)}...")
-        df = pd.read_csv(file_path, header=None)
-        
-        # Extract addresses (first column, split by comma if needed)
-        if df.shape[1] > 0:
-            # If the first column contains comma-separated values
-            if df[0].dtype == 'object' and df[0].str.contains(',').any():
-                addresses = df[0].str.split(',', expand=True)[0].tolist()
-            else:
-                addresses = df[0].tolist()
-                
-            # Add addresses to our set
-            unique_addresses.update([addr.lower() for addr in addresses if isinstance(addr, str)])
-    
-    # Process rewards_claimed_addresses.csv
-    print(f"Reading {rewards_file}...")
+    sources = sorted(glob.glob(os.path.join(sybils_folder, '*.csv')))
     if os.path.exists(rewards_file):
-        try:
-            rewards_df = pd.read_csv(rewards_file)
-            if 'Address' in rewards_df.columns:
-                rewards_addresses = rewards_df['Address'].tolist()
-                unique_addresses.update([addr.lower() for addr in rewards_addresses if isinstance(addr, str)])
-            else:
-                print(f"Warning: 'Address' column not found in {rewards_file}")
-        except Exception as e:
-            print(f"Error reading {rewards_file}: {e}")
+        sources.append(rewards_file)
     else:
         print(f"Warning: {rewards_file} not found")
     
-    # Save unique addresses to CSV
+    # Sources whose size and mtime match the manifest are reused without being read
+    previous = {} if args.full else load_manifest(MANIFEST_FILE)['sources']
+    entries = {}
+    changed = []
+    for file_path in sources:
+        st = os.stat(file_path)
+        entry = previous.get(file_path)
+        if (entry and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns
+                and os.path.exists(os.path.join(CACHE_DIR, f"{entry['sha256']}.idx"))):
+            entries[file_path] = entry
+        else:
+            changed.append(file_path)
+    
+    removed = set(previous) - set(sources)
+    if not changed and not removed and os.path.exists(output_file) and os.path.exists(index_file):
+        print(f"All {len(sources)} source files unchanged; {output_file} is up to date")
+        return
+    
+    # Re-parse only new or changed files, in parallel when there are several
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    print(f"Parsing {len(changed)} new or changed files, reusing {len(entries)}")
+    if len(changed) > 1 and args.workers > 1:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(changed))) as executor:
+            entries.update(zip(changed, executor.map(parse_source, changed, [CACHE_DIR] * len(changed))))
+    else:
+        for file_path in changed:
+            entries[file_path] = parse_source(file_path, CACHE_DIR)
+    for file_path in changed:
+        print(f"Read {os.path.basename(file_path)}")
+    
+    # Merge the cached per-file keys; case and duplicates are resolved by the index
+    address_keys = [AddressIndex.load(os.path.join(CACHE_DIR, f"{entries[file_path]['sha256']}.idx")).keys
+                    for file_path in sources]
+    unique_addresses = AddressIndex.from_keys(np.concatenate(address_keys) if address_keys else [])
+    
+    # Save unique addresses to CSV, sorted, plus the compact binary index
     print(f"Found {len(unique_addresses)} unique addresses")
-    output_df = pd.DataFrame(list(unique_addresses), columns=['address'])
+    output_df = pd.DataFrame(unique_addresses.addresses(), columns=['address'])
     output_df.to_csv(output_file, index=False)
-    print(f"Saved unique addresses to {output_file}")
+    unique_addresses.save(index_file)
+    print(f"Saved unique addresses to {output_file} and {index_file}")
+    
+    # Record what was merged so the next run only re-reads what changed
+    with open(MANIFEST_FILE, 'w') as f:
+        json.dump({'sources': entries}, f, indent=2, sort_keys=True)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file